@@ -1,66 +1,155 @@
+"""
+Convert a MATLAB .mat file to Python data structures, and save them as a .py source file (for tiny files, e.g. marked
+points to paste into `annotated_coordinates.json`) or in a binary NumPy format (for depth maps, trajectories, ...):
+
+    --format py   ->  <name>.py           (`np.array([...])` literals)
+    --format npz  ->  <name>.npz          (one archive, one entry per key path)
+    --format npy  ->  <name>/<key>.npy    (one file per array, memory-mappable with `load_converted`)
+
+Nested structs and cell arrays are flattened into key paths ("struct/field", "cell/0", ...), which become the entry
+names of the .npz archive or the subdirectories of the .npy tree. Strings are stored as NumPy unicode arrays, so no
+pickling is needed to load them back.
+
+Given a directory, every .mat file below it whose relative path matches `--include` (and no `--exclude`) pattern is
+converted, across a process pool, into the same relative location under `--path_out` (default: next to the .mat file).
+`--variables` restricts the conversion to the named variables, which are then the only ones read from the files. MATLAB
+v7.3 files are HDF5 files, which are read with h5py (optional, only imported for them), opening only the datasets of
+the selected variables.
+
+Usage:
+    python mat_to_py.py marked_points.mat
+    python mat_to_py.py xyzpts.mat --format npy
+    python mat_to_py.py ../Data/LCMART --format npy --path_out LCMART_npy --exclude "Calibration/*" --workers 8
+    python mat_to_py.py ../Data/LCMART --format npz --include "*/xyzpts.mat" --variables X_est
+"""
+
 import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
 from pathlib import Path
 
 import numpy as np
 import scipy.io as sio
 
+OUTPUT_FORMATS = ("py", "npz", "npy")
+KEY_SEPARATOR = "/"
+DEFAULT_INCLUDE = ("*.mat",)
+MAT_V73_MAJOR_VERSION = 2  # `matfile_version` of the HDF5-based v7.3 files
+HDF5_SKIPPED_KEYS = ("#refs#", "#subsystem#")
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Convert a MATLAB .mat file to Python data structures.")
-    parser.add_argument("path_mat", type=str, help="Path to the .mat file")
-    parser.add_argument("--path_py", type=str, help="Path to save the Python file")
+    parser.add_argument("path_mat", type=str, help="Path to the .mat file, or a directory to convert recursively")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="py", help="Output format (default: py)")
+    parser.add_argument(
+        "--path_out",
+        "--path_py",
+        type=str,
+        help="Output path, or output directory for a directory (default: next to each .mat file)",
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="Compress the .npz archive (smaller, slower to write and read)"
+    )
+    parser.add_argument("--variables", nargs="+", help="Only convert (and read) these variables")
+    parser.add_argument(
+        "--include", nargs="+", default=list(DEFAULT_INCLUDE), help="Patterns of the relative paths to convert"
+    )
+    parser.add_argument("--exclude", nargs="+", default=[], help="Patterns of the relative paths to skip")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
     parsed_args = parser.parse_args()
-    if parsed_args.path_py is None:
-        parsed_args.path_py = parsed_args.path_mat.with_suffix(".py")
+    if parsed_args.path_out is None and not Path(parsed_args.path_mat).is_dir():
+        parsed_args.path_out = get_output_path(Path(parsed_args.path_mat), parsed_args.format)
     return parsed_args
 
 
-def convert_mat_to_python(path_mat: Path) -> dict:
+def get_output_path(path_mat: Path, output_format: str) -> Path:
+    """Default output path of a .mat file: its path with the format's suffix (without suffix for a .npy directory)."""
+    return path_mat.with_suffix("") if output_format == "npy" else path_mat.with_suffix(f".{output_format}")
+
+
+def _decode_hdf5_attribute(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _read_hdf5_item(h5_file, item):
+    """
+    Read a variable (dataset or group) of a MATLAB v7.3 file into the same structures as `loadmat(simplify_cells=True)`.
+
+    MATLAB writes its column-major arrays as transposed HDF5 datasets, structs as groups, strings as uint16 "char"
+    datasets, and cell arrays as datasets of references into the "#refs#" group.
+    """
+    import h5py
+
+    if isinstance(item, h5py.Group):
+        return {key: _read_hdf5_item(h5_file, item[key]) for key in item.keys()}
+
+    matlab_class = _decode_hdf5_attribute(item.attrs.get("MATLAB_class", b""))
+    if item.attrs.get("MATLAB_empty", 0):
+        # Empty arrays store their dimensions as data.
+        return np.array([]) if matlab_class != "char" else ""
+    value = item[()].T
+    if matlab_class == "cell":
+        cells = np.empty(value.shape, dtype=object)
+        for index, reference in np.ndenumerate(value):
+            cells[index] = _read_hdf5_item(h5_file, h5_file[reference])
+        return np.squeeze(cells)
+    if matlab_class == "char":
+        return "".join(map(chr, np.ravel(value, order="F")))
+    if value.dtype.names == ("real", "imag"):
+        value = value["real"] + 1j * value["imag"]
+    if matlab_class == "logical":
+        value = value.astype(bool)
+    return np.squeeze(value)
+
+
+def load_mat_v73(path_mat: Path, variable_names: list[str] | None = None) -> dict:
+    """
+    Load the variables of a MATLAB v7.3 (HDF5) file with h5py, reading only the datasets of the selected variables.
+
+    Args:
+        path_mat (str | Path): Path to the .mat file
+        variable_names (list[str] | None): Variables to read (default: all)
+
+    Returns:
+        dict: Dictionary containing the converted data
+    """
+    try:
+        import h5py
+    except ImportError as e:
+        raise ImportError(f"Reading MATLAB v7.3 files (such as '{path_mat}') requires h5py: pip install h5py") from e
+
+    with h5py.File(path_mat, "r") as h5_file:
+        if variable_names is None:
+            variable_names = [key for key in h5_file.keys() if key not in HDF5_SKIPPED_KEYS]
+        return {key: _read_hdf5_item(h5_file, h5_file[key]) for key in variable_names if key in h5_file}
+
+
+def convert_mat_to_python(path_mat: Path, variable_names: list[str] | None = None) -> dict:
     """
     Convert a MATLAB .mat file to Python data structures, using NumPy arrays for numerical data.
 
     Args:
         path_matfile (str | Path): Path to the .mat file
+        variable_names (list[str] | None): Variables to read (default: all); the others are skipped without reading
 
     Returns:
         dict: Dictionary containing the converted data
     """
     try:
-        # Load the .mat file
-        mat_data = sio.loadmat(path_mat, simplify_cells=True)
+        # Load the .mat file (structs become dicts and cell arrays object arrays, so nothing is left to convert)
+        if sio.matlab.matfile_version(path_mat)[0] == MAT_V73_MAJOR_VERSION:
+            return load_mat_v73(path_mat, variable_names)
+        mat_data = sio.loadmat(path_mat, simplify_cells=True, variable_names=variable_names)
 
         # Remove MATLAB-specific metadata if present
         mat_data.pop("__header__", None)
         mat_data.pop("__version__", None)
         mat_data.pop("__globals__", None)
 
-        # Process each variable in the .mat file
-        def convert_item(item):
-            # Convert MATLAB arrays to NumPy arrays
-            if isinstance(item, np.ndarray):
-                # Ensure proper data type conversion
-                if item.dtype.kind in ["i", "u", "f"]:  # Numeric types
-                    return item
-                elif item.dtype == object:  # Handle cell arrays
-                    return np.array([convert_item(sub_item) for sub_item in item], dtype=object)
-                else:
-                    return item
-            # Convert MATLAB structs to Python dictionaries
-            elif isinstance(item, dict):
-                return {key: convert_item(value) for key, value in item.items()}
-            # Handle scalar values
-            elif isinstance(item, (int, float, str)):
-                return item
-            # Handle lists or other iterables
-            elif isinstance(item, (list, tuple)):
-                return [convert_item(sub_item) for sub_item in item]
-            else:
-                return item  # Return unchanged if type is not specifically handled
-
-        # Convert all items in the loaded .mat data
-        converted_data = {key: convert_item(value) for key, value in mat_data.items()}
-
-        return converted_data
+        return mat_data
 
     except FileNotFoundError:
         print(f"Error: File '{path_mat}' not found.")
@@ -92,18 +181,257 @@ def save_to_python_file(data: dict, path_py: Path) -> None:
     )
 
 
+def flatten_data(data: dict, prefix: str = "") -> dict[str, np.ndarray]:
+    """
+    Flatten converted data into arrays keyed by their path, e.g. {"s": {"a": x}, "c": [y, z]} into
+    {"s/a": x, "c/0": y, "c/1": z}. Values that have no NumPy representation (e.g. MATLAB objects) are skipped.
+
+    Args:
+        data (dict): Converted data from .mat file
+        prefix (str): Key path of `data` itself
+
+    Returns:
+        dict[str, np.ndarray]: Arrays keyed by their key path
+    """
+    arrays = {}
+    for key, value in data.items():
+        key_path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            arrays.update(flatten_data(value, f"{key_path}{KEY_SEPARATOR}"))
+        elif isinstance(value, (list, tuple)) or (isinstance(value, np.ndarray) and value.dtype == object):
+            items = value.ravel() if isinstance(value, np.ndarray) else value
+            arrays.update(flatten_data(dict(enumerate(items)), f"{key_path}{KEY_SEPARATOR}"))
+        else:
+            array = np.asarray(value)
+            if array.dtype == object:
+                print(f"Warning: Skipping '{key_path}' ({type(value).__name__}): no NumPy representation.")
+                continue
+            arrays[key_path] = array
+    return arrays
+
+
+def save_to_npz_file(data: dict, path_npz: Path, compress: bool = False) -> int:
+    """
+    Save the converted data to a single .npz archive, with one entry per key path (see `flatten_data`).
+
+    Args:
+        data (dict): Converted data from .mat file
+        path_npz (str | Path): Path to save the .npz archive
+        compress (bool): Compress the entries (smaller, but slower to write and read)
+
+    Returns:
+        int: Number of array bytes written
+    """
+    arrays = flatten_data(data)
+    (np.savez_compressed if compress else np.savez)(Path(path_npz), **arrays)
+    return sum(array.nbytes for array in arrays.values())
+
+
+def save_to_npy_files(data: dict, path_dir: Path) -> int:
+    """
+    Save the converted data to one .npy file per key path (see `flatten_data`), with nested structs and cell arrays
+    as subdirectories, so that each array can be memory-mapped on its own.
+
+    Args:
+        data (dict): Converted data from .mat file
+        path_dir (str | Path): Directory to save the .npy files to
+
+    Returns:
+        int: Number of array bytes written
+    """
+    arrays = flatten_data(data)
+    for key_path, array in arrays.items():
+        path_npy = Path(path_dir, f"{key_path}.npy")
+        path_npy.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path_npy, array)
+    return sum(array.nbytes for array in arrays.values())
+
+
+def save_converted(data: dict, path_out: Path, output_format: str, compress: bool = False) -> int:
+    """
+    Save the converted data in one of the `OUTPUT_FORMATS`.
+
+    Args:
+        data (dict): Converted data from .mat file
+        path_out (str | Path): Path of the .py file, .npz archive or .npy directory
+        output_format (str): "py", "npz" or "npy"
+        compress (bool): Compress the .npz archive
+
+    Returns:
+        int: Number of bytes written (array bytes for the binary formats)
+    """
+    path_out = Path(path_out)
+    path_out.parent.mkdir(parents=True, exist_ok=True)
+    if output_format == "npz":
+        return save_to_npz_file(data, path_out, compress)
+    if output_format == "npy":
+        return save_to_npy_files(data, path_out)
+    save_to_python_file(data, path_out)
+    return path_out.stat().st_size
+
+
+def collect_mat_paths(root: Path, include=DEFAULT_INCLUDE, exclude=()) -> list[Path]:
+    """
+    The .mat files below a directory whose path relative to it (e.g. "Reconstruction/img1/xyzpts.mat") matches one of
+    the include patterns and none of the exclude patterns (`fnmatch` patterns, where "*" also matches "/").
+
+    Args:
+        root (str | Path): Directory to search recursively
+        include (Iterable[str]): Patterns of the paths to convert
+        exclude (Iterable[str]): Patterns of the paths to skip
+
+    Returns:
+        list[Path]: Sorted paths of the matching files
+    """
+    root = Path(root)
+    mat_paths = []
+    for path in sorted(root.rglob("*.mat")):
+        relative_path = path.relative_to(root).as_posix()
+        if any(fnmatch(relative_path, pattern) for pattern in include) and not any(
+            fnmatch(relative_path, pattern) for pattern in exclude
+        ):
+            mat_paths.append(path)
+    return mat_paths
+
+
+def _convert_file(
+    path_mat: Path, path_out: Path, output_format: str, variable_names: list[str] | None, compress: bool
+) -> int | None:
+    """
+    Convert and save one .mat file (in a worker process); the number of bytes written, 0 if the file has none of the
+    selected variables (nothing is written), or None on failure.
+    """
+    data = convert_mat_to_python(path_mat, variable_names)
+    if data is None:
+        return None
+    if not data:
+        return 0
+    return save_converted(data, path_out, output_format, compress)
+
+
+def convert_tree(
+    root: Path,
+    output_root: Path | None = None,
+    output_format: str = "npy",
+    include=DEFAULT_INCLUDE,
+    exclude=(),
+    variable_names: list[str] | None = None,
+    compress: bool = False,
+    num_workers: int | None = None,
+) -> tuple[int, int, int]:
+    """
+    Convert all matching .mat files below a directory across a process pool (see `collect_mat_paths`).
+
+    Args:
+        root (str | Path): Directory to convert recursively
+        output_root (str | Path | None): Directory to mirror the converted files into (default: next to the .mat files)
+        output_format (str): "py", "npz" or "npy"
+        include (Iterable[str]): Patterns of the paths to convert
+        exclude (Iterable[str]): Patterns of the paths to skip
+        variable_names (list[str] | None): Variables to read (default: all)
+        compress (bool): Compress the .npz archives
+        num_workers (int | None): Number of worker processes (default: the number of CPUs)
+
+    Returns:
+        tuple[int, int, int]: Number of converted files (files without any of the selected variables are skipped),
+            .mat bytes read and bytes written
+    """
+    root = Path(root)
+    output_root = root if output_root is None else Path(output_root)
+    tasks = []
+    for path_mat in collect_mat_paths(root, include, exclude):
+        path_out = get_output_path(output_root / path_mat.relative_to(root), output_format)
+        tasks.append((path_mat, path_out, output_format, variable_names, compress))
+    num_converted, num_bytes_read, num_bytes_written = 0, 0, 0
+    if not tasks:
+        return num_converted, num_bytes_read, num_bytes_written
+
+    num_workers = num_workers or os.cpu_count() or 1
+    # Chunks amortize the per-task overhead for the many small .mat files of a project.
+    chunksize = max(1, len(tasks) // (4 * num_workers))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for task, num_bytes in zip(tasks, executor.map(_convert_file, *zip(*tasks), chunksize=chunksize)):
+            path_mat = task[0]
+            if num_bytes is None:
+                print(f"Warning: Could not convert {path_mat.as_posix()}")
+                continue
+            if num_bytes == 0:
+                # None of the selected variables in this file: not a failure, and nothing was written.
+                continue
+            num_converted += 1
+            num_bytes_read += path_mat.stat().st_size
+            num_bytes_written += num_bytes
+
+    return num_converted, num_bytes_read, num_bytes_written
+
+
+def load_converted(path: Path, mmap_mode: str | None = "r") -> dict:
+    """
+    Load data saved by `save_to_npz_file` or `save_to_npy_files` back into nested dicts (cell arrays stay dicts keyed
+    by their string index).
+
+    Args:
+        path (str | Path): The .npz archive or the directory of .npy files
+        mmap_mode (str | None): Memory-map mode of the .npy files (.npz entries are always read into memory)
+
+    Returns:
+        dict: The nested data
+    """
+    path = Path(path)
+    if path.is_dir():
+        arrays = {
+            path_npy.relative_to(path).with_suffix("").as_posix(): np.load(path_npy, mmap_mode=mmap_mode)
+            for path_npy in sorted(path.rglob("*.npy"))
+        }
+    else:
+        with np.load(path) as npz:
+            arrays = {key_path: npz[key_path] for key_path in npz.files}
+
+    data = {}
+    for key_path, array in arrays.items():
+        *parents, key = key_path.split(KEY_SEPARATOR)
+        node = data
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = array
+    return data
+
+
 if __name__ == "__main__":
     args = parse_args()
     path_mat = Path(args.path_mat)
-    path_py = Path(args.path_py)
 
-    if path_mat.exists():
-        data = convert_mat_to_python(path_mat)
+    if path_mat.is_dir():
+        start_time = time.perf_counter()
+        num_converted, num_bytes_read, num_bytes = convert_tree(
+            path_mat,
+            args.path_out,
+            args.format,
+            include=args.include,
+            exclude=args.exclude,
+            variable_names=args.variables,
+            compress=args.compress,
+            num_workers=args.workers,
+        )
+        elapsed_time = time.perf_counter() - start_time
+        print(
+            f"Converted {num_converted} .mat files ({num_bytes_read / 1e6:.2f} MB) to {num_bytes / 1e6:.2f} MB in"
+            f" {elapsed_time:.2f} s ({num_bytes_read / 1e6 / max(elapsed_time, 1e-9):.1f} MB/s)"
+        )
+    elif path_mat.exists():
+        path_out = Path(args.path_out)
+        start_time = time.perf_counter()
+        data = convert_mat_to_python(path_mat, args.variables)
         if data:
             print("Converted data:")
             for key, value in data.items():
                 print(f"{key}: {type(value)}")
-            save_to_python_file(data, path_py)
-            print(f"Data saved to {path_py}")
+            num_bytes = save_converted(data, path_out, args.format, args.compress)
+            elapsed_time = time.perf_counter() - start_time
+            print(f"Data saved to {path_out}")
+            print(
+                f"Converted {path_mat.stat().st_size / 1e6:.2f} MB (.mat) to {num_bytes / 1e6:.2f} MB in"
+                f" {elapsed_time:.2f} s ({path_mat.stat().st_size / 1e6 / max(elapsed_time, 1e-9):.1f} MB/s)"
+            )
     else:
         print(f"Please provide a valid .mat file path.")
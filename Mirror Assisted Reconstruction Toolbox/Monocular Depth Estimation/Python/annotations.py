@@ -0,0 +1,185 @@
+"""
+Annotated points of all images as one typed array, with a validity mask per point and view.
+
+In `annotated_coordinates.json`, each image's points are a flat list laid out view after view ("num_physical_points"
+per view), so a point missing in one view cannot be represented, and every script has to split the list itself.
+`Annotations` holds them instead as
+
+    points     (I, V, P, 2) float32   pixels of point p of image i in view v, NaN where missing
+    valid      (I, V, P)    bool      which points were annotated
+    num_points (I,)         int32     points per view of each image (P is the maximum, the rest is padding)
+    filenames  (I,)         str       string table of the image filenames
+
+so any stage can vectorize over images, views and points directly (e.g., `points[:, 1]` are the first mirror's points
+of every image). The NaNs make them usable as-is by `triangulation.triangulate_points`, which skips missing points.
+
+Annotations are saved as an uncompressed .npz archive of these arrays (fast to load, no parsing), and convert to and
+from the JSON format, where missing points are written as null (`points_to_json` and `points_from_json`), so the file
+stays valid JSON.
+
+Usage:
+    python annotations.py annotated_coordinates.json --num-views 2 --output annotations.npz
+    python annotations.py annotations.npz --output annotated_coordinates.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def points_from_json(points: list) -> np.ndarray:
+    """(N, 2) float64 pixels of a JSON "points" list, NaN for missing (null, or legacy [NaN, NaN]) points."""
+    return np.array([[np.nan, np.nan] if point is None else point for point in points], dtype=np.float64).reshape(-1, 2)
+
+
+def points_to_json(points: np.ndarray) -> list:
+    """A JSON "points" list of (N, 2) pixels (or (N, 3) world points), with null for missing (non-finite) points."""
+    points = np.asarray(points, dtype=np.float64)
+    points = points.reshape(-1, points.shape[-1] if points.ndim > 1 else 2)
+    return [point if np.all(np.isfinite(point)) else None for point in points.tolist()]
+
+
+class Annotations:
+    """
+    Annotated points of I images in V views.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        The I image filenames.
+    points : array_like
+        (I, V, P, 2) pixels, NaN where a point is missing.
+    num_points : array_like, optional
+        (I,) points per view of each image. Defaults to P for all images.
+    """
+
+    def __init__(self, filenames: list[str], points: np.ndarray, num_points: np.ndarray | None = None):
+        self.filenames = [str(filename) for filename in filenames]
+        self.points = np.array(points, dtype=np.float32)
+        if self.points.ndim != 4 or self.points.shape[-1] != 2 or len(self.points) != len(self.filenames):
+            raise ValueError(f"Expected ({len(self.filenames)}, V, P, 2) points, got {self.points.shape}")
+        num_images, _, max_points = self.points.shape[:3]
+        self.num_points = (
+            np.full(num_images, max_points, dtype=np.int32) if num_points is None else np.asarray(num_points, np.int32)
+        )
+        padding = np.arange(max_points) >= self.num_points[:, None]
+        self.points[np.broadcast_to(padding[:, None], self.points.shape[:3])] = np.nan
+        self.valid = np.all(np.isfinite(self.points), axis=-1)
+        self.indices = {filename: index for index, filename in enumerate(self.filenames)}
+
+    @classmethod
+    def from_list(cls, annotations: list[dict], num_views: int) -> "Annotations":
+        """
+        Build annotations from the contents of `annotated_coordinates.json`.
+
+        Each image's points are split into views at its "view_start_indices" (written by `mark_points.py` when the
+        views have different numbers of points), or else into views of "num_physical_points" points, with the last view
+        taking the rest. Without either, the points are shared equally between the views. Views with fewer points than
+        the image's largest view are padded. Padding, views that were not annotated and null (or [NaN, NaN]) entries are
+        invalid.
+        """
+        image_views = []
+        for annotation in annotations:
+            flat = points_from_json(annotation["points"])
+            view_start_indices = annotation.get("view_start_indices")
+            if view_start_indices is None:
+                count = annotation.get("num_physical_points") or -(-len(flat) // num_views)
+                view_start_indices = [min(view_index * count, len(flat)) for view_index in range(num_views)]
+            image_views.append(np.split(flat, list(view_start_indices)[1:num_views]))
+        num_points = np.array([max(map(len, views), default=0) for views in image_views], dtype=np.int32)
+
+        points = np.full((len(annotations), num_views, int(num_points.max(initial=0)), 2), np.nan, dtype=np.float32)
+        for image_points, views in zip(points, image_views):
+            for view_points, view in zip(image_points, views):
+                view_points[: len(view)] = view
+        return cls([annotation["filename"] for annotation in annotations], points, num_points)
+
+    def to_list(self) -> list[dict]:
+        """
+        The contents of `annotated_coordinates.json`, with every view padded to the image's largest view and missing
+        points as null.
+        """
+        return [
+            {
+                "filename": filename,
+                "num_physical_points": int(count),
+                "points": points_to_json(image_points[:, :count]),
+            }
+            for filename, image_points, count in zip(self.filenames, self.points, self.num_points)
+        ]
+
+    @classmethod
+    def load_json(cls, path_annotations: Path, num_views: int) -> "Annotations":
+        """Load `annotated_coordinates.json` (see `from_list`)."""
+        with Path(path_annotations).open("r") as f:
+            return cls.from_list(json.load(f), num_views)
+
+    def save_json(self, path_annotations: Path) -> None:
+        """Save as `annotated_coordinates.json`."""
+        with Path(path_annotations).open("w") as f:
+            json.dump(self.to_list(), f, indent=2)
+
+    @classmethod
+    def load(cls, path_annotations: Path) -> "Annotations":
+        """Load annotations saved by `save`."""
+        with np.load(Path(path_annotations)) as npz:
+            return cls(npz["filenames"].tolist(), npz["points"], npz["num_points"])
+
+    def save(self, path_annotations: Path) -> None:
+        """Save as an uncompressed .npz archive."""
+        np.savez(
+            Path(path_annotations),
+            filenames=np.array(self.filenames, dtype=str),
+            points=self.points,
+            num_points=self.num_points,
+        )
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __iter__(self):
+        return iter(self.filenames)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.indices
+
+    @property
+    def num_views(self) -> int:
+        return self.points.shape[1]
+
+    def get(self, filename: str) -> tuple[np.ndarray, np.ndarray]:
+        """(V, P, 2) pixels (NaN where missing) and (V, P) validity mask of an image, without padding."""
+        index = self.indices[filename]
+        count = self.num_points[index]
+        return self.points[index, :, :count], self.valid[index, :, :count]
+
+    def get_view(self, view_index: int) -> tuple[np.ndarray, np.ndarray]:
+        """(I, P, 2) pixels (NaN where missing or padding) and (I, P) validity mask of one view over all images."""
+        return self.points[:, view_index], self.valid[:, view_index]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert annotations between JSON and the binary .npz format.")
+    parser.add_argument("path_input", type=Path, help="annotated_coordinates.json or annotations .npz")
+    parser.add_argument("--output", type=Path, required=True, help="Output (.json or .npz)")
+    parser.add_argument("--num-views", type=int, default=2, help="Number of views (for JSON input)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.path_input.suffix == ".json":
+        annotations = Annotations.load_json(args.path_input, args.num_views)
+    else:
+        annotations = Annotations.load(args.path_input)
+    load_time = time.perf_counter() - start_time
+
+    if args.output.suffix == ".json":
+        annotations.save_json(args.output)
+    else:
+        annotations.save(args.output)
+    print(
+        f"{len(annotations)} images x {annotations.num_views} views x up to {annotations.points.shape[2]} points"
+        f" ({annotations.valid.sum()} valid): loaded in {load_time * 1000:.2f} ms, saved to {args.output.as_posix()}"
+    )
@@ -0,0 +1,503 @@
+"""
+Sparse bundle adjustment of the mirror (virtual camera) poses and the world points.
+
+The BCT calibration of each view is fixed once the Bouguet toolbox is done with it, so a slightly off mirror
+calibration shows up as high residual reprojection errors in `analyze_error_2d.m`. Here the poses of the virtual views
+and all world points are refined jointly to minimize the reprojection errors of every marked or tracked observation,
+with `scipy.optimize.least_squares`.
+
+Every residual (the x or y pixel error of one point in one view) only depends on the 3 coordinates of its point and the
+6 pose parameters of its view, so the Jacobian is very sparse. It is computed analytically and assembled directly in
+CSR format (the same pattern is passed as `jac_sparsity` when it is estimated by finite differences instead), so the
+trust region solver works with LSMR and scales to tens of thousands of points.
+
+Gauge: the physical camera is kept fixed, which fixes the world frame. Scaling the whole scene about the physical
+camera's center leaves every reprojection unchanged, so after the optimization the scene is rescaled to keep the
+distance between the physical camera and the first virtual camera as calibrated.
+
+Pose updates are left-multiplied, R = exp([w]_x) R0, so mirror views keep their left-handed rotations (det(R) = -1).
+
+With `--parameterization mirror`, every virtual view is instead the reflection of the (fixed) physical camera in its
+mirror plane (see `mirror_rig.py`), so each mirror only has 3 parameters (the normal's 2 tangent coordinates and the
+distance) instead of 6. The virtual views then stay physically consistent, and the smaller problem converges faster.
+
+NOTE: As for triangulation, the pixels must be undistorted (pass `--undistort` for distorted pixels).
+
+Usage:
+    python bundle_adjustment.py --bct-params bct_params.mat --annotations annotated_coordinates.json
+    python bundle_adjustment.py --bct-params bct_params.mat --trackfile xypts.csv --undistort --loss huber
+    python bundle_adjustment.py --bct-params bct_params.mat --trackfile xypts.csv --parameterization mirror
+    python bundle_adjustment.py --bct-params bct_params.mat --annotations annotated_coordinates.json \
+        --output bct_params_refined.mat
+
+References
+----------
+1. Triggs et al., Bundle Adjustment - A Modern Synthesis, Vision Algorithms: Theory and Practice, 2000.
+2. Hartley & Zisserman, Multiple View Geometry in Computer Vision (2nd ed.), Appendix 6.
+"""
+
+import argparse
+import copy
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from annotations import Annotations
+from camera_parameters import load_bct_params, save_bct_params
+from distortion import stack_view_parameters, undistort_points
+from mirror_rig import (
+    PHYSICAL_VIEW,
+    MirrorPlane,
+    estimate_mirror_planes,
+    normals_from_tangent_coordinates,
+    reflect_extrinsics,
+    tangent_bases,
+)
+from reconstruct_trackfile import iter_trackfile_chunks
+from scipy.optimize import least_squares
+from scipy.sparse import csr_matrix
+from triangulation import (
+    project_points,
+    projection_matrices_from_camera_parameters,
+    triangulate_points,
+)
+
+TOLERANCE_NEAR_ZERO = 1e-12
+NUM_POSE_PARAMETERS = 6
+NUM_MIRROR_PARAMETERS = 3
+FIXED_VIEWS = [PHYSICAL_VIEW]
+MAX_INITIAL_ERROR = 20.0  # px
+# The rho(z) of the robust losses of `scipy.optimize.least_squares`, with z the squared (scaled) residual.
+ROBUST_LOSSES = {
+    "linear": lambda z: z,
+    "soft_l1": lambda z: 2 * (np.sqrt(1 + z) - 1),
+    "huber": lambda z: np.where(z <= 1, z, 2 * np.sqrt(z) - 1),
+    "cauchy": np.log1p,
+    "arctan": np.arctan,
+}
+
+
+class BundleAdjustmentResult(NamedTuple):
+    """Result of a bundle adjustment of V views and N points."""
+
+    camera_parameters: dict[str, dict[str, np.ndarray]]
+    """Copy of the camera parameters with the refined rotations, translations and extrinsics."""
+    points_3d: np.ndarray
+    """(N, 3) refined world points, NaN for points observed in fewer than two views or left out."""
+    mirror_planes: dict[str, MirrorPlane]
+    """Mirror planes fitted to the refined virtual views (exact reflections with the "mirror" parameterization)."""
+    initial_reprojection_errors: np.ndarray
+    """(V, N) pixel reprojection errors before the refinement, NaN where the point was not observed."""
+    reprojection_errors: np.ndarray
+    """(V, N) pixel reprojection errors after the refinement, NaN where the point was not observed."""
+    iterations: list[dict[str, float]]
+    """Initial state and every iteration: "iteration", "cost" (the solver's cost, i.e., half the sum of the robust loss
+    of the residuals, which is half the sum of squared residuals for the linear loss), "iteration_time" and
+    "elapsed_time" in seconds."""
+    success: bool
+    """Whether the solver reached one of its convergence criteria."""
+    message: str
+    """The solver's termination message."""
+
+
+def skew_symmetric_matrices(vectors: np.ndarray) -> np.ndarray:
+    """Cross product matrices [v]_x (..., 3, 3) of (..., 3) vectors."""
+    matrices = np.zeros((*vectors.shape[:-1], 3, 3))
+    matrices[..., 0, 1], matrices[..., 0, 2] = -vectors[..., 2], vectors[..., 1]
+    matrices[..., 1, 0], matrices[..., 1, 2] = vectors[..., 2], -vectors[..., 0]
+    matrices[..., 2, 0], matrices[..., 2, 1] = -vectors[..., 1], vectors[..., 0]
+    return matrices
+
+
+def robust_cost(residuals: np.ndarray, loss: str = "linear", f_scale: float = 1.0) -> float:
+    """The cost that `scipy.optimize.least_squares` minimizes: 0.5 * f_scale^2 * sum(rho((residuals / f_scale)^2))."""
+    z = (np.asarray(residuals) / f_scale) ** 2
+    rho = loss(z)[0] if callable(loss) else ROBUST_LOSSES[loss](z)
+    return 0.5 * f_scale**2 * float(np.sum(rho))
+
+
+def rotation_vectors_to_matrices(rotation_vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rotation matrices exp([w]_x) (K, 3, 3) of (K, 3) rotation vectors (Rodrigues' formula), and the left Jacobians
+    J_l(w) (K, 3, 3) of SO(3), such that d(exp([w]_x) y) / dw = -[exp([w]_x) y]_x J_l(w) for any fixed y.
+    """
+    angles = np.linalg.norm(rotation_vectors, axis=-1)[:, None, None]
+    small = angles < 1e-6
+    safe_angles = np.where(small, 1.0, angles)
+    W = skew_symmetric_matrices(rotation_vectors)
+    W2 = W @ W
+
+    # Taylor expansions near zero, where the closed forms lose their precision.
+    a = np.where(small, 1.0 - angles**2 / 6, np.sin(safe_angles) / safe_angles)
+    b = np.where(small, 0.5 - angles**2 / 24, (1.0 - np.cos(safe_angles)) / safe_angles**2)
+    c = np.where(small, 1.0 / 6 - angles**2 / 120, (safe_angles - np.sin(safe_angles)) / safe_angles**3)
+
+    identity = np.eye(3)
+    return identity + a * W + b * W2, identity + b * W + c * W2
+
+
+def _build_jacobian_structure(
+    view_indices: np.ndarray,
+    point_indices: np.ndarray,
+    refined_slots: np.ndarray,
+    num_points: int,
+    num_view_parameters: int = NUM_POSE_PARAMETERS,
+) -> tuple[np.ndarray, np.ndarray, tuple[int, int]]:
+    """
+    CSR column indices and row pointers of the Jacobian of the residuals of observations sorted by view.
+
+    Each of the 2 rows of an observation has the `num_view_parameters` columns of its view (if refined), then the 3
+    columns of its point. Parameters are ordered as [refined view 1, ..., refined view R, point 1, ..., point N].
+    """
+    num_refined = int(np.sum(refined_slots >= 0))
+    slots = refined_slots[view_indices]
+    has_view = slots >= 0
+    row_lengths = np.where(has_view, num_view_parameters + 3, 3)
+
+    view_columns = slots[:, None] * num_view_parameters + np.arange(num_view_parameters)
+    point_columns = num_refined * num_view_parameters + 3 * point_indices[:, None] + np.arange(3)
+    columns = np.concatenate((view_columns, point_columns), axis=1)
+
+    # Observations of fixed views skip the view columns. Both rows of an observation share the same columns.
+    keep = np.column_stack((np.repeat(has_view[:, None], num_view_parameters, axis=1), np.ones((len(slots), 3), bool)))
+    indices = np.repeat(columns[:, None, :], 2, axis=1)[np.repeat(keep[:, None, :], 2, axis=1)]
+    indptr = np.concatenate(([0], np.cumsum(np.repeat(row_lengths, 2))))
+
+    shape = (2 * len(view_indices), num_refined * num_view_parameters + 3 * num_points)
+    return indices, indptr, shape
+
+
+def bundle_adjust(
+    camera_parameters: dict[str, dict[str, np.ndarray]],
+    points_2d: np.ndarray,
+    points_3d: np.ndarray | None = None,
+    fixed_views: list[str] | None = None,
+    parameterization: str = "pose",
+    max_initial_error: float | None = MAX_INITIAL_ERROR,
+    loss: str = "linear",
+    f_scale: float = 1.0,
+    analytic_jacobian: bool = True,
+    max_nfev: int | None = None,
+    verbose: bool = True,
+) -> BundleAdjustmentResult:
+    """
+    Jointly refine the poses of the non-fixed views and the world points.
+
+    Parameters
+    ----------
+    camera_parameters : dict[str, dict[str, np.ndarray]]
+        Camera parameters, e.g. from `camera_parameters.load_bct_params`. Not modified.
+    points_2d : array_like
+        (V, N, 2) undistorted pixel coordinates of N points in the V views (in the order of `camera_parameters`), NaN
+        where a point was not observed.
+    points_3d : array_like, optional
+        (N, 3) initial world points. Triangulated with the initial camera parameters by default.
+    fixed_views : list[str], optional
+        Keys of the views whose poses stay fixed. Defaults to the physical camera, which fixes the gauge.
+    parameterization : str, optional
+        One of:
+        - "pose": every refined view has its own 6-DOF pose.
+        - "mirror": every refined (virtual) view is the reflection of the physical camera, which must be fixed, in a
+          3-DOF mirror plane. The initial planes are fitted to the given extrinsics with `estimate_mirror_planes`.
+    max_initial_error : float, optional
+        Leave out points whose initial reprojection error exceeds this in any view (in pixels), e.g. points whose
+        triangulation with the initial calibration diverged. None keeps all points.
+    loss : str, optional
+        Loss of `scipy.optimize.least_squares`, e.g. "huber" or "soft_l1" to down-weight mismarked points.
+    f_scale : float, optional
+        Inlier scale of robust losses, in pixels.
+    analytic_jacobian : bool, optional
+        Use the analytic Jacobian. If False, it is estimated by finite differences with the same sparsity pattern
+        (slower, mainly to check the analytic one).
+    max_nfev : int, optional
+        Maximum number of residual evaluations.
+    verbose : bool, optional
+        Print the cost and timing of every iteration.
+
+    Returns
+    -------
+    BundleAdjustmentResult
+        The refined camera parameters and points with their reprojection errors and the per-iteration timing.
+    """
+    view_keys = list(camera_parameters)
+    fixed_views = FIXED_VIEWS if fixed_views is None else fixed_views
+    num_views = len(view_keys)
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    if points_2d.shape[0] != num_views:
+        raise ValueError(f"Expected observations in {num_views} views, got {points_2d.shape[0]}.")
+    if parameterization not in ("pose", "mirror"):
+        raise ValueError(f"Unknown parameterization: {parameterization}")
+    if parameterization == "mirror" and PHYSICAL_VIEW not in fixed_views:
+        raise ValueError("The mirror parameterization reflects the physical camera, which must be fixed.")
+
+    projection_matrices = projection_matrices_from_camera_parameters(camera_parameters, view_keys)
+    if points_3d is None:
+        points_3d = triangulate_points(projection_matrices, points_2d).points_3d
+    points_3d = np.asarray(points_3d, dtype=np.float64)
+
+    # Only points observed in at least two views (and successfully initialized) constrain the poses.
+    observed = np.all(np.isfinite(points_2d), axis=-1)
+    valid = (observed.sum(axis=0) >= 2) & np.all(np.isfinite(points_3d), axis=-1)
+    if max_initial_error is not None:
+        initial_errors = np.linalg.norm(project_points(projection_matrices, points_3d) - points_2d, axis=-1)
+        valid &= ~np.any(observed & ~(initial_errors <= max_initial_error), axis=0)
+    valid_points = np.flatnonzero(valid)
+    observed = observed[:, valid_points]
+    num_points = len(valid_points)
+
+    # Observations sorted by view: (M,) view and point indices, (M, 2) pixels.
+    view_indices, point_indices = np.nonzero(observed)
+    pixels = points_2d[:, valid_points][view_indices, point_indices]
+    view_slices = np.concatenate(([0], np.cumsum(observed.sum(axis=1))))
+
+    intrinsics = np.stack([camera_parameters[view_key]["intrinsics"] for view_key in view_keys])
+    initial_rotations = np.stack([camera_parameters[view_key]["rotation"] for view_key in view_keys])
+    initial_translations = np.stack([np.ravel(camera_parameters[view_key]["translation"]) for view_key in view_keys])
+
+    refined_views = [v for v, view_key in enumerate(view_keys) if view_key not in fixed_views]
+    refined_slots = np.full(num_views, -1)
+    refined_slots[refined_views] = np.arange(len(refined_views))
+    parameters_per_view = NUM_POSE_PARAMETERS if parameterization == "pose" else NUM_MIRROR_PARAMETERS
+    num_view_parameters = len(refined_views) * parameters_per_view
+
+    indices, indptr, shape = _build_jacobian_structure(
+        view_indices, point_indices, refined_slots, num_points, parameters_per_view
+    )
+
+    if parameterization == "mirror":
+        physical = view_keys.index(PHYSICAL_VIEW)
+        mirror_planes = estimate_mirror_planes(camera_parameters)
+        initial_normals = np.stack([mirror_planes[view_keys[v]].normal for v in refined_views])
+        bases = tangent_bases(initial_normals)
+
+    def unpack(parameters: np.ndarray) -> tuple[np.ndarray, np.ndarray, tuple[np.ndarray, ...], np.ndarray]:
+        """
+        Rotations (V, 3, 3), translations (V, 3), what the Jacobians of the refined views need, and points (N, 3).
+        """
+        view_parameters = parameters[:num_view_parameters].reshape(-1, parameters_per_view)
+        rotations, translations = initial_rotations.copy(), initial_translations.copy()
+        if parameterization == "pose":
+            updates, left_jacobians = rotation_vectors_to_matrices(view_parameters[:, :3])
+            rotations[refined_views] = updates @ initial_rotations[refined_views]
+            translations[refined_views] = view_parameters[:, 3:]
+            derivatives = (left_jacobians,)
+        else:
+            normals, normal_jacobians = normals_from_tangent_coordinates(initial_normals, bases, view_parameters[:, :2])
+            rotations[refined_views], translations[refined_views] = reflect_extrinsics(
+                initial_rotations[physical], initial_translations[physical], normals, view_parameters[:, 2]
+            )
+            derivatives = (normals, normal_jacobians, view_parameters[:, 2])
+        return rotations, translations, derivatives, parameters[num_view_parameters:].reshape(-1, 3)
+
+    def project(parameters: np.ndarray, with_jacobian: bool = False):
+        """Projections of all observations (M, 2), and the CSR data of their Jacobian."""
+        rotations, translations, derivatives, points = unpack(parameters)
+        projected = np.empty((len(view_indices), 2))
+        data = []
+        for v in range(num_views):
+            observation_slice = slice(view_slices[v], view_slices[v + 1])
+            rotated = points[point_indices[observation_slice]] @ rotations[v].T
+            homogeneous = (rotated + translations[v]) @ intrinsics[v].T
+            depths = homogeneous[:, 2:]
+            depths = np.where(np.abs(depths) > TOLERANCE_NEAR_ZERO, depths, TOLERANCE_NEAR_ZERO)
+            projected[observation_slice] = homogeneous[:, :2] / depths
+            if not with_jacobian:
+                continue
+
+            # d(pixel) / d(camera point) = (K[:2] - pixel * K[2]) / depth, (M_v, 2, 3).
+            d_camera = (
+                intrinsics[v, None, :2] - projected[observation_slice, :, None] * intrinsics[v, None, 2:3]
+            ) / depths[..., None]
+            blocks = [d_camera @ rotations[v]]
+            slot = refined_slots[v]
+            if slot >= 0 and parameterization == "pose":
+                # Camera point Y = exp([w]_x) R0 X + t: dY/dw = -[R X]_x J_l(w), dY/dt = I.
+                d_rotation = -skew_symmetric_matrices(rotated) @ derivatives[0][slot]
+                blocks = [d_camera @ d_rotation, d_camera] + blocks
+            elif slot >= 0:
+                # Camera point Y = R_p X' + T_p of the mirrored point X' = X - 2 (n^T X - d) n:
+                # dX'/dn = -2 ((n^T X - d) I + n X^T), dX'/dd = 2 n.
+                normals, normal_jacobians, distances = derivatives
+                world = points[point_indices[observation_slice]]
+                signed_distances = world @ normals[slot] - distances[slot]
+                d_normal = -2 * (signed_distances[:, None, None] * np.eye(3) + normals[slot, :, None] * world[:, None])
+                d_distance = np.broadcast_to(2 * normals[slot, :, None], (len(world), 3, 1))
+                d_mirrored = np.concatenate((d_normal @ normal_jacobians[slot], d_distance), axis=-1)
+                blocks = [d_camera @ initial_rotations[physical] @ d_mirrored] + blocks
+            data.append(np.concatenate(blocks, axis=-1).ravel())
+
+        return projected, (np.concatenate(data) if with_jacobian else None)
+
+    # Per-iteration cost and timing, logged by the solver's callback (whether the Jacobian is analytic or estimated).
+    iterations = []
+    start_time = time.perf_counter()
+
+    def residuals(parameters: np.ndarray) -> np.ndarray:
+        return (project(parameters)[0] - pixels).ravel()
+
+    def log_iteration(cost: float):
+        elapsed_time = time.perf_counter() - start_time
+        iteration_time = elapsed_time - (iterations[-1]["elapsed_time"] if iterations else 0.0)
+        iterations.append({
+            "iteration": len(iterations),
+            "cost": cost,
+            "iteration_time": iteration_time,
+            "elapsed_time": elapsed_time,
+        })
+        if verbose:
+            print(
+                f"Iteration {len(iterations) - 1:3d}: cost {cost:.6e} px^2,"
+                f" {iteration_time * 1000:8.2f} ms (total {elapsed_time:.3f} s)"
+            )
+
+    def jacobian(parameters: np.ndarray) -> csr_matrix:
+        data = project(parameters, with_jacobian=True)[1]
+        return csr_matrix((data, indices, indptr), shape=shape)
+
+    initial_view_parameters = np.zeros((len(refined_views), parameters_per_view))
+    if parameterization == "pose":
+        initial_view_parameters[:, 3:] = initial_translations[refined_views]
+    else:
+        initial_view_parameters[:, 2] = [mirror_planes[view_keys[v]].distance for v in refined_views]
+    initial_parameters = np.concatenate((initial_view_parameters.ravel(), points_3d[valid_points].ravel()))
+
+    if analytic_jacobian:
+        jacobian_options = {"jac": jacobian}
+    else:
+        sparsity = csr_matrix((np.ones(len(indices)), indices, indptr), shape=shape)
+        jacobian_options = {"jac": "2-point", "jac_sparsity": sparsity}
+
+    log_iteration(robust_cost(residuals(initial_parameters), loss, f_scale))
+    solution = least_squares(
+        residuals,
+        initial_parameters,
+        method="trf",
+        x_scale="jac",
+        loss=loss,
+        f_scale=f_scale,
+        max_nfev=max_nfev,
+        callback=lambda intermediate_result: log_iteration(float(intermediate_result.cost)),
+        **jacobian_options,
+    )
+    rotations, translations, _, points = unpack(solution.x)
+
+    # Fix the scale gauge: rescale the scene about the first fixed camera's center to keep the calibrated baseline.
+    fixed = [v for v in range(num_views) if refined_slots[v] < 0]
+    if fixed and refined_views:
+        centers = -np.einsum("vji,vj->vi", rotations, translations)
+        initial_centers = -np.einsum("vji,vj->vi", initial_rotations, initial_translations)
+        reference, first = fixed[0], refined_views[0]
+        baseline = np.linalg.norm(centers[first] - centers[reference])
+        if baseline > TOLERANCE_NEAR_ZERO:
+            scale = np.linalg.norm(initial_centers[first] - initial_centers[reference]) / baseline
+            points = centers[reference] + scale * (points - centers[reference])
+            centers[refined_views] = centers[reference] + scale * (centers[refined_views] - centers[reference])
+            translations[refined_views] = -np.einsum("vij,vj->vi", rotations[refined_views], centers[refined_views])
+
+    refined_camera_parameters = copy.deepcopy(camera_parameters)
+    for v in refined_views:
+        parameters = refined_camera_parameters[view_keys[v]]
+        parameters["rotation"] = rotations[v]
+        parameters["translation"] = translations[v].reshape(3, 1)
+        parameters["extrinsics"] = np.hstack((parameters["rotation"], parameters["translation"]))
+
+    refined_points = np.full((points_2d.shape[1], 3), np.nan)
+    refined_points[valid_points] = points
+
+    def reprojection_errors(projection_matrices: np.ndarray, points: np.ndarray) -> np.ndarray:
+        errors = np.linalg.norm(project_points(projection_matrices, points) - points_2d, axis=-1)
+        errors[~np.all(np.isfinite(points_2d), axis=-1)] = np.nan
+        return errors
+
+    refined_projection_matrices = projection_matrices_from_camera_parameters(refined_camera_parameters, view_keys)
+    return BundleAdjustmentResult(
+        refined_camera_parameters,
+        refined_points,
+        estimate_mirror_planes(refined_camera_parameters),
+        reprojection_errors(projection_matrices, np.where(np.isfinite(refined_points), points_3d, np.nan)),
+        reprojection_errors(refined_projection_matrices, refined_points),
+        iterations,
+        bool(solution.success),
+        str(solution.message),
+    )
+
+
+def load_observations(
+    camera_parameters: dict[str, dict[str, np.ndarray]],
+    path_annotations: Path | None = None,
+    path_trackfile: Path | None = None,
+    undistort: bool = False,
+) -> np.ndarray:
+    """
+    Gather the (V, N, 2) pixel observations of all annotated images and/or all frames of a DLTdv8a trackfile.
+    """
+    view_keys = list(camera_parameters)
+    num_views = len(view_keys)
+    observations = []
+    if path_annotations is not None:
+        annotations = Annotations.load_json(path_annotations, num_views)
+        observations.extend(annotations.get(filename)[0].astype(np.float64) for filename in annotations)
+    if path_trackfile is not None:
+        for _, pixels in iter_trackfile_chunks(path_trackfile, num_views):
+            observations.append(pixels.transpose(1, 0, 2, 3).reshape(num_views, -1, 2))
+
+    points_2d = np.concatenate(observations, axis=1)
+    if undistort:
+        intrinsics, distortion = stack_view_parameters(camera_parameters, view_keys)
+        points_2d = undistort_points(points_2d, intrinsics, distortion).points
+    return points_2d
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refine the mirror views' poses and the world points jointly.")
+    parser.add_argument("--bct-params", type=Path, required=True, help="Merged BCT calibration file (bct_params.mat)")
+    parser.add_argument("--annotations", type=Path, help="Annotations JSON file")
+    parser.add_argument("--trackfile", type=Path, help="DLTdv8a 2D trackfile in flat format (e.g., xypts.csv)")
+    parser.add_argument("--undistort", action="store_true", help="Undistort the pixels first")
+    parser.add_argument(
+        "--parameterization", choices=["pose", "mirror"], default="pose", help="Parameters of the virtual views"
+    )
+    parser.add_argument(
+        "--max-initial-error", type=float, default=MAX_INITIAL_ERROR, help="Leave out points above this error (px)"
+    )
+    parser.add_argument("--loss", default="linear", help="Robust loss, e.g. huber or soft_l1")
+    parser.add_argument("--f-scale", type=float, default=1.0, help="Inlier scale of the robust loss, in pixels")
+    parser.add_argument("--max-nfev", type=int, help="Maximum number of residual evaluations")
+    parser.add_argument("--output", type=Path, help="Write the refined calibration to this .mat file")
+    args = parser.parse_args()
+
+    if args.annotations is None and args.trackfile is None:
+        parser.error("Pass --annotations and/or --trackfile.")
+
+    camera_parameters = load_bct_params(args.bct_params)
+    points_2d = load_observations(camera_parameters, args.annotations, args.trackfile, args.undistort)
+    print(f"Bundle adjustment of {len(camera_parameters)} views and {points_2d.shape[1]} points")
+
+    start_time = time.perf_counter()
+    result = bundle_adjust(
+        camera_parameters,
+        points_2d,
+        parameterization=args.parameterization,
+        max_initial_error=args.max_initial_error,
+        loss=args.loss,
+        f_scale=args.f_scale,
+        max_nfev=args.max_nfev,
+    )
+    elapsed_time = time.perf_counter() - start_time
+    print(f"{result.message} ({len(result.iterations)} iterations in {elapsed_time:.2f} s)")
+
+    for label, errors in (("Initial", result.initial_reprojection_errors), ("Refined", result.reprojection_errors)):
+        mean_errors = np.nanmean(errors, axis=1)
+        rms_errors = np.sqrt(np.nanmean(errors**2, axis=1))
+        print(f"{label} Mean Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in mean_errors)}")
+        print(f"{label} RMS Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in rms_errors)}")
+    for view_key, plane in result.mirror_planes.items():
+        print(
+            f"{view_key} mirror plane: normal [{', '.join(f'{c:.6f}' for c in plane.normal)}], distance"
+            f" {plane.distance:.4f} (residuals: {plane.rotation_residual:.4f} deg, {plane.translation_residual:.4f})"
+        )
+
+    if args.output is not None:
+        save_bct_params(args.bct_params, args.output, result.camera_parameters)
+        print(f"Refined calibration saved to: {args.output}")
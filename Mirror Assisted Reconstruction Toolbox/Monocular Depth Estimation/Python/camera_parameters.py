@@ -0,0 +1,152 @@
+"""
+Loading of the camera parameters exported from the LCMART workflow.
+
+`camera_parameters.json` holds one entry per view, keyed as "physical" for the real camera and "virtual_1",
+"virtual_2", ... (or just "virtual" for single-mirror setups) for the mirror views:
+
+```json
+{
+  "physical": {
+    "intrinsics": {"array": [[fx, s, cx], [0, fy, cy], [0, 0, 1]]},
+    "extrinsics": {"array": [[r11, r12, r13, t1], [r21, r22, r23, t2], [r31, r32, r33, t3]]}
+  },
+  "virtual_1": {...}
+}
+```
+
+The extrinsics map world coordinates to camera coordinates (Bouguet's Rc_k and Tc_k) and may be stored either as 3x4 or
+as 4x4 matrices. Mirror views have left-handed rotations (det(R) = -1) as produced by `calib_process_results.m`.
+
+The same parameters can also be read straight from the merged BCT calibration file (`bct_params.mat`) written by
+`calib_process_results.m`, which holds KK_k, kc_k, Rc_k and Tc_k for every view label k in `view_labels` (1 = camera,
+2 = mirror 1, 3 = mirror 2).
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import scipy.io as sio
+
+
+def get_view_key(camera_parameters: dict, view_index: int) -> str:
+    """
+    Return the key of the `view_index`-th view (0 = physical camera, 1 = first mirror, ...) in the camera parameters.
+    """
+    if view_index == 0:
+        return "physical"
+    return f"virtual_{view_index}" if f"virtual_{view_index}" in camera_parameters else "virtual"
+
+
+def load_camera_parameters(path_camera_parameters: Path) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Load `camera_parameters.json` into NumPy arrays.
+
+    Parameters
+    ----------
+    path_camera_parameters : Path
+        Path to the camera parameters JSON file.
+
+    Returns
+    -------
+    dict[str, dict[str, np.ndarray]]
+        Maps each view key to a dict with the 3x3 "intrinsics" (K), 3x3 "rotation" (R), 3x1 "translation" (T) and 3x4
+        "extrinsics" ([R | T]) as float64 arrays, and the "distortion" coefficients [k1, k2, p1, p2, k3] if present
+        (zeros otherwise).
+    """
+    with Path(path_camera_parameters).open("r") as f:
+        camera_parameters_json: dict = json.load(f)
+
+    camera_parameters = {}
+    for view_key, view_parameters in camera_parameters_json.items():
+        intrinsics = np.array(view_parameters["intrinsics"]["array"], dtype=np.float64)
+        extrinsics = np.array(view_parameters["extrinsics"]["array"], dtype=np.float64)[:3, :4]
+        distortion = np.zeros(5)
+        if "distortion" in view_parameters:
+            coefficients = np.ravel(view_parameters["distortion"]["array"]).astype(np.float64)
+            distortion[: len(coefficients)] = coefficients[:5]
+
+        camera_parameters[view_key] = {
+            "intrinsics": intrinsics,
+            "rotation": extrinsics[:, :3].copy(),
+            "translation": extrinsics[:, 3:].copy(),
+            "extrinsics": extrinsics,
+            "distortion": distortion,
+        }
+
+    return camera_parameters
+
+
+def camera_parameters_to_json(camera_parameters: dict[str, dict[str, np.ndarray]]) -> dict:
+    """The `camera_parameters.json` contents of camera parameters (the inverse of `load_camera_parameters`)."""
+    return {
+        view_key: {
+            "intrinsics": {"array": np.asarray(parameters["intrinsics"]).tolist()},
+            "extrinsics": {"array": np.asarray(parameters["extrinsics"]).tolist()},
+            "distortion": {"array": np.asarray(parameters["distortion"]).tolist()},
+        }
+        for view_key, parameters in camera_parameters.items()
+    }
+
+
+def get_view_key_from_label(view_label: int) -> str:
+    """
+    Return the view key of a BCT view label (1 = camera -> "physical", 2 = mirror 1 -> "virtual_1", ...).
+    """
+    return "physical" if view_label == 1 else f"virtual_{view_label - 1}"
+
+
+def load_bct_params(path_bct_params: Path) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Load the merged BCT calibration file (`bct_params.mat`) into the same structure as `load_camera_parameters`.
+
+    Parameters
+    ----------
+    path_bct_params : Path
+        Path to the merged BCT calibration file.
+
+    Returns
+    -------
+    dict[str, dict[str, np.ndarray]]
+        Maps each view key (see `get_view_key_from_label`), in the order of `view_labels`, to a dict with the same
+        arrays as `load_camera_parameters`, plus the BCT "view_label".
+    """
+    # Only read the calibration of the listed views, not the rest of the BCT workspace.
+    view_labels = np.atleast_1d(
+        sio.loadmat(path_bct_params, variable_names=["view_labels"], squeeze_me=True)["view_labels"]
+    ).astype(int)
+    variable_names = [f"{name}_{view_label}" for view_label in view_labels for name in ("KK", "kc", "Rc", "Tc")]
+    bct_params = sio.loadmat(path_bct_params, variable_names=variable_names, squeeze_me=True)
+
+    camera_parameters = {}
+    for view_label in view_labels:
+        rotation = np.asarray(bct_params[f"Rc_{view_label}"], dtype=np.float64).reshape(3, 3)
+        translation = np.asarray(bct_params[f"Tc_{view_label}"], dtype=np.float64).reshape(3, 1)
+        distortion = np.zeros(5)
+        coefficients = np.ravel(bct_params[f"kc_{view_label}"]).astype(np.float64)
+        distortion[: len(coefficients)] = coefficients[:5]
+
+        camera_parameters[get_view_key_from_label(view_label)] = {
+            "intrinsics": np.asarray(bct_params[f"KK_{view_label}"], dtype=np.float64).reshape(3, 3),
+            "rotation": rotation,
+            "translation": translation,
+            "extrinsics": np.hstack((rotation, translation)),
+            "distortion": distortion,
+            "view_label": int(view_label),
+        }
+
+    return camera_parameters
+
+
+def save_bct_params(
+    path_bct_params: Path, path_output: Path, camera_parameters: dict[str, dict[str, np.ndarray]]
+) -> None:
+    """
+    Write a copy of a merged BCT calibration file with the rotations (`Rc_<label>`) and translations (`Tc_<label>`)
+    of the given (e.g., refined) camera parameters, so the MATLAB scripts can use them as-is.
+    """
+    bct_params = {key: value for key, value in sio.loadmat(path_bct_params).items() if not key.startswith("__")}
+    for parameters in camera_parameters.values():
+        bct_params[f"Rc_{parameters['view_label']}"] = parameters["rotation"]
+        bct_params[f"Tc_{parameters['view_label']}"] = np.reshape(parameters["translation"], (3, 1))
+    sio.savemat(path_output, bct_params)
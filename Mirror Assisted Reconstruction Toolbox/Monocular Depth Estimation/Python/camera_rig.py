@@ -0,0 +1,187 @@
+"""
+The camera rig (physical camera and its mirror views) as stacked, precomputed arrays.
+
+A `CameraRig` is loaded once from `camera_parameters.json` or `bct_params.mat`, and holds everything the per-image
+code needs for every view as contiguous (V, ...) float64 arrays: K and K^-1, the world-to-camera and camera-to-world
+4x4 matrices, the projection matrices P = K [R | T] and the fundamental matrices of every ordered pair of views. Its
+`project` and `backproject` methods handle all points of all views with one matrix multiplication, instead of
+rebuilding matrices and looping over the views for every annotation.
+
+Mirror views have left-handed rotations (det(R) = -1), which need no special care: the inverse of [R | T] is still
+[R^T | -R^T T].
+"""
+
+import copy
+from pathlib import Path
+
+import numpy as np
+from camera_parameters import load_bct_params, load_camera_parameters
+from epipolar_geometry import fundamental_matrix_from_projection_matrices
+
+
+class CameraRig:
+    """
+    Precomputed camera matrices of all views of a rig, in view order (physical camera first).
+
+    Parameters
+    ----------
+    camera_parameters : dict[str, dict[str, np.ndarray]]
+        Camera parameters, e.g. from `camera_parameters.load_bct_params`.
+    view_keys : list[str], optional
+        The views to keep, in order. Defaults to all views, in the order of `camera_parameters`.
+
+    Attributes
+    ----------
+    view_keys : list[str]
+        The V view keys ("physical", "virtual_1", ..., as in `camera_parameters`).
+    intrinsics, intrinsics_inverse : np.ndarray
+        (V, 3, 3) K and K^-1.
+    distortion : np.ndarray
+        (V, 5) distortion coefficients [k1, k2, p1, p2, k3].
+    world_to_camera, camera_to_world : np.ndarray
+        (V, 4, 4) homogeneous extrinsics [R | T] and their inverses [R^T | -R^T T].
+    projection_matrices : np.ndarray
+        (V, 3, 4) projection matrices P = K [R | T].
+    camera_centers : np.ndarray
+        (V, 3) camera centers in world coordinates.
+    fundamental_matrices : np.ndarray
+        (V, V, 3, 3) fundamental matrices: F[i, j] maps points x in view i to epipolar lines F[i, j] @ x in view j
+        (normalized so that F[2, 2] = 1 where possible, zero for i = j).
+    """
+
+    def __init__(self, camera_parameters: dict[str, dict[str, np.ndarray]], view_keys: list[str] | None = None):
+        if view_keys is None:
+            view_keys = list(camera_parameters)
+        self.view_keys = list(view_keys)
+        num_views = len(self.view_keys)
+
+        self.intrinsics = np.ascontiguousarray(
+            np.stack([camera_parameters[view_key]["intrinsics"] for view_key in self.view_keys]), dtype=np.float64
+        )
+        self.distortion = np.ascontiguousarray(
+            np.stack([camera_parameters[view_key]["distortion"] for view_key in self.view_keys]), dtype=np.float64
+        )
+        rotations = np.stack([camera_parameters[view_key]["rotation"] for view_key in self.view_keys])
+        translations = np.stack([np.ravel(camera_parameters[view_key]["translation"]) for view_key in self.view_keys])
+
+        self.world_to_camera = np.zeros((num_views, 4, 4))
+        self.world_to_camera[:, :3, :3] = rotations
+        self.world_to_camera[:, :3, 3] = translations
+        self.world_to_camera[:, 3, 3] = 1.0
+        self.camera_to_world = np.zeros((num_views, 4, 4))
+        self.camera_to_world[:, :3, :3] = np.swapaxes(rotations, 1, 2)
+        self.camera_to_world[:, :3, 3] = -np.einsum("vji,vj->vi", rotations, translations)
+        self.camera_to_world[:, 3, 3] = 1.0
+
+        self._update_intrinsics_dependents()
+
+    def _update_intrinsics_dependents(self) -> None:
+        """Recompute everything that depends on the intrinsics."""
+        self.intrinsics_inverse = np.ascontiguousarray(np.linalg.inv(self.intrinsics))
+        self.projection_matrices = np.ascontiguousarray(self.intrinsics @ self.world_to_camera[:, :3])
+        self.camera_centers = np.ascontiguousarray(self.camera_to_world[:, :3, 3])
+
+        self.fundamental_matrices = np.zeros((self.num_views, self.num_views, 3, 3))
+        for i in range(self.num_views):
+            center = np.append(self.camera_centers[i], 1.0)
+            for j in range(self.num_views):
+                if i != j:
+                    self.fundamental_matrices[i, j] = fundamental_matrix_from_projection_matrices(
+                        self.projection_matrices[i], self.projection_matrices[j], center
+                    )
+
+    @classmethod
+    def load(cls, path_camera_parameters: Path, num_views: int | None = None) -> "CameraRig":
+        """
+        Load a rig from `camera_parameters.json` or a merged BCT calibration file (`.mat`), optionally keeping only the
+        first `num_views` views (whatever their view labels, e.g., "physical" and "virtual_2" for labels [1, 3]).
+        """
+        path_camera_parameters = Path(path_camera_parameters)
+        if path_camera_parameters.suffix == ".mat":
+            camera_parameters = load_bct_params(path_camera_parameters)
+        else:
+            camera_parameters = load_camera_parameters(path_camera_parameters)
+        if num_views is None:
+            num_views = len(camera_parameters)
+        if num_views > len(camera_parameters):
+            raise ValueError(
+                f"Expected {num_views} camera parameter sets ('physical' + {num_views - 1} virtual), found"
+                f" {len(camera_parameters)}: {list(camera_parameters)}"
+            )
+        return cls(camera_parameters, list(camera_parameters)[:num_views])
+
+    def with_principal_point(self, principal_point: tuple[float, float]) -> "CameraRig":
+        """A copy of the rig with the principal point (cx, cy) of every view replaced, e.g. by the image center."""
+        rig = copy.copy(self)
+        rig.intrinsics = self.intrinsics.copy()
+        rig.intrinsics[:, :2, 2] = principal_point
+        rig._update_intrinsics_dependents()
+        return rig
+
+    @property
+    def num_views(self) -> int:
+        return len(self.view_keys)
+
+    @property
+    def rotations(self) -> np.ndarray:
+        """(V, 3, 3) world-to-camera rotations (views of `world_to_camera`)."""
+        return self.world_to_camera[:, :3, :3]
+
+    @property
+    def translations(self) -> np.ndarray:
+        """(V, 3) world-to-camera translations (views of `world_to_camera`)."""
+        return self.world_to_camera[:, :3, 3]
+
+    def project(self, points_3d: np.ndarray, space: str = "world") -> np.ndarray:
+        """
+        Project points into every view with one matrix multiplication (no distortion).
+
+        Parameters
+        ----------
+        points_3d : array_like
+            (N, 3) points shared by all views, or (V, N, 3) points per view.
+        space : str, optional
+            "world" for world coordinates, or "camera" for each view's own camera coordinates.
+
+        Returns
+        -------
+        np.ndarray
+            (V, N, 2) pixel coordinates.
+        """
+        if space == "world":
+            matrices = self.projection_matrices
+        else:
+            matrices = np.concatenate((self.intrinsics, np.zeros((self.num_views, 3, 1))), axis=-1)
+        homogeneous = np.asarray(points_3d, dtype=np.float64) @ np.swapaxes(matrices[:, :, :3], 1, 2)
+        homogeneous += matrices[:, None, :, 3]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return homogeneous[..., :2] / homogeneous[..., 2:]
+
+    def backproject(self, pixels: np.ndarray, depths: np.ndarray, space: str = "world") -> np.ndarray:
+        """
+        Backproject (undistorted) pixels of every view at the given depths with one matrix multiplication.
+
+        Parameters
+        ----------
+        pixels : array_like
+            (V, N, 2) pixel coordinates.
+        depths : array_like
+            (V, N) depths along each camera's optical axis (z in camera coordinates).
+        space : str, optional
+            Return the points in "world" coordinates, or in each view's own "camera" coordinates.
+
+        Returns
+        -------
+        np.ndarray
+            (V, N, 3) points.
+        """
+        pixels = np.asarray(pixels, dtype=np.float64)
+        rays = pixels @ np.swapaxes(self.intrinsics_inverse[:, :, :2], 1, 2) + self.intrinsics_inverse[:, None, :, 2]
+        points = rays * np.asarray(depths, dtype=np.float64)[..., None]
+        if space == "world":
+            points = points @ np.swapaxes(self.camera_to_world[:, :3, :3], 1, 2) + self.camera_centers[:, None]
+        return points
+
+    def view_index(self, view_key: str) -> int:
+        """Index of a view key in the rig."""
+        return self.view_keys.index(view_key)
@@ -3,7 +3,254 @@ This script, given the LCMART directory structure as provided in README.md, will
 camera_parameters.json file, baseline_world_points.json, and the annotated_coordinates.json file.
 
 The MATLAB version of this script is `convert_matfiles.m`.
+
+It reads (directory names are matched case-insensitively, as in `evaluate.m`):
+
+    <lcmart_root>/
+    ├── Calibration/bct_params.mat             -> camera_parameters.json (KK, kc, Rc and Tc of every view label)
+    └── Reconstruction/<image_identifier>/
+        ├── <image_name>.jpg                   (names the image in the JSON files)
+        ├── xyzpts.mat                         -> baseline_world_points.json (X_est)
+        └── marked_points.mat                  -> annotated_coordinates.json (x, num_points)
+
+Only the needed variables are read from each .mat file (`loadmat(variable_names=...)`). The conversion is incremental:
+a manifest (`.convert_matfiles_manifest.json` in the output directory) records the size, modification time and hash
+of every source together with its converted entry. Unchanged sources are taken from the manifest without being read,
+and an output is only rewritten if one of its sources was added, changed or removed (or the output is missing). The
+hash is only recomputed if a source's size or modification time changed, so refreshing a large project after
+re-running one reconstruction reads just that reconstruction.
+
+With `--npz`, the annotations are also written in the binary format of `annotations.py` (`annotated_coordinates.npz`),
+split into as many views as the calibration has.
+
+Usage:
+    python convert_matfiles.py ../Data/LCMART --output-dir depth-anything-v2
+    python convert_matfiles.py ../Data/LCMART --force
+    python convert_matfiles.py ../Data/LCMART --npz
 """
 
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import scipy.io as sio
+from annotations import Annotations
+from camera_parameters import camera_parameters_to_json, load_bct_params
+from frame_store import compute_file_hash
+
+# Configuration (mirrors `defaults.m` and `evaluate.m`)
+CALIBRATION_DIRNAME = "calibration"
+RECONSTRUCTION_DIRNAME = "reconstruction"
+BCT_PARAMS_FILENAME = "bct_params.mat"
+XYZPTS_FILENAME = "xyzpts.mat"
+MARKED_POINTS_FILENAME = "marked_points.mat"
+IMG_EXTENSIONS = (".jpg", ".png", ".tif", ".bmp")
+
+CAMERA_PARAMETERS_FILENAME = "camera_parameters.json"
+BASELINE_POINTS_FILENAME = "baseline_world_points.json"
+ANNOTATED_COORDINATES_FILENAME = "annotated_coordinates.json"
+ANNOTATIONS_NPZ_FILENAME = "annotated_coordinates.npz"
+MANIFEST_FILENAME = ".convert_matfiles_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def find_child(directory: Path, name: str) -> Path | None:
+    """The child of a directory with the given name, compared case-insensitively (None if missing)."""
+    if not directory.is_dir():
+        return None
+    return next((child for child in sorted(directory.iterdir()) if child.name.lower() == name.lower()), None)
+
+
+def find_image_filename(reconstruction_dir: Path) -> str:
+    """The filename of the image copied into a reconstruction directory, or `<image_identifier>.jpg` if none."""
+    image = next((p for p in sorted(reconstruction_dir.iterdir()) if p.suffix.lower() in IMG_EXTENSIONS), None)
+    return image.name if image is not None else f"{reconstruction_dir.name}{IMG_EXTENSIONS[0]}"
+
+
+def convert_bct_params(path_bct_params: Path) -> dict:
+    """The `camera_parameters.json` contents of a merged BCT calibration file."""
+    return camera_parameters_to_json(load_bct_params(path_bct_params))
+
+
+def convert_xyzpts(path_xyzpts: Path) -> list[list[float]]:
+    """The (N, 3) world points (`X_est`, 3xN) of a reconstruction as a list."""
+    X_est = sio.loadmat(path_xyzpts, variable_names=["X_est"])["X_est"]
+    return np.asarray(X_est, dtype=np.float64).T.tolist()
+
+
+def convert_marked_points(path_marked_points: Path) -> dict:
+    """The annotation of `marked_points.mat` (x: 3xN homogeneous pixels, num_points), in the JSON layout."""
+    marked_points = sio.loadmat(path_marked_points, variable_names=["x", "num_points"], squeeze_me=True)
+    x = np.asarray(marked_points["x"], dtype=np.float64)
+    return {"num_physical_points": int(marked_points["num_points"]), "points": (x[:2] / x[2]).T.tolist()}
+
+
+def load_manifest(path_manifest: Path) -> dict:
+    """Load the conversion manifest, or start an empty one if it is missing, unreadable or outdated."""
+    try:
+        with path_manifest.open("r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "sources": {}}
+    return manifest
+
+
+def get_source_entry(manifest: dict, key: str, path_source: Path, convert, force: bool = False) -> tuple[object, bool]:
+    """
+    Return the converted entry of a source file and whether it changed, converting it only if its contents changed
+    since the manifest was written.
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest (updated in place).
+    key : str
+        The source's key in the manifest (its path relative to the LCMART root).
+    path_source : Path
+        Path to the source file.
+    convert : Callable[[Path], object]
+        Converts the source into its (JSON-serializable) entry.
+    force : bool, optional
+        Convert the source even if it did not change.
+    """
+    stat = path_source.stat()
+    record = manifest["sources"].get(key)
+    if not force and record is not None:
+        if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            return record["entry"], False
+        # Touched, but maybe not changed: only the contents decide whether to convert again.
+        source_hash = compute_file_hash(path_source)
+        if source_hash == record["hash"]:
+            record["size"], record["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+            return record["entry"], False
+    else:
+        source_hash = compute_file_hash(path_source)
+
+    entry = convert(path_source)
+    manifest["sources"][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": source_hash, "entry": entry}
+    return entry, True
+
+
+def convert_lcmart(
+    lcmart_root: Path, output_dir: Path | None = None, force: bool = False, write_npz: bool = False
+) -> dict[str, bool]:
+    """
+    Export the camera parameters, baseline world points and annotations of an LCMART directory to JSON, incrementally.
+
+    Parameters
+    ----------
+    lcmart_root : Path
+        The LCMART data directory (with `Calibration` and `Reconstruction`).
+    output_dir : Path, optional
+        Where to write the JSON files and the manifest. Defaults to `lcmart_root`.
+    force : bool, optional
+        Convert every source and rewrite every output, ignoring the manifest.
+    write_npz : bool, optional
+        Also write the annotations as an `Annotations` archive (`annotated_coordinates.npz`), with one view per view of
+        the calibration. Needs `bct_params.mat`.
+
+    Returns
+    -------
+    dict[str, bool]
+        Maps each output filename to whether it was (re)written.
+    """
+    lcmart_root = Path(lcmart_root)
+    output_dir = lcmart_root if output_dir is None else Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path_manifest = output_dir / MANIFEST_FILENAME
+    manifest = load_manifest(path_manifest)
+    previous_keys = set(manifest["sources"])
+
+    # Each output's contents and whether any of its sources changed.
+    outputs: dict[str, tuple[object, bool]] = {}
+    seen_keys = set()
+
+    calibration_dir = find_child(lcmart_root, CALIBRATION_DIRNAME)
+    path_bct_params = None if calibration_dir is None else find_child(calibration_dir, BCT_PARAMS_FILENAME)
+    if path_bct_params is not None:
+        key = path_bct_params.relative_to(lcmart_root).as_posix()
+        seen_keys.add(key)
+        outputs[CAMERA_PARAMETERS_FILENAME] = get_source_entry(
+            manifest, key, path_bct_params, convert_bct_params, force
+        )
+    else:
+        print(f"Warning: No {CALIBRATION_DIRNAME}/{BCT_PARAMS_FILENAME} in {lcmart_root.as_posix()}")
+
+    baseline_points, annotations = [], []
+    baseline_changed, annotations_changed = False, False
+    reconstruction_root = find_child(lcmart_root, RECONSTRUCTION_DIRNAME)
+    reconstruction_dirs = []
+    if reconstruction_root is not None:
+        reconstruction_dirs = sorted(p for p in reconstruction_root.iterdir() if p.is_dir())
+    for reconstruction_dir in reconstruction_dirs:
+        filename = find_image_filename(reconstruction_dir)
+        path_xyzpts = find_child(reconstruction_dir, XYZPTS_FILENAME)
+        if path_xyzpts is not None:
+            key = path_xyzpts.relative_to(lcmart_root).as_posix()
+            seen_keys.add(key)
+            points, changed = get_source_entry(manifest, key, path_xyzpts, convert_xyzpts, force)
+            baseline_points.append({"filename": filename, "points": points})
+            baseline_changed |= changed
+
+        path_marked_points = find_child(reconstruction_dir, MARKED_POINTS_FILENAME)
+        if path_marked_points is not None:
+            key = path_marked_points.relative_to(lcmart_root).as_posix()
+            seen_keys.add(key)
+            annotation, changed = get_source_entry(manifest, key, path_marked_points, convert_marked_points, force)
+            annotations.append({"filename": filename, **annotation})
+            annotations_changed |= changed
+
+    # Sources that disappeared since the last run also change their output.
+    removed_keys = previous_keys - seen_keys
+    for key in removed_keys:
+        del manifest["sources"][key]
+    removed_names = {Path(key).name.lower() for key in removed_keys}
+    outputs[BASELINE_POINTS_FILENAME] = (baseline_points, baseline_changed or XYZPTS_FILENAME in removed_names)
+    annotations_changed |= MARKED_POINTS_FILENAME in removed_names
+    outputs[ANNOTATED_COORDINATES_FILENAME] = (annotations, annotations_changed)
+
+    written = {}
+    for output_filename, (contents, changed) in outputs.items():
+        path_output = output_dir / output_filename
+        written[output_filename] = force or changed or not path_output.exists()
+        if written[output_filename]:
+            with path_output.open("w") as f:
+                json.dump(contents, f, indent=2)
+
+    if write_npz:
+        if CAMERA_PARAMETERS_FILENAME not in outputs:
+            print(f"Warning: Cannot write {ANNOTATIONS_NPZ_FILENAME} without the calibration (number of views)")
+        else:
+            camera_parameters, camera_parameters_changed = outputs[CAMERA_PARAMETERS_FILENAME]
+            path_npz = output_dir / ANNOTATIONS_NPZ_FILENAME
+            written[ANNOTATIONS_NPZ_FILENAME] = (
+                force or annotations_changed or camera_parameters_changed or not path_npz.exists()
+            )
+            if written[ANNOTATIONS_NPZ_FILENAME]:
+                Annotations.from_list(annotations, len(camera_parameters)).save(path_npz)
+
+    with path_manifest.open("w") as f:
+        json.dump(manifest, f)
+    return written
+
+
 if __name__ == "__main__":
-    pass
+    parser = argparse.ArgumentParser(description="Export the LCMART .mat files to the JSON files used in Python.")
+    parser.add_argument("lcmart_root", type=Path, help="LCMART data directory (with Calibration and Reconstruction)")
+    parser.add_argument("--output-dir", type=Path, help="Output directory (default: the LCMART directory)")
+    parser.add_argument("--force", action="store_true", help="Convert everything again, ignoring the manifest")
+    parser.add_argument("--npz", action="store_true", help=f"Also write the annotations to {ANNOTATIONS_NPZ_FILENAME}")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    written = convert_lcmart(args.lcmart_root, args.output_dir, args.force, args.npz)
+    elapsed_time = time.perf_counter() - start_time
+
+    output_dir = args.lcmart_root if args.output_dir is None else args.output_dir
+    for output_filename, was_written in written.items():
+        print(f"{(output_dir / output_filename).as_posix()}: {'written' if was_written else 'up to date'}")
+    print(f"Done in {elapsed_time:.2f} s.")
@@ -0,0 +1,446 @@
+"""
+Assisted physical <-> virtual correspondence matching restricted to epipolar bands.
+
+Features (ORB or SIFT) are detected in the physical region and in the virtual (mirror) region of each image. The mirror
+reverses the handedness of the virtual region, which neither descriptor tolerates, so it is flipped horizontally before
+its features are described (any reflection is a horizontal flip up to a rotation, which both descriptors are invariant
+to). Each physical feature is only compared against the virtual features lying within a narrow band around its
+epipolar line, where the fundamental matrix comes from the camera rig in `camera_parameters.json` (see
+`epipolar_geometry.py`).
+
+The band lookup does not compare against every virtual feature. All epipolar lines pass through the epipole, so the
+virtual features are indexed by their angle around the epipole, split into radial rings. A band then maps to a small
+angular window per ring, found by binary search, and the matching cost grows near-linearly with the number of features
+instead of with all pairs.
+
+The proposed correspondences are shown one by one for the user to accept (Y) or reject (N). Accepted ones are written
+in the `annotated_coordinates.json` format: physical points first, followed by their virtual counterparts in the same
+order.
+
+NOTE: The fundamental matrices do not model lens distortion, so use undistorted images.
+"""
+
+import json
+from pathlib import Path
+from typing import Literal, NamedTuple
+
+import cv2
+import numpy as np
+from camera_parameters import get_view_key, load_camera_parameters
+from epipolar_geometry import (
+    clip_lines_to_image,
+    compute_epipolar_lines,
+    compute_fundamental_matrices,
+    point_line_distances,
+)
+
+# Configuration
+BASEDIR = "depth-anything-v2"
+IMAGE_DIR = Path(BASEDIR, "color")
+PATH_CAMERA_PARAMETERS = Path(BASEDIR, "camera_parameters.json")
+OUTPUT_FILE = Path(BASEDIR, "matched_coordinates.json")
+SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")
+DETECTOR: Literal["orb", "sift"] = "orb"
+MAX_FEATURES = 2000
+# Half-width (in pixels) of the band around each epipolar line to search for matches in.
+EPIPOLAR_BAND_HALF_WIDTH = 3.0
+# Lowe's ratio test between the best and second-best candidate in the band.
+RATIO_TEST_THRESHOLD = 0.8
+# Index of the mirror view to match against (1 = first mirror).
+VIRTUAL_VIEW_INDEX = 1
+# Regions as (x, y, width, height). None asks for the region interactively on the first image.
+PHYSICAL_REGION = None
+VIRTUAL_REGION = None
+REVIEW_PROPOSALS = True
+DISPLAY_MAX_WIDTH = 1280
+DISPLAY_MAX_HEIGHT = 720
+# Colors in BGR order.
+PHYSICAL_POINT_COLOR = (0, 0, 255)
+VIRTUAL_POINT_COLOR = (0, 255, 0)
+EPIPOLAR_LINE_COLOR = (255, 255, 0)
+
+
+class Features(NamedTuple):
+    """Detected keypoint locations and their descriptors."""
+
+    points: np.ndarray
+    """Nx2 keypoint locations in image coordinates."""
+    descriptors: np.ndarray
+    """NxD descriptors (uint8 for ORB, float32 for SIFT)."""
+
+
+class CorrespondenceProposals(NamedTuple):
+    """Proposed physical <-> virtual correspondences, sorted from best to worst descriptor distance."""
+
+    physical_points: np.ndarray
+    """Kx2 points in the physical region."""
+    virtual_points: np.ndarray
+    """Kx2 matching points in the virtual region."""
+    descriptor_distances: np.ndarray
+    """(K,) descriptor distances of the matches."""
+    epipolar_distances: np.ndarray
+    """(K,) distances (in pixels) of the virtual points to the physical points' epipolar lines."""
+
+
+def detect_features(
+    image: np.ndarray,
+    region: tuple[int, int, int, int],
+    detector: Literal["orb", "sift"] = "orb",
+    max_features: int = 2000,
+    mirrored: bool = False,
+) -> Features:
+    """
+    Detect features inside a rectangular region of an image.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        HxW (grayscale) or HxWx3 (BGR) image.
+    region : tuple[int, int, int, int]
+        (x, y, width, height) of the region to detect features in.
+    detector : Literal["orb", "sift"], optional
+        Feature detector/descriptor to use.
+    max_features : int, optional
+        Maximum number of features to keep.
+    mirrored : bool, optional
+        Whether the region is seen through a mirror. If so, the image is flipped horizontally before detection, so the
+        descriptors match those of the physical region, and the keypoints are mapped back.
+
+    Returns
+    -------
+    Features
+        Keypoint locations (in full image coordinates) and descriptors.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    image_width = gray.shape[1]
+    x, y, w, h = region
+    if mirrored:
+        gray = cv2.flip(gray, 1)
+        x = image_width - x - w
+    mask = np.zeros(gray.shape, dtype=np.uint8)
+    mask[y : y + h, x : x + w] = 255
+
+    if detector == "orb":
+        feature_detector = cv2.ORB_create(nfeatures=max_features)
+        descriptor_dtype, descriptor_size = np.uint8, 32
+    elif detector == "sift":
+        feature_detector = cv2.SIFT_create(nfeatures=max_features)
+        descriptor_dtype, descriptor_size = np.float32, 128
+    else:
+        raise ValueError(f"Unknown detector: '{detector}'. Use 'orb' or 'sift'.")
+
+    keypoints, descriptors = feature_detector.detectAndCompute(gray, mask)
+    if descriptors is None:
+        return Features(np.empty((0, 2)), np.empty((0, descriptor_size), dtype=descriptor_dtype))
+
+    points = np.array([keypoint.pt for keypoint in keypoints], dtype=np.float64).reshape(-1, 2)
+    if mirrored:
+        points[:, 0] = image_width - 1 - points[:, 0]
+    return Features(points, descriptors)
+
+
+class EpipolarBandIndex:
+    """
+    Index of points in one view for fast "which points lie within distance w of this epipolar line?" queries.
+
+    Every epipolar line passes through the epipole, so a point at distance r from the epipole that lies within w of a
+    line deviates from the line's direction by at most asin(w / r). Points are bucketed into radial rings around the
+    epipole and sorted by their (undirected) angle within each ring, so each query is a binary search per ring followed
+    by an exact distance check on the few candidates. If the epipole is at infinity, all epipolar lines are parallel and
+    the points are sorted by their offset along the common normal instead.
+    """
+
+    def __init__(self, points: np.ndarray, epipole: np.ndarray, num_rings: int = 8):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        epipole = np.asarray(epipole, dtype=np.float64).ravel()
+        scale = max(np.abs(self.points).max(initial=1.0), 1.0)
+        self.epipole_at_infinity = abs(epipole[2]) < 1e-9 * np.linalg.norm(epipole[:2]) / scale
+
+        if self.epipole_at_infinity:
+            # All lines are parallel to the epipole's direction; index by the signed offset along their normal.
+            direction = epipole[:2] / np.linalg.norm(epipole[:2])
+            self.normal = np.array([-direction[1], direction[0]])
+            offsets = self.points @ self.normal
+            self.order = np.argsort(offsets)
+            self.sorted_offsets = offsets[self.order]
+            return
+
+        self.epipole = epipole[:2] / epipole[2]
+        relative = self.points - self.epipole
+        radii = np.hypot(relative[:, 0], relative[:, 1])
+        angles = np.mod(np.arctan2(relative[:, 1], relative[:, 0]), np.pi)
+
+        # Log-spaced rings: the angular tolerance asin(w / r) shrinks with r, so each ring gets its own.
+        positive_radii = radii[radii > 0]
+        min_radius = positive_radii.min() if len(positive_radii) else 1.0
+        max_radius = max(radii.max(initial=1.0), min_radius * (1 + 1e-9))
+        edges = np.geomspace(min_radius, max_radius, num_rings + 1)
+        edges[0], edges[-1] = 0.0, np.inf
+        ring_ids = np.clip(np.searchsorted(edges, radii, side="right") - 1, 0, num_rings - 1)
+
+        self.rings = []
+        for ring_id in range(num_rings):
+            members = np.flatnonzero(ring_ids == ring_id)
+            if len(members) == 0:
+                continue
+            order = np.argsort(angles[members])
+            self.rings.append((radii[members].min(), members[order], angles[members][order]))
+
+    def query(self, line: np.ndarray, half_width: float) -> np.ndarray:
+        """Return the indices of all points within `half_width` pixels of the normalized line [a, b, c]."""
+        a, b, c = line
+        if self.epipole_at_infinity:
+            # Normalized lines parallel to the common direction: a * x + b * y + c = 0 with [a, b] = +/- normal.
+            sign = np.sign(np.dot([a, b], self.normal)) or 1.0
+            offset = -c * sign
+            lo = np.searchsorted(self.sorted_offsets, offset - half_width, side="left")
+            hi = np.searchsorted(self.sorted_offsets, offset + half_width, side="right")
+            candidates = self.order[lo:hi]
+        else:
+            line_angle = np.mod(np.arctan2(a, -b), np.pi)
+            candidate_chunks = []
+            for ring_min_radius, members, sorted_angles in self.rings:
+                if ring_min_radius <= half_width:
+                    candidate_chunks.append(members)
+                    continue
+                tolerance = np.arcsin(half_width / ring_min_radius)
+                candidate_chunks.extend(
+                    members[lo:hi] for lo, hi in self._angular_window(sorted_angles, line_angle, tolerance)
+                )
+            candidates = np.concatenate(candidate_chunks) if candidate_chunks else np.empty(0, dtype=np.int64)
+
+        # Exact check on the (few) candidates.
+        distances = np.abs(self.points[candidates] @ np.array([a, b]) + c)
+        return candidates[distances <= half_width]
+
+    @staticmethod
+    def _angular_window(sorted_angles: np.ndarray, center: float, tolerance: float) -> list[tuple[int, int]]:
+        """Index ranges of the sorted angles (in [0, pi)) within `tolerance` of `center`, wrapping around pi."""
+        lower, upper = center - tolerance, center + tolerance
+        windows = [(np.searchsorted(sorted_angles, max(lower, 0.0)), np.searchsorted(sorted_angles, upper, "right"))]
+        if lower < 0:
+            windows.append((np.searchsorted(sorted_angles, lower + np.pi), len(sorted_angles)))
+        if upper >= np.pi:
+            windows.append((0, np.searchsorted(sorted_angles, upper - np.pi, "right")))
+        return windows
+
+
+def _descriptor_distances(query: np.ndarray, candidates: np.ndarray, is_binary: bool) -> np.ndarray:
+    """Hamming distances for binary descriptors (on unpacked bits), L2 distances otherwise."""
+    if is_binary:
+        return np.count_nonzero(candidates != query, axis=1).astype(np.float64)
+    return np.linalg.norm(candidates - query, axis=1)
+
+
+def match_in_epipolar_bands(
+    physical_features: Features,
+    virtual_features: Features,
+    fundamental_matrix: np.ndarray,
+    epipole_virtual: np.ndarray,
+    band_half_width: float = 3.0,
+    ratio_test_threshold: float = 0.8,
+) -> CorrespondenceProposals:
+    """
+    Match physical features to virtual features, comparing each only against the virtual features in its epipolar band.
+
+    Parameters
+    ----------
+    physical_features, virtual_features : Features
+        Features detected in the physical and virtual regions.
+    fundamental_matrix : np.ndarray
+        3x3 fundamental matrix mapping physical points to epipolar lines in the virtual view.
+    epipole_virtual : np.ndarray
+        Homogeneous epipole (3,) in the virtual view.
+    band_half_width : float, optional
+        Half-width (in pixels) of the band around each epipolar line.
+    ratio_test_threshold : float, optional
+        A match is kept only if its descriptor distance is below this fraction of the second-best candidate's.
+
+    Returns
+    -------
+    CorrespondenceProposals
+        One-to-one correspondences, sorted from best to worst descriptor distance.
+    """
+    empty = CorrespondenceProposals(np.empty((0, 2)), np.empty((0, 2)), np.empty(0), np.empty(0))
+    if len(physical_features.points) == 0 or len(virtual_features.points) == 0:
+        return empty
+
+    is_binary = physical_features.descriptors.dtype == np.uint8
+    if is_binary:
+        physical_descriptors = np.unpackbits(physical_features.descriptors, axis=1)
+        virtual_descriptors = np.unpackbits(virtual_features.descriptors, axis=1)
+    else:
+        physical_descriptors = physical_features.descriptors.astype(np.float32)
+        virtual_descriptors = virtual_features.descriptors.astype(np.float32)
+
+    band_index = EpipolarBandIndex(virtual_features.points, epipole_virtual)
+    lines = compute_epipolar_lines(fundamental_matrix, physical_features.points)
+
+    matches = []
+    for i, line in enumerate(lines):
+        candidates = band_index.query(line, band_half_width)
+        if len(candidates) == 0:
+            continue
+
+        distances = _descriptor_distances(physical_descriptors[i], virtual_descriptors[candidates], is_binary)
+        best = np.argmin(distances)
+        if len(candidates) > 1:
+            second_best = np.partition(distances, 1)[1]
+            if distances[best] >= ratio_test_threshold * second_best:
+                continue
+        matches.append((i, candidates[best], distances[best]))
+
+    if not matches:
+        return empty
+
+    # Keep matches one-to-one: each virtual feature goes to the physical feature matching it best.
+    matches = np.array(matches, dtype=np.float64)
+    matches = matches[np.argsort(matches[:, 2], kind="stable")]
+    _, first_occurrences = np.unique(matches[:, 1], return_index=True)
+    matches = matches[np.sort(first_occurrences)]
+
+    physical_indices = matches[:, 0].astype(np.int64)
+    virtual_indices = matches[:, 1].astype(np.int64)
+    physical_points = physical_features.points[physical_indices]
+    virtual_points = virtual_features.points[virtual_indices]
+    epipolar_distances = np.abs(point_line_distances(virtual_points, lines[physical_indices]))
+
+    return CorrespondenceProposals(physical_points, virtual_points, matches[:, 2], epipolar_distances)
+
+
+def review_proposals(
+    image: np.ndarray, proposals: CorrespondenceProposals, fundamental_matrix: np.ndarray, window_name: str
+) -> np.ndarray | None:
+    """
+    Show each proposal for the user to accept or reject.
+
+    Keys: Y = accept, N = reject, A = accept all remaining, S = skip all remaining, Q/Esc = quit.
+
+    Returns
+    -------
+    np.ndarray | None
+        Boolean mask of accepted proposals, or None if the user quit.
+    """
+    scale = min(DISPLAY_MAX_WIDTH / image.shape[1], DISPLAY_MAX_HEIGHT / image.shape[0], 1.0)
+    base_display = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    lines = compute_epipolar_lines(fundamental_matrix, proposals.physical_points)
+    endpoints = clip_lines_to_image(lines, image.shape[1], image.shape[0])
+
+    accepted = np.zeros(len(proposals.physical_points), dtype=bool)
+    for k in range(len(accepted)):
+        display = base_display.copy()
+        physical_point = tuple(np.rint(proposals.physical_points[k] * scale).astype(int))
+        virtual_point = tuple(np.rint(proposals.virtual_points[k] * scale).astype(int))
+        if not np.isnan(endpoints[k]).any():
+            x1, y1, x2, y2 = np.rint(endpoints[k] * scale).astype(int)
+            cv2.line(display, (x1, y1), (x2, y2), EPIPOLAR_LINE_COLOR, 1, cv2.LINE_AA)
+        cv2.circle(display, physical_point, 5, PHYSICAL_POINT_COLOR, 2)
+        cv2.circle(display, virtual_point, 5, VIRTUAL_POINT_COLOR, 2)
+        cv2.putText(
+            display,
+            f"{k + 1}/{len(accepted)}  descriptor: {proposals.descriptor_distances[k]:.1f}"
+            f"  epipolar: {proposals.epipolar_distances[k]:.2f} px  [Y/N/A/S/Q]",
+            (10, 20),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            EPIPOLAR_LINE_COLOR,
+            1,
+        )
+        cv2.imshow(window_name, display)
+
+        while True:
+            key = cv2.waitKey(0) & 0xFF
+            if key in (ord("y"), ord("n"), ord("a"), ord("s"), ord("q"), 27):
+                break
+
+        if key == ord("y"):
+            accepted[k] = True
+        elif key == ord("a"):
+            accepted[k:] = True
+            break
+        elif key == ord("s"):
+            break
+        elif key in (ord("q"), 27):
+            return None
+
+    return accepted
+
+
+def main():
+    if not IMAGE_DIR.is_dir():
+        print(f"Error: Directory '{IMAGE_DIR}' not found.")
+        return
+
+    image_files = sorted([f for f in IMAGE_DIR.iterdir() if f.suffix.lower() in SUPPORTED_EXTENSIONS])
+    if not image_files:
+        print(f"No supported images found in '{IMAGE_DIR}'.")
+        return
+
+    camera_parameters = load_camera_parameters(PATH_CAMERA_PARAMETERS)
+    virtual_view_key = get_view_key(camera_parameters, VIRTUAL_VIEW_INDEX)
+    fundamental_matrix = compute_fundamental_matrices(camera_parameters)[("physical", virtual_view_key)]
+
+    # The epipole in the virtual view is the left null vector of F (F^T e = 0).
+    epipole_virtual = np.linalg.svd(fundamental_matrix.T)[2][-1]
+
+    window_name = "Correspondence Proposals"
+    physical_region, virtual_region = PHYSICAL_REGION, VIRTUAL_REGION
+    all_annotations = []
+
+    for image_path in image_files:
+        image = cv2.imread(image_path.as_posix())
+        if image is None:
+            print(f"Warning: Could not load image: {image_path.as_posix()}")
+            continue
+
+        if physical_region is None:
+            physical_region = cv2.selectROI("Select the PHYSICAL region, then press Enter", image)
+            cv2.destroyAllWindows()
+        if virtual_region is None:
+            virtual_region = cv2.selectROI("Select the VIRTUAL (mirror) region, then press Enter", image)
+            cv2.destroyAllWindows()
+
+        physical_features = detect_features(image, physical_region, DETECTOR, MAX_FEATURES)
+        virtual_features = detect_features(image, virtual_region, DETECTOR, MAX_FEATURES, mirrored=True)
+        proposals = match_in_epipolar_bands(
+            physical_features,
+            virtual_features,
+            fundamental_matrix,
+            epipole_virtual,
+            band_half_width=EPIPOLAR_BAND_HALF_WIDTH,
+            ratio_test_threshold=RATIO_TEST_THRESHOLD,
+        )
+        print(
+            f"{image_path.name}: {len(physical_features.points)} physical and {len(virtual_features.points)} virtual"
+            f" features, {len(proposals.physical_points)} proposed correspondences."
+        )
+        if len(proposals.physical_points) == 0:
+            continue
+
+        accepted = np.ones(len(proposals.physical_points), dtype=bool)
+        if REVIEW_PROPOSALS:
+            accepted = review_proposals(image, proposals, fundamental_matrix, window_name)
+            if accepted is None:
+                break
+
+        if accepted.any():
+            points = np.vstack((proposals.physical_points[accepted], proposals.virtual_points[accepted]))
+            all_annotations.append({
+                "filename": image_path.name,
+                "num_physical_points": int(accepted.sum()),
+                "points": points.tolist(),
+            })
+            print(f"Accepted {accepted.sum()} correspondences for {image_path.name}.")
+
+    cv2.destroyAllWindows()
+
+    if all_annotations:
+        with open(OUTPUT_FILE, "w") as f:
+            json.dump(all_annotations, f, indent=2)
+        print(f"\nAccepted correspondences saved to: {OUTPUT_FILE}")
+    else:
+        print("\nNo correspondences were accepted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Indexed access to the images, annotations, depth maps and baseline points of an MDE evaluation project.
+
+`Dataset` reads the small JSON files of a project directory (see `project_container.py` for the layout) once, and
+indexes them by filename and view key in dicts, so looking up an image's annotations, depth scale or baseline points is
+O(1) instead of a scan over all images. The annotated points of all images are held by one `Annotations` array
+(images x views x points, with a validity mask), so the points of one view across the whole dataset are a single slice.
+Color and depth images are only read when asked for.
+"""
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+from annotations import Annotations
+from camera_rig import CameraRig
+from project_container import (
+    ANNOTATED_COORDINATES_FILENAME,
+    BASELINE_POINTS_FILENAME,
+    CAMERA_PARAMETERS_FILENAME,
+    DEPTH_DIRNAME,
+    DEPTH_SCALES_FILENAME,
+    get_depth_image_name,
+)
+
+COLOR_DIRNAME = "color"
+
+
+class Dataset:
+    """
+    A project directory, indexed by filename and view.
+
+    Parameters
+    ----------
+    basedir : Path
+        Project directory (with `camera_parameters.json`, `annotated_coordinates.json`, and optionally
+        `depth_scales.json`, `baseline_world_points.json` and the `color` and `depth` images).
+    num_views : int, optional
+        Number of views (physical camera + mirrors). Defaults to all views in `camera_parameters.json`.
+
+    Attributes
+    ----------
+    rig : CameraRig
+        The camera rig.
+    annotations : Annotations
+        The annotated points of all images.
+    filenames : list[str]
+        The annotated images, in the order of `annotated_coordinates.json`.
+    """
+
+    def __init__(self, basedir: Path, num_views: int | None = None):
+        self.basedir = Path(basedir)
+        self.rig = CameraRig.load(self.basedir / CAMERA_PARAMETERS_FILENAME, num_views)
+        self.view_indices = {view_key: view_index for view_index, view_key in enumerate(self.rig.view_keys)}
+
+        self.annotations = Annotations.load_json(self.basedir / ANNOTATED_COORDINATES_FILENAME, self.rig.num_views)
+        self.filenames = self.annotations.filenames
+        self.indices = self.annotations.indices
+        self.depth_scales: dict[str, float] = {}
+        if Path(self.basedir, DEPTH_SCALES_FILENAME).exists():
+            with Path(self.basedir, DEPTH_SCALES_FILENAME).open("r") as f:
+                self.depth_scales = json.load(f)
+        self._baseline_points: dict[str, list] = {}
+        if Path(self.basedir, BASELINE_POINTS_FILENAME).exists():
+            with Path(self.basedir, BASELINE_POINTS_FILENAME).open("r") as f:
+                baseline_points: list[dict] = json.load(f)
+            self._baseline_points = {entry["filename"]: entry["points"] for entry in baseline_points if entry["points"]}
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __iter__(self):
+        return iter(self.filenames)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.indices
+
+    @property
+    def num_views(self) -> int:
+        return self.rig.num_views
+
+    def get_points(self, filename: str) -> tuple[np.ndarray, np.ndarray]:
+        """(V, P, 2) annotated pixels (NaN where missing) and (V, P) validity mask of an image."""
+        return self.annotations.get(filename)
+
+    def get_view_points(self, view: int | str) -> tuple[np.ndarray, np.ndarray]:
+        """(I, P, 2) annotated pixels and (I, P) validity mask of one view (index or view key) over all images."""
+        return self.annotations.get_view(self.view_indices[view] if isinstance(view, str) else view)
+
+    def get_depth_scale(self, filename: str) -> float | None:
+        """The depth scale of an image's depth image (metric depth = depth image / depth scale), if known."""
+        return self.depth_scales.get(get_depth_image_name(filename))
+
+    def get_baseline_points(self, filename: str) -> np.ndarray | None:
+        """(M, 3) reconstructed world points of an image, or None if there are none."""
+        points = self._baseline_points.get(filename)
+        return None if points is None else np.array(points, dtype=np.float64)
+
+    def load_color_image(self, filename: str) -> np.ndarray | None:
+        """The (BGR) color image, or None if it cannot be read."""
+        return cv2.imread(Path(self.basedir, COLOR_DIRNAME, filename).as_posix())
+
+    def load_depth_image(self, filename: str) -> np.ndarray | None:
+        """The (scaled) depth image as stored, or None if it cannot be read."""
+        path_depth_image = Path(self.basedir, DEPTH_DIRNAME, get_depth_image_name(filename))
+        return cv2.imread(path_depth_image.as_posix(), cv2.IMREAD_UNCHANGED)
+
+    def load_metric_depth(self, filename: str) -> np.ndarray | None:
+        """The metric depth map (depth image / depth scale), or None if the depth image or its scale is missing."""
+        depth_scale = self.get_depth_scale(filename)
+        depth_image = self.load_depth_image(filename) if depth_scale is not None else None
+        return None if depth_image is None else depth_image / depth_scale
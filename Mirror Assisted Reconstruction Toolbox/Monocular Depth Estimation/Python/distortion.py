@@ -0,0 +1,219 @@
+"""
+Vectorized Brown-Conrady lens distortion of pixel coordinates, the Python counterpart of `distort_pts.m`,
+`invert_distort_pts.m` and `undistort_marked_points.m`.
+
+Uses Bouguet's (BCT) model with kc = [k1, k2, p1, p2, k3] and KK = [fx, alpha * fx, cx; 0, fy, cy; 0, 0, 1]. For
+normalized coordinates (x, y) and r^2 = x^2 + y^2:
+
+    x_d = x * (1 + k1 r^2 + k2 r^4 + k3 r^6) + 2 p1 x y + p2 (r^2 + 2 x^2)
+    y_d = y * (1 + k1 r^2 + k2 r^4 + k3 r^6) + p1 (r^2 + 2 y^2) + 2 p2 x y
+
+With k3 = 0 (the BCT default), this is exactly the model of `distort_pts.m`.
+
+Every function takes points of shape (..., N, 2) with intrinsics (..., 3, 3) and distortion coefficients (..., 5) that
+broadcast against them, so all views of a rig are handled in one call by stacking them along a leading axis, e.g.
+points (V, N, 2), intrinsics (V, 3, 3) and distortion (V, 5).
+
+Undistortion has no closed form. Instead of the fixed-point iteration of `invert_distort_pts.m`, it runs a vectorized
+Newton solver with the analytic 2x2 Jacobian of the model, which converges quadratically. It tracks a per-point
+convergence mask and only keeps iterating on the points that have not converged yet.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+TOLERANCE_NEAR_ZERO = 1e-12
+
+
+class UndistortionResult(NamedTuple):
+    """Result of inverting the distortion model for a batch of points."""
+
+    points: np.ndarray
+    """(..., N, 2) undistorted pixel coordinates."""
+    converged: np.ndarray
+    """(..., N) boolean mask of the points whose residual fell below the tolerance."""
+    residuals: np.ndarray
+    """(..., N) final residuals, i.e. distances between the re-distorted and the input points (normalized units)."""
+
+
+def _unpack_parameters(intrinsics: np.ndarray, distortion: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Split batched intrinsics and distortion coefficients into (..., 1) arrays that broadcast against (..., N)."""
+    intrinsics = np.asarray(intrinsics, dtype=np.float64)
+    coefficients = np.zeros((*np.shape(distortion)[:-1], 5))
+    distortion = np.asarray(distortion, dtype=np.float64)
+    coefficients[..., : min(distortion.shape[-1], 5)] = distortion[..., :5]
+
+    fx, skew, cx = intrinsics[..., 0, 0], intrinsics[..., 0, 1], intrinsics[..., 0, 2]
+    fy, cy = intrinsics[..., 1, 1], intrinsics[..., 1, 2]
+    k1, k2, p1, p2, k3 = np.moveaxis(coefficients, -1, 0)
+    return tuple(p[..., None] for p in (fx, fy, cx, cy, skew, k1, k2, p1, p2, k3))
+
+
+def _distort_normalized(x, y, k1, k2, p1, p2, k3, with_jacobian: bool = False):
+    """Apply the distortion model to normalized coordinates, optionally returning its 2x2 Jacobian entries as well."""
+    x2, y2, xy = x * x, y * y, x * y
+    r2 = x2 + y2
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    x_distorted = x * radial + 2 * p1 * xy + p2 * (r2 + 2 * x2)
+    y_distorted = y * radial + p1 * (r2 + 2 * y2) + 2 * p2 * xy
+    if not with_jacobian:
+        return x_distorted, y_distorted
+
+    # d(radial) / d(r^2), times 2 for the chain rule of r^2 = x^2 + y^2.
+    radial_slope = 2 * (k1 + r2 * (2 * k2 + 3 * k3 * r2))
+    dxd_dx = radial + x2 * radial_slope + 2 * p1 * y + 6 * p2 * x
+    dxd_dy = xy * radial_slope + 2 * p1 * x + 2 * p2 * y
+    dyd_dx = xy * radial_slope + 2 * p1 * x + 2 * p2 * y
+    dyd_dy = radial + y2 * radial_slope + 6 * p1 * y + 2 * p2 * x
+    return x_distorted, y_distorted, dxd_dx, dxd_dy, dyd_dx, dyd_dy
+
+
+def distort_points(points: np.ndarray, intrinsics: np.ndarray, distortion: np.ndarray) -> np.ndarray:
+    """
+    Distort undistorted pixel coordinates (like `distort_pts.m`).
+
+    Parameters
+    ----------
+    points : array_like
+        (..., N, 2) undistorted pixel coordinates.
+    intrinsics : array_like
+        (..., 3, 3) intrinsics (KK), broadcastable against the points' leading dimensions.
+    distortion : array_like
+        (..., 5) distortion coefficients [k1, k2, p1, p2, k3] (kc). Fewer coefficients are zero-padded.
+
+    Returns
+    -------
+    np.ndarray
+        (..., N, 2) distorted pixel coordinates.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    fx, fy, cx, cy, skew, k1, k2, p1, p2, k3 = _unpack_parameters(intrinsics, distortion)
+
+    y = (points[..., 1] - cy) / fy
+    x = (points[..., 0] - cx - skew * y) / fx
+    x_distorted, y_distorted = _distort_normalized(x, y, k1, k2, p1, p2, k3)
+
+    return np.stack((fx * x_distorted + skew * y_distorted + cx, fy * y_distorted + cy), axis=-1)
+
+
+def undistort_points(
+    points: np.ndarray,
+    intrinsics: np.ndarray,
+    distortion: np.ndarray,
+    max_iterations: int = 20,
+    tolerance: float = 1e-12,
+) -> UndistortionResult:
+    """
+    Undistort distorted pixel coordinates by inverting the distortion model (like `invert_distort_pts.m`).
+
+    Parameters
+    ----------
+    points : array_like
+        (..., N, 2) distorted pixel coordinates.
+    intrinsics : array_like
+        (..., 3, 3) intrinsics (KK), broadcastable against the points' leading dimensions.
+    distortion : array_like
+        (..., 5) distortion coefficients [k1, k2, p1, p2, k3] (kc). Fewer coefficients are zero-padded.
+    max_iterations : int, optional
+        Maximum number of Newton iterations.
+    tolerance : float, optional
+        Convergence tolerance on the residual, in normalized coordinates.
+
+    Returns
+    -------
+    UndistortionResult
+        The undistorted pixel coordinates, the per-point convergence mask and the final residuals.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    fx, fy, cx, cy, skew, k1, k2, p1, p2, k3 = _unpack_parameters(intrinsics, distortion)
+
+    # Flatten the (broadcast) batch so the active set can be indexed as one array.
+    batch_shape = np.broadcast_shapes(points.shape[:-1], fx.shape)
+    y_target = np.broadcast_to((points[..., 1] - cy) / fy, batch_shape).ravel()
+    x_target = np.broadcast_to((points[..., 0] - cx - skew * (points[..., 1] - cy) / fy) / fx, batch_shape).ravel()
+    coefficients = [np.broadcast_to(c, batch_shape).ravel() for c in (k1, k2, p1, p2, k3)]
+
+    # The distorted points are the initial guess, as in `invert_distort_pts.m`.
+    x, y = x_target.copy(), y_target.copy()
+    residuals = np.full(x.shape, np.inf)
+    active = np.flatnonzero(np.isfinite(x_target) & np.isfinite(y_target))
+
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+
+        x_active, y_active = x[active], y[active]
+        x_distorted, y_distorted, a, b, c, d = _distort_normalized(
+            x_active, y_active, *(coefficient[active] for coefficient in coefficients), with_jacobian=True
+        )
+        error_x, error_y = x_distorted - x_target[active], y_distorted - y_target[active]
+        residuals[active] = np.hypot(error_x, error_y)
+
+        converged = residuals[active] < tolerance
+        active, x_active, y_active = active[~converged], x_active[~converged], y_active[~converged]
+        a, b, c, d, error_x, error_y = (v[~converged] for v in (a, b, c, d, error_x, error_y))
+
+        # Newton step: solve the 2x2 system J @ delta = error in closed form.
+        determinant = a * d - b * c
+        singular = np.abs(determinant) < TOLERANCE_NEAR_ZERO
+        determinant[singular] = 1.0
+        delta_x = np.where(singular, error_x, (d * error_x - b * error_y) / determinant)
+        delta_y = np.where(singular, error_y, (a * error_y - c * error_x) / determinant)
+        x[active] = x_active - delta_x
+        y[active] = y_active - delta_y
+
+    if len(active) > 0:
+        x_distorted, y_distorted = _distort_normalized(
+            x[active], y[active], *(coefficient[active] for coefficient in coefficients)
+        )
+        residuals[active] = np.hypot(x_distorted - x_target[active], y_distorted - y_target[active])
+
+    fx, fy, cx, cy, skew = (np.broadcast_to(p, batch_shape).ravel() for p in (fx, fy, cx, cy, skew))
+    undistorted_points = np.stack((fx * x + skew * y + cx, fy * y + cy), axis=-1).reshape(*batch_shape, 2)
+    residuals = residuals.reshape(batch_shape)
+
+    return UndistortionResult(undistorted_points, residuals < tolerance, residuals)
+
+
+def stack_view_parameters(
+    camera_parameters: dict[str, dict[str, np.ndarray]], view_keys: list[str]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stack the intrinsics (V, 3, 3) and distortion coefficients (V, 5) of several views for batched calls.
+    """
+    intrinsics = np.stack([camera_parameters[view_key]["intrinsics"] for view_key in view_keys])
+    distortion = np.stack([camera_parameters[view_key]["distortion"] for view_key in view_keys])
+    return intrinsics, distortion
+
+
+def undistort_annotated_points(
+    points: np.ndarray,
+    camera_parameters: dict[str, dict[str, np.ndarray]],
+    view_keys: list[str],
+    max_iterations: int = 20,
+    tolerance: float = 1e-12,
+) -> UndistortionResult:
+    """
+    Undistort annotated points of all views at once (like `undistort_marked_points.m`).
+
+    Parameters
+    ----------
+    points : array_like
+        (V * N, 2) annotated points laid out view after view, as in `annotated_coordinates.json`.
+    camera_parameters : dict[str, dict[str, np.ndarray]]
+        Camera parameters as returned by `camera_parameters.load_camera_parameters` or `load_bct_params`.
+    view_keys : list[str]
+        The V view keys, in the order of the annotated views.
+
+    Returns
+    -------
+    UndistortionResult
+        As `undistort_points`, with the points in the same (V * N, 2) layout as the input.
+    """
+    num_views = len(view_keys)
+    points = np.asarray(points, dtype=np.float64).reshape(num_views, -1, 2)
+    intrinsics, distortion = stack_view_parameters(camera_parameters, view_keys)
+
+    result = undistort_points(points, intrinsics, distortion, max_iterations, tolerance)
+    return UndistortionResult(result.points.reshape(-1, 2), result.converged.ravel(), result.residuals.ravel())
@@ -0,0 +1,261 @@
+"""
+Batched conversion between BCT camera models (K, R, T) and the 11 DLT coefficients of DLTdv8a, the Python counterpart
+of `krt_to_dlt.m` and `dlt_to_krt.m`.
+
+Every function works on stacks of cameras (..., 11) or (..., 3, 3), e.g. all views of all calibrations of a sweep at
+once, with a batched RQ decomposition (the `flipud`/transpose trick of `dlt_to_krt.m` applied to `np.linalg.qr`).
+
+The DLT coefficients are the row-major flattened projection matrix P = K [R | T], normalized so that p34 = 1, without
+p34. Since P is only defined up to scale, the sign of that scale is ambiguous: -P is the same camera, but its RQ
+decomposition gives -R, whose determinant has the opposite sign. Mirror views have left-handed rotations
+(det(R) = -1), so the handedness cannot be fixed to det(R) = +1 as usual. Instead, the sign is chosen so that a
+reference point, by default the world origin (the calibration board, which every view sees), is in front of the
+camera. For the DLT coefficients written by `calib_process_results.m` this is exactly the p34 = 1 normalization
+`dlt_to_krt.m` relies on, and it recovers left-handed rotations for mirror views and right-handed ones for the camera.
+
+As the DLT coefficients carry no view labels (see `dlt_to_krt.m`), the view labels of the columns of `dlt_coefs.csv`
+(camera first) are passed with `--view-labels`, and default to 1, 2, ... The DLT model has no lens distortion.
+
+Usage:
+    python dlt_conversion.py --bct-params bct_params.mat --output dlt_coefs.csv
+    python dlt_conversion.py --dlt-coefs dlt_coefs.csv
+    python dlt_conversion.py --dlt-coefs dlt_coefs.csv --view-labels 1 3
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from camera_parameters import get_view_key_from_label, load_bct_params
+
+NUM_DLT_COEFFICIENTS = 11
+ROUND_TRIP_TOLERANCE = 1e-8
+
+
+class CameraModels(NamedTuple):
+    """Stacked camera models x = K [R | T] X."""
+
+    intrinsics: np.ndarray
+    """(..., 3, 3) intrinsics K, with positive diagonals and K[2, 2] = 1."""
+    rotations: np.ndarray
+    """(..., 3, 3) world-to-camera rotations R (det(R) = -1 for mirror views)."""
+    translations: np.ndarray
+    """(..., 3) world-to-camera translations T."""
+
+
+class RoundTripErrors(NamedTuple):
+    """Per camera deviations of KRT -> DLT -> KRT round trips."""
+
+    intrinsics: np.ndarray
+    """(...,) maximum absolute deviation of K, relative to its largest entry."""
+    rotations: np.ndarray
+    """(...,) maximum absolute deviation of R."""
+    translations: np.ndarray
+    """(...,) maximum absolute deviation of T, relative to its norm."""
+    handedness_preserved: np.ndarray
+    """(...,) whether det(R) kept its sign."""
+
+
+def rq_decomposition(matrices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Batched RQ decomposition M = U Q of (..., 3, 3) matrices into upper triangular U with a non-negative diagonal and
+    orthogonal Q (with det(Q) = sign(det(M))).
+
+    The QR decomposition of the flipped and transposed matrices gives the RQ decomposition once the transformations
+    are undone (see `dlt_to_krt.m`).
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    Q, R = np.linalg.qr(np.swapaxes(matrices[..., ::-1, :], -1, -2))
+    upper = np.triu(np.swapaxes(R, -1, -2)[..., ::-1, ::-1])
+    orthogonal = np.swapaxes(Q, -1, -2)[..., ::-1, :]
+
+    # U Q = (U D) (D Q) with D = diag(sign(diag(U))), which is its own inverse.
+    signs = np.sign(np.diagonal(upper, axis1=-2, axis2=-1))
+    signs = np.where(signs == 0, 1.0, signs)
+    return upper * signs[..., None, :], orthogonal * signs[..., :, None]
+
+
+def projection_matrices_from_dlt(dlt: np.ndarray) -> np.ndarray:
+    """(..., 3, 4) projection matrices of (..., 11) DLT coefficients (p34 = 1)."""
+    dlt = np.asarray(dlt, dtype=np.float64)
+    return np.concatenate((dlt, np.ones((*dlt.shape[:-1], 1))), axis=-1).reshape(*dlt.shape[:-1], 3, 4)
+
+
+def projection_matrices_to_dlt(projection_matrices: np.ndarray) -> np.ndarray:
+    """(..., 11) DLT coefficients of (..., 3, 4) projection matrices, normalized so that p34 = 1."""
+    projection_matrices = np.asarray(projection_matrices, dtype=np.float64)
+    normalized = projection_matrices / projection_matrices[..., 2:3, 3:4]
+    return normalized.reshape(*projection_matrices.shape[:-2], 12)[..., :NUM_DLT_COEFFICIENTS]
+
+
+def krt_to_dlt(intrinsics: np.ndarray, rotations: np.ndarray, translations: np.ndarray) -> np.ndarray:
+    """
+    DLT coefficients (..., 11) of cameras with (..., 3, 3) intrinsics, (..., 3, 3) rotations and (..., 3) or
+    (..., 3, 1) translations (`krt_to_dlt.m`).
+    """
+    rotations = np.asarray(rotations, dtype=np.float64)
+    translations = np.reshape(translations, (*rotations.shape[:-2], 3, 1))
+    return projection_matrices_to_dlt(np.asarray(intrinsics) @ np.concatenate((rotations, translations), axis=-1))
+
+
+def dlt_to_krt(dlt: np.ndarray, points_in_front: np.ndarray | None = None, zero_skew: bool = True) -> CameraModels:
+    """
+    Recover the camera models of (..., 11) DLT coefficients (`dlt_to_krt.m`).
+
+    Parameters
+    ----------
+    dlt : array_like
+        (..., 11) DLT coefficients, or (..., 3, 4) projection matrices of any scale.
+    points_in_front : array_like, optional
+        (3,) or (..., 3) world point(s) known to be in front of the cameras, which fixes the sign of the projection
+        matrices' scale (and thus the handedness of the rotations). Defaults to the world origin.
+    zero_skew : bool, optional
+        Set the skew K[0, 1] to zero, as `dlt_to_krt.m` does.
+
+    Returns
+    -------
+    CameraModels
+        (..., 3, 3) intrinsics, (..., 3, 3) rotations and (..., 3) translations.
+    """
+    dlt = np.asarray(dlt, dtype=np.float64)
+    projection_matrices = dlt if dlt.shape[-2:] == (3, 4) else projection_matrices_from_dlt(dlt)
+
+    # P = s K [R | T]: RQ gives |s| K and sign(s) R, and then (|s| K)^-1 p4 = sign(s) T.
+    intrinsics, rotations = rq_decomposition(projection_matrices[..., :3])
+    translations = np.linalg.solve(intrinsics, projection_matrices[..., 3:])[..., 0]
+
+    if points_in_front is None:
+        depths = translations[..., 2]
+    else:
+        depths = np.sum(rotations[..., 2, :] * np.asarray(points_in_front), axis=-1) + translations[..., 2]
+    signs = np.where(depths < 0, -1.0, 1.0)
+    rotations = rotations * signs[..., None, None]
+    translations = translations * signs[..., None]
+
+    intrinsics = intrinsics / intrinsics[..., 2:3, 2:3]
+    if zero_skew:
+        intrinsics[..., 0, 1] = 0.0
+    return CameraModels(intrinsics, rotations, translations)
+
+
+def round_trip_errors(intrinsics: np.ndarray, rotations: np.ndarray, translations: np.ndarray) -> RoundTripErrors:
+    """
+    Convert stacked cameras to DLT coefficients and back, and measure how far the recovered models are from the
+    originals, all cameras at once.
+    """
+    intrinsics = np.asarray(intrinsics, dtype=np.float64)
+    rotations = np.asarray(rotations, dtype=np.float64)
+    translations = np.reshape(translations, (*rotations.shape[:-2], 3))
+    recovered = dlt_to_krt(krt_to_dlt(intrinsics, rotations, translations), zero_skew=False)
+
+    return RoundTripErrors(
+        np.max(np.abs(recovered.intrinsics - intrinsics), axis=(-2, -1)) / np.max(np.abs(intrinsics), axis=(-2, -1)),
+        np.max(np.abs(recovered.rotations - rotations), axis=(-2, -1)),
+        np.max(np.abs(recovered.translations - translations), axis=-1) / np.linalg.norm(translations, axis=-1),
+        np.sign(np.linalg.det(recovered.rotations)) == np.sign(np.linalg.det(rotations)),
+    )
+
+
+def dlt_from_camera_parameters(
+    camera_parameters: dict[str, dict[str, np.ndarray]], view_keys: list[str] | None = None
+) -> np.ndarray:
+    """(V, 11) DLT coefficients of the given views (all views by default), as `calib_process_results.m` computes."""
+    if view_keys is None:
+        view_keys = list(camera_parameters)
+    return krt_to_dlt(
+        np.stack([camera_parameters[view_key]["intrinsics"] for view_key in view_keys]),
+        np.stack([camera_parameters[view_key]["rotation"] for view_key in view_keys]),
+        np.stack([np.ravel(camera_parameters[view_key]["translation"]) for view_key in view_keys]),
+    )
+
+
+def camera_parameters_from_dlt(
+    dlt: np.ndarray, view_labels: list[int] | None = None
+) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Camera parameters (same structure as `camera_parameters.load_bct_params`, without distortion) of (V, 11) DLT
+    coefficients.
+
+    Parameters
+    ----------
+    dlt : array_like
+        (V, 11) DLT coefficients, camera first.
+    view_labels : list[int], optional
+        The BCT view label of each of the V views (the `view_labels` of `bct_params.mat`). Defaults to 1, ..., V.
+    """
+    cameras = dlt_to_krt(dlt)
+    if view_labels is None:
+        view_labels = list(range(1, len(cameras.intrinsics) + 1))
+    if len(view_labels) != len(cameras.intrinsics):
+        raise ValueError(f"Got {len(view_labels)} view labels for {len(cameras.intrinsics)} views of DLT coefficients.")
+    camera_parameters = {}
+    for view_label, intrinsics, rotation, translation in zip(view_labels, *cameras):
+        view_label = int(view_label)
+        translation = translation.reshape(3, 1)
+        camera_parameters[get_view_key_from_label(view_label)] = {
+            "intrinsics": intrinsics,
+            "rotation": rotation,
+            "translation": translation,
+            "extrinsics": np.hstack((rotation, translation)),
+            "distortion": np.zeros(5),
+            "view_label": view_label,
+        }
+    return camera_parameters
+
+
+def load_dlt_coefs(path_dlt_coefs: Path) -> np.ndarray:
+    """(V, 11) DLT coefficients from a DLTdv8a coefficients file (11 rows, one column per view)."""
+    return np.loadtxt(path_dlt_coefs, delimiter=",", ndmin=2).T
+
+
+def save_dlt_coefs(path_dlt_coefs: Path, dlt: np.ndarray) -> None:
+    """Write (V, 11) DLT coefficients as a DLTdv8a coefficients file (11 rows, one column per view)."""
+    np.savetxt(path_dlt_coefs, np.asarray(dlt).T, fmt="%.15g", delimiter=",")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between BCT camera parameters and DLTdv8a DLT coefficients.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--bct-params", type=Path, help="Merged BCT calibration file (bct_params.mat)")
+    group.add_argument("--dlt-coefs", type=Path, help="DLTdv8a DLT coefficients file (dlt_coefs.csv)")
+    parser.add_argument("--output", type=Path, help="Write the DLT coefficients here (with --bct-params)")
+    parser.add_argument(
+        "--view-labels", type=int, nargs="+", help="BCT view labels of the DLT columns (with --dlt-coefs, default 1..V)"
+    )
+    args = parser.parse_args()
+
+    np.set_printoptions(precision=6, suppress=True)
+    if args.bct_params is not None:
+        camera_parameters = load_bct_params(args.bct_params)
+        start_time = time.perf_counter()
+        dlt = dlt_from_camera_parameters(camera_parameters)
+        errors = round_trip_errors(
+            np.stack([parameters["intrinsics"] for parameters in camera_parameters.values()]),
+            np.stack([parameters["rotation"] for parameters in camera_parameters.values()]),
+            np.stack([np.ravel(parameters["translation"]) for parameters in camera_parameters.values()]),
+        )
+        elapsed_time = time.perf_counter() - start_time
+
+        print(f"Converted and checked {len(dlt)} views in {elapsed_time * 1000:.2f} ms")
+        for view_key, coefficients, *view_errors in zip(camera_parameters, dlt, *errors):
+            print(f"\n{view_key}: {coefficients}")
+            print(
+                f"Round trip: K {view_errors[0]:.2e} (relative), R {view_errors[1]:.2e}, T {view_errors[2]:.2e}"
+                f" (relative), handedness {'preserved' if view_errors[3] else 'FLIPPED'}"
+            )
+        passed = (np.maximum.reduce(errors[:3]) < ROUND_TRIP_TOLERANCE) & errors.handedness_preserved
+        if not np.all(passed):
+            print(f"\nWarning: Round trip failed for: {', '.join(np.array(list(camera_parameters))[~passed])}")
+
+        if args.output is not None:
+            save_dlt_coefs(args.output, dlt)
+            print(f"\nDLT coefficients saved to: {args.output}")
+    else:
+        camera_parameters = camera_parameters_from_dlt(load_dlt_coefs(args.dlt_coefs), args.view_labels)
+        for view_key, parameters in camera_parameters.items():
+            print(f"\n{view_key} (det(R) = {np.linalg.det(parameters['rotation']):+.0f}):")
+            print(f"K =\n{parameters['intrinsics']}")
+            print(f"R =\n{parameters['rotation']}")
+            print(f"T = {parameters['translation'].ravel()}")
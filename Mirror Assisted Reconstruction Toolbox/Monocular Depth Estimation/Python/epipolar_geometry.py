@@ -0,0 +1,231 @@
+"""
+Epipolar geometry between the physical camera and its mirror (virtual) views.
+
+Python counterpart of the relevant parts of `epipolar_geometry.m`. Fundamental matrices are computed from the absolute
+poses of each view (`calc_fun_with_abs_pose` in MATLAB), so they are only valid for undistorted pixel coordinates.
+
+References
+----------
+1. Hartley & Zisserman, Multiple View Geometry in Computer Vision (2nd ed.), Chapter 9.
+"""
+
+import numpy as np
+from camera_parameters import get_view_key
+
+TOLERANCE_NEAR_ZERO = 1e-12
+
+
+def fundamental_matrix_from_abs_pose(
+    K1: np.ndarray, R1: np.ndarray, T1: np.ndarray, K2: np.ndarray, R2: np.ndarray, T2: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the fundamental matrix mapping points in view 1 to epipolar lines in view 2 (l2 = F @ x1).
+
+    Does not assume the world origin is at the first camera. Left-handed (mirror) rotations with det(R) = -1 are fine
+    as-is, since R^-1 = R^T holds for any orthogonal matrix.
+
+    Parameters
+    ----------
+    K1, K2 : np.ndarray
+        3x3 intrinsics of the two views.
+    R1, R2 : np.ndarray
+        3x3 world-to-camera rotations of the two views.
+    T1, T2 : np.ndarray
+        3x1 world-to-camera translations of the two views.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The 3x3 fundamental matrix (normalized so that F[2, 2] = 1 where possible), and the homogeneous epipoles e1 and
+        e2 (3,) in views 1 and 2 respectively, normalized so that their last coordinate is 1 unless they are at
+        infinity.
+    """
+    T1 = np.reshape(T1, (3, 1))
+    T2 = np.reshape(T2, (3, 1))
+
+    P1 = K1 @ np.hstack((R1, T1))
+    P2 = K2 @ np.hstack((R2, T2))
+
+    # Camera centers in world coordinates.
+    C1 = np.append(-R1.T @ T1, 1.0)
+    C2 = np.append(-R2.T @ T2, 1.0)
+
+    F = fundamental_matrix_from_projection_matrices(P1, P2, C1)
+    e2 = P2 @ C1
+    e1 = P1 @ C2
+
+    # Normalize the epipoles so they are valid pixel spots, unless they are at infinity.
+    if abs(e1[2]) > TOLERANCE_NEAR_ZERO:
+        e1 = e1 / e1[2]
+    if abs(e2[2]) > TOLERANCE_NEAR_ZERO:
+        e2 = e2 / e2[2]
+
+    return F, e1, e2
+
+
+def fundamental_matrix_from_projection_matrices(
+    P1: np.ndarray, P2: np.ndarray, C1: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Compute the fundamental matrix (l2 = F @ x1) of two views given their 3x4 projection matrices P = K [R | T].
+
+    Parameters
+    ----------
+    P1, P2 : np.ndarray
+        3x4 projection matrices of the two views.
+    C1 : np.ndarray, optional
+        Homogeneous (4,) center of the first camera. Defaults to the null space of P1.
+
+    Returns
+    -------
+    np.ndarray
+        The 3x3 fundamental matrix, normalized so that F[2, 2] = 1 where possible.
+    """
+    if C1 is None:
+        C1 = np.linalg.svd(P1)[2][-1]
+    # F = [e2]_x P2 P1^+. Built from the unnormalized epipole, which may well be at infinity for mirror views (e.g.,
+    # a mirror parallel to the optical axis).
+    e2 = P2 @ C1
+    e2_cross = np.array([
+        [0.0, -e2[2], e2[1]],
+        [e2[2], 0.0, -e2[0]],
+        [-e2[1], e2[0], 0.0],
+    ])
+    F = e2_cross @ P2 @ np.linalg.pinv(P1)
+    return F / F[2, 2] if abs(F[2, 2]) > TOLERANCE_NEAR_ZERO else F / np.linalg.norm(F)
+
+
+def compute_fundamental_matrices(
+    camera_parameters: dict[str, dict[str, np.ndarray]], num_views: int | None = None
+) -> dict[tuple[str, str], np.ndarray]:
+    """
+    Compute the fundamental matrix of every physical/virtual view pair, in both directions, once.
+
+    Parameters
+    ----------
+    camera_parameters : dict[str, dict[str, np.ndarray]]
+        Camera parameters as returned by `camera_parameters.load_camera_parameters`.
+    num_views : int, optional
+        Number of views (physical + virtual). Defaults to all views in `camera_parameters`.
+
+    Returns
+    -------
+    dict[tuple[str, str], np.ndarray]
+        Maps (from_view_key, to_view_key) to the 3x3 fundamental matrix F such that lines in the "to" view are given by
+        F @ x for homogeneous points x in the "from" view.
+    """
+    if num_views is None:
+        num_views = len(camera_parameters)
+
+    physical = camera_parameters["physical"]
+    fundamental_matrices = {}
+    for view_index in range(1, num_views):
+        view_key = get_view_key(camera_parameters, view_index)
+        virtual = camera_parameters[view_key]
+        F, _, _ = fundamental_matrix_from_abs_pose(
+            physical["intrinsics"],
+            physical["rotation"],
+            physical["translation"],
+            virtual["intrinsics"],
+            virtual["rotation"],
+            virtual["translation"],
+        )
+        fundamental_matrices[("physical", view_key)] = F
+        fundamental_matrices[(view_key, "physical")] = F.T
+
+    return fundamental_matrices
+
+
+def compute_epipolar_lines(F: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    Compute the epipolar lines l = F @ x of a batch of points, normalized such that a^2 + b^2 = 1.
+
+    With this normalization, a * x + b * y + c directly gives the signed point-to-line distance in pixels.
+
+    Parameters
+    ----------
+    F : np.ndarray
+        3x3 fundamental matrix.
+    points : array_like
+        Nx2 pixel coordinates (or a single [x, y] point).
+
+    Returns
+    -------
+    np.ndarray
+        Nx3 array of [a, b, c] line coefficients.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lines = points @ F[:, :2].T + F[:, 2]
+    norms = np.hypot(lines[:, 0], lines[:, 1])
+    return lines / np.maximum(norms, TOLERANCE_NEAR_ZERO)[:, None]
+
+
+def point_line_distances(points: np.ndarray, lines: np.ndarray) -> np.ndarray:
+    """
+    Signed distances (in pixels) between points and their corresponding normalized lines.
+
+    Parameters
+    ----------
+    points : array_like
+        Nx2 pixel coordinates.
+    lines : array_like
+        Nx3 lines normalized as in `compute_epipolar_lines`.
+
+    Returns
+    -------
+    np.ndarray
+        (N,) array of signed distances.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 3)
+    return lines[:, 0] * points[:, 0] + lines[:, 1] * points[:, 1] + lines[:, 2]
+
+
+def clip_lines_to_image(lines: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Clip a batch of lines to the image rectangle [0, width - 1] x [0, height - 1].
+
+    Parameters
+    ----------
+    lines : array_like
+        Nx3 array of [a, b, c] line coefficients.
+    width, height : int
+        Image dimensions in pixels.
+
+    Returns
+    -------
+    np.ndarray
+        Nx4 array of [x1, y1, x2, y2] endpoints. Rows of lines that miss the image entirely are NaN.
+    """
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 3)
+    a, b, c = lines[:, 0:1], lines[:, 1:2], lines[:, 2:3]
+    x_max, y_max = float(width - 1), float(height - 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Intersections with the left, right, top and bottom borders, shape (N, 4).
+        candidates_x = np.hstack((np.zeros_like(a), np.full_like(a, x_max), -c / a, -(b * y_max + c) / a))
+        candidates_y = np.hstack((-c / b, -(a * x_max + c) / b, np.zeros_like(b), np.full_like(b, y_max)))
+
+    eps = 1e-6
+    valid = (
+        np.isfinite(candidates_x)
+        & np.isfinite(candidates_y)
+        & (candidates_x >= -eps)
+        & (candidates_x <= x_max + eps)
+        & (candidates_y >= -eps)
+        & (candidates_y <= y_max + eps)
+    )
+
+    # The endpoints are the two valid intersections furthest apart along the line direction (-b, a).
+    positions = -b * candidates_x + a * candidates_y
+    start = np.argmin(np.where(valid, positions, np.inf), axis=1)
+    end = np.argmax(np.where(valid, positions, -np.inf), axis=1)
+    rows = np.arange(len(lines))
+
+    endpoints = np.stack(
+        (candidates_x[rows, start], candidates_y[rows, start], candidates_x[rows, end], candidates_y[rows, end]),
+        axis=1,
+    )
+    endpoints[~valid.any(axis=1)] = np.nan
+
+    return endpoints
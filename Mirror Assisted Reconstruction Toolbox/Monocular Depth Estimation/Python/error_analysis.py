@@ -0,0 +1,454 @@
+"""
+Vectorized 2D/3D error analysis, the Python counterpart of `analyze_error_2d.m`, `analyze_error_3d.m` and
+`row_wise_analysis.m`.
+
+Every statistic is computed over all points at once (and per group, e.g. per view or per row, with `np.bincount` on the
+group labels), and histograms are counted with a single `np.bincount` on bin indices precomputed from the (uniform) bin
+edges, so millions of points take a few passes over the data. Missing values (NaN, e.g. points not observed in a view)
+are left out. Standard deviations and variances are the sample ones (N - 1), as in MATLAB.
+
+The results are written headlessly next to the input, as in MATLAB:
+
+    <input_dir>/error_analysis/<2d|3d>/
+    ├── <name>_analysis.json     Statistics, per-view/per-row breakdowns and histograms (errors_2d/3d struct)
+    ├── <name>_analysis.csv      Metric,Value table (same metric names as MATLAB)
+    ├── <name>_errors.npy        Per-point structured array (raw data)
+    └── <name>_hist_*.png        (with --plot) histograms like `Results/R*_Hist.jpg`
+
+Usage:
+    python error_analysis.py 2d --marked marked_points.mat --projected xypts.mat
+    python error_analysis.py 2d --errors reconstruction/reprojection_errors.npy
+    python error_analysis.py 3d xyzpts.mat --expected-distance 24
+    python error_analysis.py 3d xyzpts.mat --expected-distance 24 --points-per-row 6 --plot
+"""
+
+import argparse
+import csv
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import scipy.io as sio
+
+# Configuration (mirrors `bin_config` in `analyze_error_2d.m` and `analyze_error_3d.m`)
+NUM_BINS = 10
+POINTS_PER_ROW = 6
+TOLERANCE_NEAR_ZERO = 1e-9
+ERROR_ANALYSIS_DIRNAME = "error_analysis"
+
+
+def describe(values: np.ndarray, with_rms: bool = True) -> dict[str, float]:
+    """
+    Mean, sample standard deviation and variance, min, max (and RMS) of the finite values, in two passes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        statistics = dict.fromkeys(("mean", "std", "var", "min", "max"), float("nan"))
+    else:
+        mean = float(values.mean())
+        var = float(np.sum((values - mean) ** 2) / max(len(values) - 1, 1))
+        statistics = {"mean": mean, "std": var**0.5, "var": var, "min": float(values.min()), "max": float(values.max())}
+    if with_rms:
+        statistics["rms"] = float(np.sqrt(np.mean(values**2))) if len(values) > 0 else float("nan")
+    return statistics
+
+
+def standardize(values: np.ndarray) -> np.ndarray:
+    """Absolute standard scores |x - mean| / std of the values (NaN stays NaN)."""
+    statistics = describe(values, with_rms=False)
+    return np.abs((values - statistics["mean"]) / statistics["std"])
+
+
+def describe_standardized(values: np.ndarray) -> dict[str, float]:
+    """Mean, standard deviation, min and max of standard scores, with tiny means set to zero as in MATLAB."""
+    statistics = describe(values, with_rms=False)
+    if abs(statistics["mean"]) < TOLERANCE_NEAR_ZERO:
+        statistics["mean"] = 0.0
+    return {key: statistics[key] for key in ("mean", "std", "min", "max")}
+
+
+def grouped_statistics(values: np.ndarray, groups: np.ndarray, num_groups: int) -> dict[str, list[float]]:
+    """
+    Mean, RMS, sample standard deviation and count of the finite values of every group (0, ..., num_groups - 1), from
+    three `np.bincount` passes over the sums, sums of squares and counts.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    groups = np.asarray(groups).ravel()
+    finite = np.isfinite(values)
+    values, groups = values[finite], groups[finite]
+
+    counts = np.bincount(groups, minlength=num_groups).astype(np.float64)
+    sums = np.bincount(groups, weights=values, minlength=num_groups)
+    sums_squares = np.bincount(groups, weights=values**2, minlength=num_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+        rms = np.sqrt(sums_squares / counts)
+        stds = np.sqrt(np.maximum(sums_squares - counts * means**2, 0.0) / (counts - 1))
+    return {"mean": means.tolist(), "rms": rms.tolist(), "std": stds.tolist(), "count": counts.astype(int).tolist()}
+
+
+def histogram(
+    values: np.ndarray,
+    num_bins: int = NUM_BINS,
+    edges: np.ndarray | None = None,
+    groups: np.ndarray | None = None,
+    num_groups: int = 1,
+) -> dict[str, list]:
+    """
+    Histogram of the finite values, like `histcounts` with `linspace(min, max, num_bins + 1)` edges (or the given
+    uniform edges), optionally split by group.
+
+    Bin indices are computed arithmetically from the uniform edges and counted with one `np.bincount` (over group and
+    bin at once), instead of searching the edges for every value.
+
+    Returns
+    -------
+    dict[str, list]
+        "centers", "counts", "edges" and "normalized_counts" (as in `bin_stats`). With groups, "counts" and
+        "normalized_counts" are lists of one histogram per group.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    finite = np.isfinite(values)
+    groups = np.zeros(finite.sum(), dtype=np.int64) if groups is None else np.asarray(groups).ravel()[finite]
+    values = values[finite]
+
+    if edges is None:
+        low, high = (float(values.min()), float(values.max())) if len(values) > 0 else (0.0, 1.0)
+        edges = np.linspace(low, high, num_bins + 1)
+    edges = np.asarray(edges, dtype=np.float64)
+    num_bins = len(edges) - 1
+    width = (edges[-1] - edges[0]) / num_bins
+
+    # The last bin includes its right edge, values outside the edges are not counted (like `histcounts`).
+    inside = (values >= edges[0]) & (values <= edges[-1])
+    bins = np.floor((values[inside] - edges[0]) / width).astype(np.int64) if width > 0 else np.zeros(inside.sum(), int)
+    bins = np.minimum(bins, num_bins - 1)
+    counts = np.bincount(groups[inside] * num_bins + bins, minlength=num_groups * num_bins).reshape(-1, num_bins)
+
+    totals = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    normalized_counts = counts / totals
+    if num_groups == 1:
+        counts, normalized_counts = counts[0], normalized_counts[0]
+    return {
+        "centers": ((edges[:-1] + edges[1:]) / 2).tolist(),
+        "counts": counts.tolist(),
+        "edges": edges.tolist(),
+        "normalized_counts": normalized_counts.tolist(),
+    }
+
+
+def analyze_errors_2d(
+    points_marked: np.ndarray, points_projected: np.ndarray | None = None, num_bins: int = NUM_BINS
+) -> tuple[dict, np.ndarray]:
+    """
+    2D reprojection error analysis (`analyze_error_2d.m`) of all points of all views.
+
+    Parameters
+    ----------
+    points_marked : array_like
+        (V, N, 2) marked pixel coordinates, or (V, N) precomputed error magnitudes if `points_projected` is None
+        (e.g., the reprojection errors written by `reconstruct_trackfile.py`, reshaped to views first).
+    points_projected : array_like, optional
+        (V, N, 2) projected pixel coordinates of the estimated world points.
+    num_bins : int, optional
+        Number of histogram bins.
+
+    Returns
+    -------
+    tuple[dict, np.ndarray]
+        The report (same fields as the `errors_2d` struct, without the raw data) and the per-point structured array
+        with fields view, point, error_x, error_y, error and standardized_error.
+    """
+    if points_projected is None:
+        magnitudes = np.asarray(points_marked, dtype=np.float64)
+        errors = np.full((*magnitudes.shape, 2), np.nan)
+    else:
+        errors = np.abs(np.asarray(points_marked, dtype=np.float64) - np.asarray(points_projected, dtype=np.float64))
+        magnitudes = np.hypot(errors[..., 0], errors[..., 1])
+    num_views, num_points = magnitudes.shape
+    views = np.broadcast_to(np.arange(num_views)[:, None], magnitudes.shape)
+    standardized = standardize(magnitudes)
+
+    # The pixel distances and the error magnitudes of `analyze_error_2d.m` are the same values.
+    distance_stats = describe(magnitudes, with_rms=False)
+    per_view_stats = grouped_statistics(magnitudes, views, num_views)
+    error_histogram = histogram(magnitudes, num_bins)
+    per_view_histogram = histogram(magnitudes, edges=error_histogram["edges"], groups=views, num_groups=num_views)
+    standardized_histogram = histogram(standardized, num_bins)
+    report = {
+        "distance_stats": distance_stats,
+        "error_stats": describe(magnitudes),
+        "standardized_distance_stats": describe_standardized(standardized),
+        "standardized_error_stats": describe_standardized(standardized),
+        "per_view_stats": per_view_stats,
+        "bin_config": {"num_bins": num_bins, "bin_edges": "auto"},
+        "bin_stats": {
+            "distances": error_histogram,
+            "errors": error_histogram,
+            "standardized_distances": standardized_histogram,
+            "standardized_errors": standardized_histogram,
+            "per_view_errors": per_view_histogram,
+        },
+        "num_views": num_views,
+        "num_points": num_points,
+        "num_observed": int(np.isfinite(magnitudes).sum()),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    raw_data = np.empty(
+        magnitudes.size,
+        dtype=[
+            ("view", np.int32),
+            ("point", np.int64),
+            ("error_x", np.float64),
+            ("error_y", np.float64),
+            ("error", np.float64),
+            ("standardized_error", np.float64),
+        ],
+    )
+    raw_data["view"] = views.ravel()
+    raw_data["point"] = np.broadcast_to(np.arange(num_points), magnitudes.shape).ravel()
+    raw_data["error_x"], raw_data["error_y"] = errors[..., 0].ravel(), errors[..., 1].ravel()
+    raw_data["error"], raw_data["standardized_error"] = magnitudes.ravel(), standardized.ravel()
+    return report, raw_data
+
+
+def analyze_errors_3d(
+    world_points: np.ndarray,
+    expected_distance: float,
+    points_per_row: int | None = None,
+    num_bins: int = NUM_BINS,
+) -> tuple[dict, np.ndarray]:
+    """
+    3D distance error analysis (`analyze_error_3d.m`) of consecutive world points, with the row-wise breakdown of
+    `row_wise_analysis.m` if the points form rows of `points_per_row` equally spaced points.
+
+    Parameters
+    ----------
+    world_points : array_like
+        (N, 3) world points, in order.
+    expected_distance : float
+        Physical distance between neighboring points (e.g., the checker size in mm).
+    points_per_row : int, optional
+        Number of points per row. If given, only pairs within a row are compared, and per-row statistics are added.
+    num_bins : int, optional
+        Number of histogram bins.
+
+    Returns
+    -------
+    tuple[dict, np.ndarray]
+        The report (same fields as the `errors_3d` struct, without the raw data) and the per-pair structured array with
+        fields pair, row, distance, error, standardized_distance and standardized_error.
+    """
+    world_points = np.asarray(world_points, dtype=np.float64)
+    distances = np.linalg.norm(np.diff(world_points, axis=0), axis=1)
+    rows = np.zeros(len(distances), dtype=np.int64)
+    if points_per_row is not None:
+        # Pairs p -> p + 1 across two rows are not neighbors.
+        num_rows = len(world_points) // points_per_row
+        pairs = np.arange(len(distances))
+        within_row = (pairs % points_per_row != points_per_row - 1) & (pairs < num_rows * points_per_row - 1)
+        rows = pairs // points_per_row
+        distances = np.where(within_row, distances, np.nan)
+    errors = np.abs(distances - expected_distance)
+    standardized_distances, standardized_errors = standardize(distances), standardize(errors)
+
+    report = {
+        "distance_stats": describe(distances, with_rms=False),
+        "error_stats": describe(errors),
+        "standardized_distance_stats": describe_standardized(standardized_distances),
+        "standardized_error_stats": describe_standardized(standardized_errors),
+        "bin_config": {"num_bins": num_bins, "bin_edges": "auto"},
+        "bin_stats": {
+            "distances": histogram(distances, num_bins),
+            "errors": histogram(errors, num_bins),
+            "standardized_distances": histogram(standardized_distances, num_bins),
+            "standardized_errors": histogram(standardized_errors, num_bins),
+        },
+        "expected_distance": expected_distance,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if points_per_row is not None:
+        per_row_distances = grouped_statistics(distances, rows, num_rows)
+        per_row_errors = grouped_statistics(errors, rows, num_rows)
+        report["per_row_stats"] = {
+            "points_per_row": points_per_row,
+            "mean_distance": per_row_distances["mean"],
+            "rms_distance": per_row_distances["rms"],
+            "mean_error": per_row_errors["mean"],
+            "rms_error": per_row_errors["rms"],
+        }
+
+    raw_data = np.empty(
+        len(distances),
+        dtype=[
+            ("pair", np.int64),
+            ("row", np.int64),
+            ("distance", np.float64),
+            ("error", np.float64),
+            ("standardized_distance", np.float64),
+            ("standardized_error", np.float64),
+        ],
+    )
+    raw_data["pair"], raw_data["row"] = np.arange(len(distances)), rows
+    raw_data["distance"], raw_data["error"] = distances, errors
+    raw_data["standardized_distance"], raw_data["standardized_error"] = standardized_distances, standardized_errors
+    return report, raw_data
+
+
+def metric_rows(report: dict) -> list[tuple[str, float]]:
+    """The Metric,Value rows of the MATLAB CSV files."""
+    is_2d = "per_view_stats" in report
+    distance_prefix = "PixelDistance" if is_2d else "Distance"
+    distance, error = report["distance_stats"], report["error_stats"]
+    standardized_distance = report["standardized_distance_stats"]
+    standardized_error = report["standardized_error_stats"]
+
+    rows = [(f"{distance_prefix}_{key.capitalize()}", distance[key]) for key in ("mean", "std", "var", "min", "max")]
+    rows += [(f"StdDistance_{key.capitalize()}", standardized_distance[key]) for key in ("min", "max", "mean", "std")]
+    rows += [
+        (f"Error_{key.upper() if key == 'rms' else key.capitalize()}", error[key])
+        for key in ("mean", "rms", "std", "var", "min", "max")
+    ]
+    rows += [(f"StdError_{key.capitalize()}", standardized_error[key]) for key in ("min", "max", "mean", "std")]
+    if is_2d:
+        per_view = report["per_view_stats"]
+        for view in range(report["num_views"]):
+            rows += [
+                (f"View{view + 1}_MeanError", per_view["mean"][view]),
+                (f"View{view + 1}_RMSError", per_view["rms"][view]),
+                (f"View{view + 1}_StdError", per_view["std"][view]),
+            ]
+    else:
+        rows.append(("ExpectedDistance", report["expected_distance"]))
+    return rows
+
+
+def plot_histograms(report: dict, output_dir: Path, name: str, unit: str) -> list[Path]:
+    """Save the histograms of the report as PNGs (needs matplotlib, which is only imported here)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    paths = []
+    for key, bins in report["bin_stats"].items():
+        if key.startswith("per_view") or (key.endswith("distances") and "per_view_stats" in report):
+            continue  # Same values as the errors in 2D.
+        fig, ax = plt.subplots()
+        widths = np.diff(bins["edges"])
+        ax.bar(bins["centers"], bins["normalized_counts"], width=widths, alpha=0.3, label="Histogram")
+        ax.plot(bins["centers"], bins["normalized_counts"], "r-o", label="Bin Centers")
+        ax.set_xlabel(f"{key.replace('_', ' ').title()} ({'σ' if key.startswith('standardized') else unit})")
+        ax.set_ylabel("Normalized Frequency")
+        ax.grid(True)
+        ax.legend()
+        path = output_dir / f"{name}_hist_{key}.png"
+        fig.savefig(path, dpi=150, bbox_inches="tight")
+        plt.close(fig)
+        paths.append(path)
+    return paths
+
+
+def nan_to_none(value):
+    """Replace the non-finite floats in nested dicts and lists with None, which JSON writes as null."""
+    if isinstance(value, dict):
+        return {key: nan_to_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [nan_to_none(item) for item in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def save_report(report: dict, raw_data: np.ndarray, output_dir: Path, name: str) -> None:
+    """
+    Write the report as JSON (with null for undefined statistics, e.g. of a view without observations) and CSV, and
+    the raw per-point data as a structured .npy array.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with (output_dir / f"{name}_analysis.json").open("w") as f:
+        json.dump(nan_to_none(report), f, indent=2, allow_nan=False)
+    with (output_dir / f"{name}_analysis.csv").open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("Metric", "Value"))
+        writer.writerows(metric_rows(report))
+    np.save(output_dir / f"{name}_errors.npy", raw_data)
+
+
+def load_world_points(path: Path) -> np.ndarray:
+    """(N, 3) world points from `xyzpts.mat` (3xN `X_est`) or a .npy file of (..., 3) points."""
+    if path.suffix == ".npy":
+        return np.load(path).reshape(-1, 3)
+    return np.asarray(sio.loadmat(path, variable_names=["X_est"])["X_est"], dtype=np.float64).T
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze 2D reprojection errors or 3D distance errors.")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    parser_2d = subparsers.add_parser("2d", help="2D reprojection errors (analyze_error_2d.m)")
+    parser_2d.add_argument("--marked", type=Path, help="marked_points.mat with the marked pixels")
+    parser_2d.add_argument("--projected", type=Path, help="xypts.mat with the projected pixels")
+    parser_2d.add_argument("--errors", type=Path, help="(frames, views, points) errors .npy (reconstruct_trackfile.py)")
+    parser_3d = subparsers.add_parser("3d", help="3D distance errors (analyze_error_3d.m, row_wise_analysis.m)")
+    parser_3d.add_argument("world_points", type=Path, help="xyzpts.mat (X_est) or .npy world points")
+    parser_3d.add_argument("--expected-distance", type=float, required=True, help="Distance between neighbors (mm)")
+    parser_3d.add_argument("--points-per-row", type=int, help=f"Row-wise analysis (e.g., {POINTS_PER_ROW})")
+    for subparser in (parser_2d, parser_3d):
+        subparser.add_argument("--num-bins", type=int, default=NUM_BINS, help="Number of histogram bins")
+        subparser.add_argument("--output-dir", type=Path, help="Default: error_analysis/<mode> next to the input")
+        subparser.add_argument("--plot", action="store_true", help="Also save the histograms as PNGs (matplotlib)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.mode == "2d":
+        if args.errors is not None:
+            # (frames, views, points) -> (views, frames * points)
+            errors = np.load(args.errors, mmap_mode="r")
+            errors = np.moveaxis(errors, 1, 0).reshape(errors.shape[1], -1)
+            report, raw_data = analyze_errors_2d(errors, None, args.num_bins)
+            path_input = args.errors
+        elif args.marked is not None and args.projected is not None:
+            marked_points = sio.loadmat(args.marked, variable_names=["x", "num_points"], squeeze_me=True)
+            x = np.asarray(marked_points["x"], dtype=np.float64)
+            pixels_marked = (x[:2] / x[2]).T
+            pixels_projected = sio.loadmat(args.projected, variable_names=["proj_pixels_est_all"])
+            pixels_projected = np.asarray(pixels_projected["proj_pixels_est_all"], dtype=np.float64).T
+            num_views = len(pixels_marked) // int(marked_points["num_points"])
+            report, raw_data = analyze_errors_2d(
+                pixels_marked.reshape(num_views, -1, 2), pixels_projected.reshape(num_views, -1, 2), args.num_bins
+            )
+            path_input = args.projected
+        else:
+            parser.error("Pass either --errors, or both --marked and --projected.")
+        unit = "px"
+    else:
+        report, raw_data = analyze_errors_3d(
+            load_world_points(args.world_points), args.expected_distance, args.points_per_row, args.num_bins
+        )
+        path_input = args.world_points
+        unit = "mm"
+    elapsed_time = time.perf_counter() - start_time
+
+    output_dir = args.output_dir or path_input.parent / ERROR_ANALYSIS_DIRNAME / args.mode
+    name = path_input.stem
+    save_report(report, raw_data, output_dir, name)
+    if args.plot:
+        plot_histograms(report, output_dir, name, unit)
+
+    error_stats = report["error_stats"]
+    print(f"\nError Statistics ({len(raw_data)} values in {elapsed_time:.3f} s):")
+    print(f"Mean error: {error_stats['mean']:.2f} {unit}")
+    print(f"RMS error: {error_stats['rms']:.2f} {unit}")
+    print(f"Standard deviation of errors: {error_stats['std']:.2f} {unit}")
+    if "per_view_stats" in report:
+        for view, (mean, rms) in enumerate(zip(report["per_view_stats"]["mean"], report["per_view_stats"]["rms"])):
+            print(f"View {view + 1}: mean {mean:.2f} {unit}, RMS {rms:.2f} {unit}")
+    if "per_row_stats" in report:
+        per_row = report["per_row_stats"]
+        for row, (mean, rms) in enumerate(zip(per_row["mean_error"], per_row["rms_error"])):
+            print(f"Row {row + 1}: mean error {mean:.6f} {unit}, RMS error {rms:.6f} {unit}")
+    print(f"\nAnalysis results have been saved to: {output_dir.as_posix()}")
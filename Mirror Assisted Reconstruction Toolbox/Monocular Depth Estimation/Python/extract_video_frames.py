@@ -0,0 +1,272 @@
+"""
+Extraction of numbered frames from (high-rate) videos, the Python counterpart of `vid_to_frames.m`.
+
+Frames are decoded by `cv2.VideoCapture` as a generator, which supports frame ranges, strides and explicit timestamps.
+The video is always decoded sequentially from the first frame, since seeking (`CAP_PROP_POS_FRAMES`) is not
+frame-accurate for most codecs and would silently misnumber frames. Frames that are not needed are only grabbed, never
+retrieved as images. Encoding and writing the images is handed to a pool of writer threads (`cv2.imwrite` releases the
+GIL) behind a bounded number of in-flight frames, so the decoder never stalls on disk and memory stays flat however long
+the clip.
+
+Frames are named as in the MATLAB toolbox (`VID_FRAMENAME_FMT = 'Frame%d%s'`), numbered from 1 by their absolute
+position in the video.
+
+Usage:
+    python extract_video_frames.py projvid.mp4 --output-dir frames
+    python extract_video_frames.py projvid.mp4 --output-dir frames --start 0:0:10 --stop 0:0:12 --step 5
+    python extract_video_frames.py projvid.mp4 --output-dir frames --timestamps 1.5 0:0:2.25 3
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+# Configuration (mirrors the defaults in `defaults.m`)
+FRAME_NAME_FMT = "Frame%d%s"
+FRAME_EXT = ".jpg"
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """
+    Convert a timestamp given in seconds ("90.5") or in H:M:S format ("0:1:30.5", "1:30.5") to seconds.
+    """
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract numbered frames from a video.")
+    parser.add_argument("path_video", type=Path, help="Path to the video file")
+    parser.add_argument("--output-dir", type=Path, required=True, help="Directory to store the frames in")
+    parser.add_argument("--ext", default=FRAME_EXT, help="Image extension to save the frames with")
+    parser.add_argument("--name-fmt", default=FRAME_NAME_FMT, help="Frame name format with a %%d and a %%s")
+    parser.add_argument("--start", type=parse_timestamp, default=0.0, help="Start time in seconds or H:M:S")
+    parser.add_argument("--stop", type=parse_timestamp, default=np.inf, help="Inclusive stop time in seconds or H:M:S")
+    parser.add_argument("--step", type=int, default=1, help="Keep every step-th frame of the range")
+    parser.add_argument(
+        "--timestamps", type=parse_timestamp, nargs="+", help="Extract only the frames at these times (overrides range)"
+    )
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1), help="Number of writer threads")
+    parser.add_argument("--queue-size", type=int, default=64, help="Maximum number of frames waiting to be written")
+    return parser.parse_args()
+
+
+def get_video_properties(path_video: Path) -> tuple[float, int, tuple[int, int]]:
+    """
+    Return the frame rate, (container-reported) number of frames and (width, height) of a video.
+    """
+    capture = cv2.VideoCapture(Path(path_video).as_posix())
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {Path(path_video).as_posix()}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        num_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        capture.release()
+    return fps, num_frames, frame_size
+
+
+def select_frame_indices(
+    fps: float,
+    start_time: float = 0.0,
+    stop_time: float = np.inf,
+    step: int = 1,
+    timestamps: list[float] | None = None,
+) -> tuple[int, int | None, int] | np.ndarray:
+    """
+    Translate a time range and stride, or a list of timestamps, into 0-based frame indices.
+
+    Returns
+    -------
+    tuple[int, int | None, int] | np.ndarray
+        The (start, stop, step) frame range, with stop exclusive and None meaning until the end of the video, or the
+        sorted unique frame indices of the given timestamps.
+    """
+    if step < 1:
+        raise ValueError(f"The frame step must be a positive integer, got {step}.")
+    if timestamps is not None:
+        return np.unique(np.floor(np.asarray(timestamps, dtype=np.float64) * fps + 1e-6).astype(np.int64))
+
+    if stop_time < start_time:
+        raise ValueError(f"Stop time ({stop_time} s) is before start time ({start_time} s).")
+    start_frame = int(np.floor(start_time * fps + 1e-6))
+    stop_frame = None if np.isinf(stop_time) else int(np.floor(stop_time * fps + 1e-6)) + 1
+    return start_frame, stop_frame, step
+
+
+def iter_video_frames(
+    path_video: Path,
+    start_frame: int = 0,
+    stop_frame: int | None = None,
+    step: int = 1,
+    frame_indices: np.ndarray | None = None,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Decode selected frames of a video, one at a time.
+
+    Parameters
+    ----------
+    path_video : Path
+        Path to the video file.
+    start_frame, stop_frame, step : int, optional
+        0-based frame range (stop exclusive, None = until the end of the video) and stride.
+    frame_indices : np.ndarray, optional
+        Sorted 0-based indices of the frames to decode. Overrides the frame range.
+
+    Yields
+    ------
+    tuple[int, np.ndarray]
+        The 0-based frame index and the decoded BGR frame.
+    """
+    capture = cv2.VideoCapture(Path(path_video).as_posix())
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {Path(path_video).as_posix()}")
+
+    def wanted_indices() -> Iterator[int]:
+        if frame_indices is not None:
+            yield from (int(i) for i in frame_indices)
+            return
+        frame_index = start_frame
+        while stop_frame is None or frame_index < stop_frame:
+            yield frame_index
+            frame_index += step
+
+    try:
+        position = 0
+        for frame_index in wanted_indices():
+            if frame_index < position:
+                continue
+
+            # Skipped frames are grabbed (demuxed and decoded) but never converted into images. No seeking: the
+            # position is only known exactly when counting frames from the start.
+            while position < frame_index and capture.grab():
+                position += 1
+            if position < frame_index or not capture.grab():
+                return
+            position += 1
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                return
+            yield frame_index, frame
+    finally:
+        capture.release()
+
+
+def extract_frames(
+    path_video: Path,
+    output_dir: Path,
+    frame_ext: str = FRAME_EXT,
+    frame_name_fmt: str = FRAME_NAME_FMT,
+    start_time: float = 0.0,
+    stop_time: float = np.inf,
+    step: int = 1,
+    timestamps: list[float] | None = None,
+    num_writers: int = 4,
+    queue_size: int = 64,
+) -> int:
+    """
+    Extract frames of a video into numbered images, decoding on the calling thread and writing on a thread pool.
+
+    Parameters
+    ----------
+    path_video : Path
+        Path to the video file.
+    output_dir : Path
+        Directory to store the frames in. Created if it does not exist.
+    frame_ext : str, optional
+        Image extension to save the frames with.
+    frame_name_fmt : str, optional
+        Frame name format with a %d for the (1-based) frame number and a %s for the extension.
+    start_time, stop_time : float, optional
+        Time range in seconds (stop inclusive), as in `vid_to_frames.m`.
+    step : int, optional
+        Keep every `step`-th frame of the range.
+    timestamps : list[float], optional
+        Extract only the frames at these times (in seconds). Overrides the time range and step.
+    num_writers : int, optional
+        Number of writer threads.
+    queue_size : int, optional
+        Maximum number of decoded frames waiting to be written.
+
+    Returns
+    -------
+    int
+        The number of frames written.
+    """
+    fps, _, _ = get_video_properties(path_video)
+    selection = select_frame_indices(fps, start_time, stop_time, step, timestamps)
+    if isinstance(selection, np.ndarray):
+        frames = iter_video_frames(path_video, frame_indices=selection)
+    else:
+        frames = iter_video_frames(path_video, *selection)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # The semaphore bounds the frames in flight: the decoder blocks once `queue_size` frames are waiting to be written.
+    slots = threading.BoundedSemaphore(queue_size)
+    errors = []
+    num_written = 0
+
+    def on_written(future: Future):
+        slots.release()
+        if future.exception() is not None:
+            errors.append(future.exception())
+        elif not future.result():
+            errors.append(IOError("cv2.imwrite could not write a frame."))
+
+    with ThreadPoolExecutor(max_workers=num_writers, thread_name_prefix="frame_writer") as executor:
+        try:
+            for frame_index, frame in frames:
+                if errors:
+                    break
+                frame_filepath = output_dir / (frame_name_fmt % (frame_index + 1, frame_ext))
+                slots.acquire()
+                executor.submit(cv2.imwrite, frame_filepath.as_posix(), frame).add_done_callback(on_written)
+                num_written += 1
+        finally:
+            frames.close()
+
+    if errors:
+        raise errors[0]
+
+    return num_written
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    fps, num_frames, (width, height) = get_video_properties(args.path_video)
+    print(f"Extracting video frames...\n\n\tFrom: {args.path_video}\n\t  To: {args.output_dir}\n")
+    print(f"Video: {width}x{height} at {fps:.2f} fps, ~{num_frames} frames ({num_frames / max(fps, 1e-9):.2f} s)\n")
+
+    start_time = time.perf_counter()
+    num_written = extract_frames(
+        args.path_video,
+        args.output_dir,
+        frame_ext=args.ext,
+        frame_name_fmt=args.name_fmt,
+        start_time=args.start,
+        stop_time=args.stop,
+        step=args.step,
+        timestamps=args.timestamps,
+        num_writers=args.workers,
+        queue_size=args.queue_size,
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    print(
+        f"Done extracting {num_written} frames in {elapsed_time:.2f} s"
+        f" ({num_written / max(elapsed_time, 1e-9):.1f} frames/s)."
+    )
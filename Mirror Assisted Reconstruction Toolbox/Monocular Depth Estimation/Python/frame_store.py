@@ -0,0 +1,226 @@
+"""
+Decode-once, memory-mapped frame store for random access into videos.
+
+Seeking in compressed videos (e.g., `Test Media/projvid.mp4`) is slow and, depending on the codec and container, not
+even frame-accurate. Tools that scrub back and forth through a clip (annotators, trackers, overlay renderers) instead
+decode it once into a raw T x H x W x C uint8 cube on disk, which is then memory-mapped: any frame or frame range is a
+zero-copy NumPy view, and only the pages actually touched are ever read.
+
+The cache file starts with a small fixed-size JSON header (page-aligned, so the frames start on a page boundary)
+recording the cube's shape, the frame rate and the source video's size, modification time and SHA-256 hash:
+
+    <video>.frames = [ header (4 KiB, zero-padded JSON) | frame 0 | frame 1 | ... ]
+
+The cache is rebuilt whenever the source's hash no longer matches. The hash is only recomputed if the source's size or
+modification time changed, so opening an up-to-date store does not read the whole video.
+
+Usage:
+    python frame_store.py projvid.mp4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from extract_video_frames import get_video_properties, iter_video_frames
+
+FRAME_STORE_SUFFIX = ".frames"
+FRAME_STORE_MAGIC = "LCMART-FRAME-STORE"
+FRAME_STORE_VERSION = 1
+HEADER_SIZE = 4096
+HASH_CHUNK_SIZE = 1 << 24
+
+
+def compute_file_hash(path: Path) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    sha256 = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _read_header(path_store: Path) -> dict | None:
+    """Read a frame store's header, or return None if the file is missing or not a (complete) frame store."""
+    try:
+        with Path(path_store).open("rb") as f:
+            header = json.loads(f.read(HEADER_SIZE).rstrip(b"\0"))
+    except (OSError, ValueError):
+        return None
+    if header.get("magic") != FRAME_STORE_MAGIC or header.get("version") != FRAME_STORE_VERSION:
+        return None
+    return header
+
+
+def _write_header(f, header: dict):
+    encoded = json.dumps(header).encode()
+    if len(encoded) > HEADER_SIZE:
+        raise ValueError(f"Frame store header exceeds {HEADER_SIZE} bytes.")
+    f.seek(0)
+    f.write(encoded.ljust(HEADER_SIZE, b"\0"))
+
+
+def build_frame_store(path_video: Path, path_store: Path, source_hash: str | None = None) -> dict:
+    """
+    Decode a whole video once into a raw frame store file.
+
+    The frames are streamed to a temporary file that replaces `path_store` only once complete, so an interrupted build
+    never leaves a truncated store behind.
+
+    Returns
+    -------
+    dict
+        The header of the new frame store.
+    """
+    path_video, path_store = Path(path_video), Path(path_store)
+    stat = path_video.stat()
+    if source_hash is None:
+        source_hash = compute_file_hash(path_video)
+    fps, _, _ = get_video_properties(path_video)
+
+    path_temp = path_store.with_name(path_store.name + ".tmp")
+    num_frames = 0
+    frame_shape = None
+    try:
+        with path_temp.open("wb") as f:
+            f.write(b"\0" * HEADER_SIZE)
+            for _, frame in iter_video_frames(path_video):
+                if frame_shape is None:
+                    frame_shape = frame.shape if frame.ndim == 3 else (*frame.shape, 1)
+                f.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+                num_frames += 1
+
+            if frame_shape is None:
+                raise IOError(f"Could not decode any frames from: {path_video.as_posix()}")
+
+            header = {
+                "magic": FRAME_STORE_MAGIC,
+                "version": FRAME_STORE_VERSION,
+                "shape": [num_frames, *frame_shape],
+                "dtype": "uint8",
+                "fps": fps,
+                "source_name": path_video.name,
+                "source_size": stat.st_size,
+                "source_mtime_ns": stat.st_mtime_ns,
+                "source_hash": source_hash,
+            }
+            _write_header(f, header)
+        os.replace(path_temp, path_store)
+    finally:
+        path_temp.unlink(missing_ok=True)
+
+    return header
+
+
+class FrameStore:
+    """
+    Random access to the decoded frames of a video, backed by a memory-mapped frame store.
+
+    Indexing returns zero-copy views: `store[i]` is the i-th (0-based) H x W x C frame, and `store[i:j:k]` a
+    T x H x W x C cube.
+    """
+
+    def __init__(self, path_store: Path):
+        self.path_store = Path(path_store)
+        self.header = _read_header(self.path_store)
+        if self.header is None:
+            raise ValueError(f"Not a valid frame store: {self.path_store.as_posix()}")
+
+        shape = tuple(self.header["shape"])
+        self.frames: np.ndarray = np.memmap(
+            self.path_store, dtype=self.header["dtype"], mode="r", offset=HEADER_SIZE, shape=shape
+        )
+
+    @classmethod
+    def open(cls, path_video: Path, path_store: Path | None = None, verbose: bool = True) -> "FrameStore":
+        """
+        Open the frame store of a video, (re)building it first if it is missing or stale.
+
+        Parameters
+        ----------
+        path_video : Path
+            Path to the source video.
+        path_store : Path, optional
+            Path to the frame store. Defaults to the video's path with the `.frames` suffix appended.
+        verbose : bool, optional
+            Print when the store is (re)built and how long it took.
+        """
+        path_video = Path(path_video)
+        if path_store is None:
+            path_store = path_video.with_name(path_video.name + FRAME_STORE_SUFFIX)
+        path_store = Path(path_store)
+
+        header = _read_header(path_store)
+        stat = path_video.stat()
+        source_hash = None
+        if header is not None and (
+            header["source_size"] != stat.st_size or header["source_mtime_ns"] != stat.st_mtime_ns
+        ):
+            # The source may have changed: only its contents decide whether the store is stale.
+            source_hash = compute_file_hash(path_video)
+            if source_hash == header["source_hash"]:
+                with path_store.open("r+b") as f:
+                    _write_header(f, {**header, "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns})
+            else:
+                header = None
+
+        if header is None:
+            if verbose:
+                print(f"Building frame store for {path_video.as_posix()}...")
+            start_time = time.perf_counter()
+            header = build_frame_store(path_video, path_store, source_hash)
+            if verbose:
+                print(f"Decoded {header['shape'][0]} frames in {time.perf_counter() - start_time:.2f} s.")
+
+        return cls(path_store)
+
+    @property
+    def fps(self) -> float:
+        return self.header["fps"]
+
+    @property
+    def frame_size(self) -> tuple[int, int]:
+        """(width, height) of the frames."""
+        return self.header["shape"][2], self.header["shape"][1]
+
+    @property
+    def source_hash(self) -> str:
+        return self.header["source_hash"]
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.frames[index]
+
+    def frame_at(self, time_seconds: float) -> np.ndarray:
+        """The frame shown at the given time (in seconds) into the video."""
+        return self.frames[min(int(np.floor(time_seconds * self.fps + 1e-6)), len(self) - 1)]
+
+    def close(self):
+        """Drop the store's memory map. The file is unmapped once no views handed out earlier remain alive."""
+        self.frames = None
+
+    def __enter__(self) -> "FrameStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode a video once into a memory-mapped frame store.")
+    parser.add_argument("path_video", type=Path, help="Path to the video file")
+    parser.add_argument("--path-store", type=Path, help="Path to the frame store (default: <video>.frames)")
+    args = parser.parse_args()
+
+    with FrameStore.open(args.path_video, args.path_store) as store:
+        width, height = store.frame_size
+        print(
+            f"{store.path_store.as_posix()}: {len(store)} frames of {width}x{height} at {store.fps:.2f} fps"
+            f" ({store.frames.nbytes / 1e9:.2f} GB), source hash {store.source_hash[:12]}"
+        )
@@ -0,0 +1,308 @@
+"""
+Kinematics of reconstructed trajectories: velocities, accelerations, rigid-body orientations and angular rates.
+
+Trajectories are (T, P, 3) arrays of P markers over T frames (e.g., the `xyzpts.npy` written by
+`reconstruct_trackfile.py`), with NaN where a marker was not reconstructed.
+
+Positions are smoothed and differentiated with Savitzky-Golay filters: a polynomial of order `polyorder` is fit by least
+squares to the `window_length` samples around every frame, and its derivatives at the frame are the estimates. Missing
+samples are simply left out of the fits. All fits share the same sample offsets, so their normal equations are sums of
+(masked) moments that are computed for all frames, markers and coordinates at once, then solved as one batch of small
+systems. Without gaps this is exactly `scipy.signal.savgol_filter` (with `mode="interp"`-like edges, since out of range
+samples are left out as well). Frames that are NaN themselves stay NaN, gaps are never filled.
+
+Rigid-body orientations are found by registering the body's marker template onto the markers of every frame with
+`point_set_registration_3d.register_points_3d_batched`, and angular velocities from the Savitzky-Golay derivative of the
+rotations: [w]_x = dR/dt R^T (world frame) or R^T dR/dt (body frame).
+
+Long sequences are processed in chunks of frames (`iter_kinematics`), each read with just enough context for its
+windows, so memory use does not depend on the length of the recording.
+
+Usage:
+    python kinematics.py reconstruction/xyzpts.npy --fps 1000 --window-length 21 --polyorder 3
+    python kinematics.py xyzpts.npy --fps 1000 --rigid-body 1 2 3 4
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from point_set_registration_3d import register_points_3d_batched
+
+WINDOW_LENGTH = 21
+POLYORDER = 3
+CHUNK_SIZE = 10000  # frames per chunk
+
+
+class Kinematics(NamedTuple):
+    """Kinematics of a (chunk of a) trajectory of T frames and P markers."""
+
+    positions: np.ndarray
+    """(T, P, 3) smoothed positions."""
+    velocities: np.ndarray
+    """(T, P, 3) velocities, in units per second."""
+    accelerations: np.ndarray
+    """(T, P, 3) accelerations, in units per second squared."""
+    rotations: np.ndarray | None
+    """(T, 3, 3) rigid-body rotations (body to world) if a rigid body was given, else None."""
+    angular_velocities: np.ndarray | None
+    """(T, 3) world-frame angular velocities in radians per second if a rigid body was given, else None."""
+
+
+def savgol_derivatives(
+    signals: np.ndarray,
+    window_length: int = WINDOW_LENGTH,
+    polyorder: int = POLYORDER,
+    deriv: int = 2,
+    delta: float = 1.0,
+    valid_range: slice = slice(None),
+) -> list[np.ndarray]:
+    """
+    Savitzky-Golay smoothing and differentiation along the first axis, with NaN samples left out of the fits.
+
+    Parameters
+    ----------
+    signals : array_like
+        (T, ...) signals sampled every `delta` along the first axis, NaN where missing.
+    window_length : int, optional
+        Odd number of samples in each fit.
+    polyorder : int, optional
+        Order of the fitted polynomials. Must be less than `window_length`.
+    deriv : int, optional
+        Highest derivative to return.
+    delta : float, optional
+        Sample spacing (e.g., 1 / fps).
+    valid_range : slice, optional
+        Only return the samples in this range (along the first axis), using the samples around it as context.
+
+    Returns
+    -------
+    list[np.ndarray]
+        The smoothed signals and their derivatives up to `deriv`, each of shape (T', ...). NaN where the sample itself
+        is missing or its window has fewer than `polyorder + 1` samples.
+    """
+    if window_length % 2 != 1 or polyorder >= window_length:
+        raise ValueError("The window length must be odd and greater than the polynomial order.")
+
+    signals = np.asarray(signals, dtype=np.float64)
+    half_window = window_length // 2
+    num_coefficients = polyorder + 1
+
+    # Sample offsets scaled to [-1, 1] keep the normal equations well conditioned.
+    offsets = np.arange(-half_window, half_window + 1) / max(half_window, 1)
+    powers = offsets[:, None] ** np.arange(2 * polyorder + 1)
+
+    mask = np.isfinite(signals)
+    values = np.where(mask, signals, 0.0)
+    padding = [(half_window, half_window)] + [(0, 0)] * (signals.ndim - 1)
+    mask_windows = sliding_window_view(np.pad(mask.astype(np.float64), padding), window_length, axis=0)[valid_range]
+    value_windows = sliding_window_view(np.pad(values, padding), window_length, axis=0)[valid_range]
+
+    # Normal equations of every fit: G[i, j] = sum(mask * u^(i + j)), b[i] = sum(mask * y * u^i).
+    moments = mask_windows @ powers
+    rhs = (mask_windows * value_windows) @ powers[:, :num_coefficients]
+    indices = np.arange(num_coefficients)
+    gram = moments[..., indices[:, None] + indices[None, :]]
+
+    solvable = mask[valid_range] & (mask_windows.sum(axis=-1) >= num_coefficients)
+    coefficients = np.full(rhs.shape, np.nan)
+    coefficients[solvable] = np.linalg.solve(gram[solvable], rhs[solvable][..., None])[..., 0]
+
+    # The k-th derivative at the center is k! c_k, rescaled from [-1, 1] offsets to the sample spacing.
+    scale = 1.0 / (max(half_window, 1) * delta)
+    derivatives = []
+    for order in range(deriv + 1):
+        if order < num_coefficients:
+            derivatives.append(np.prod(np.arange(1, order + 1)) * coefficients[..., order] * scale**order)
+        else:
+            derivatives.append(np.where(solvable, 0.0, np.nan))
+    return derivatives
+
+
+def angular_velocities_from_rotations(
+    rotations: np.ndarray, rotation_rates: np.ndarray, body_frame: bool = False
+) -> np.ndarray:
+    """
+    Angular velocities (T, 3) from rotations R (T, 3, 3) and their time derivatives dR/dt (T, 3, 3).
+
+    Uses the skew-symmetric part of dR/dt R^T (world frame) or R^T dR/dt (body frame), which cancels the first order
+    error of the differentiated rotations not being exactly on the rotation manifold.
+    """
+    if body_frame:
+        skew = np.swapaxes(rotations, 1, 2) @ rotation_rates
+    else:
+        skew = rotation_rates @ np.swapaxes(rotations, 1, 2)
+    skew = 0.5 * (skew - np.swapaxes(skew, 1, 2))
+    return np.stack((skew[:, 2, 1], skew[:, 0, 2], skew[:, 1, 0]), axis=1)
+
+
+def find_reference_frame(trajectory: np.ndarray, markers: list[int], chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    The (P, 3) positions of the given markers in the first frame where all of them were reconstructed, read chunk by
+    chunk. Used as the rigid body's template by default.
+    """
+    for start in range(0, len(trajectory), chunk_size):
+        chunk = np.asarray(trajectory[start : start + chunk_size, markers])
+        complete = np.flatnonzero(np.all(np.isfinite(chunk), axis=(1, 2)))
+        if len(complete) > 0:
+            return chunk[complete[0]]
+    raise ValueError("The rigid body's markers are never all reconstructed in the same frame.")
+
+
+def compute_kinematics(
+    trajectory: np.ndarray,
+    fps: float,
+    window_length: int = WINDOW_LENGTH,
+    polyorder: int = POLYORDER,
+    rigid_body: list[int] | None = None,
+    body_template: np.ndarray | None = None,
+    valid_range: slice = slice(None),
+) -> Kinematics:
+    """
+    Kinematics of a whole (in-memory) trajectory. See `iter_kinematics` for long sequences.
+
+    Parameters
+    ----------
+    trajectory : array_like
+        (T, P, 3) marker positions, NaN where missing.
+    fps : float
+        Frame rate of the trajectory.
+    window_length, polyorder : int, optional
+        Savitzky-Golay window length (odd, in frames) and polynomial order.
+    rigid_body : list[int], optional
+        0-based indices of markers rigidly attached to one body (at least three), to estimate its orientation and
+        angular velocity.
+    body_template : array_like, optional
+        (len(rigid_body), 3) positions of the rigid body's markers in its own frame. Defaults to their positions in the
+        first frame where all of them were reconstructed (i.e., rotations are relative to that frame).
+    valid_range : slice, optional
+        Only return the frames in this range, using the frames around it as context.
+
+    Returns
+    -------
+    Kinematics
+        Smoothed positions, velocities, accelerations and, for a rigid body, rotations and angular velocities.
+    """
+    trajectory = np.asarray(trajectory, dtype=np.float64)
+    delta = 1.0 / fps
+    positions, velocities, accelerations = savgol_derivatives(
+        trajectory, window_length, polyorder, deriv=2, delta=delta, valid_range=valid_range
+    )
+
+    rotations = angular_velocities = None
+    if rigid_body is not None:
+        if body_template is None:
+            body_template = find_reference_frame(trajectory, rigid_body)
+        transforms = register_points_3d_batched(body_template, trajectory[:, rigid_body], do_scale=False)
+        rotations_all = transforms.rotation_matrices
+        rotations, rotation_rates = savgol_derivatives(
+            rotations_all, window_length, polyorder, deriv=1, delta=delta, valid_range=valid_range
+        )
+        # Keep the exact (registered) rotations, only their rates come from the filter.
+        rotations = np.where(np.isfinite(rotations), rotations_all[valid_range], np.nan)
+        angular_velocities = angular_velocities_from_rotations(rotations, rotation_rates)
+
+    return Kinematics(positions, velocities, accelerations, rotations, angular_velocities)
+
+
+def iter_kinematics(
+    trajectory: np.ndarray,
+    fps: float,
+    window_length: int = WINDOW_LENGTH,
+    polyorder: int = POLYORDER,
+    rigid_body: list[int] | None = None,
+    body_template: np.ndarray | None = None,
+    chunk_size: int = CHUNK_SIZE,
+):
+    """
+    Kinematics of an arbitrarily long trajectory, in chunks of frames.
+
+    Each chunk is read with `window_length // 2` frames of context on both sides, so the results are identical to
+    `compute_kinematics` on the whole trajectory. Only one chunk is in memory at a time when `trajectory` is memory
+    mapped (e.g., `np.load(path, mmap_mode="r")`).
+
+    Parameters
+    ----------
+    trajectory : array_like
+        (T, P, 3) marker positions, NaN where missing.
+    chunk_size : int, optional
+        Number of frames per chunk.
+
+    See `compute_kinematics` for the other parameters.
+
+    Yields
+    ------
+    tuple[int, Kinematics]
+        The index of the chunk's first frame and its kinematics.
+    """
+    half_window = window_length // 2
+    if rigid_body is not None and body_template is None:
+        body_template = find_reference_frame(trajectory, rigid_body, chunk_size)
+
+    for start in range(0, len(trajectory), chunk_size):
+        stop = min(start + chunk_size, len(trajectory))
+        context_start, context_stop = max(start - half_window, 0), min(stop + half_window, len(trajectory))
+        chunk = np.asarray(trajectory[context_start:context_stop], dtype=np.float64)
+
+        # Frames outside the trajectory are simply missing, like gaps.
+        chunk = np.pad(
+            chunk,
+            [(half_window - (start - context_start), half_window - (context_stop - stop)), (0, 0), (0, 0)],
+            constant_values=np.nan,
+        )
+        yield start, compute_kinematics(
+            chunk,
+            fps,
+            window_length,
+            polyorder,
+            rigid_body,
+            body_template,
+            valid_range=slice(half_window, half_window + stop - start),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the kinematics of a reconstructed trajectory.")
+    parser.add_argument("trajectory", type=Path, help="(frames, points, 3) trajectory (.npy), e.g. xyzpts.npy")
+    parser.add_argument("--fps", type=float, required=True, help="Frame rate of the trajectory")
+    parser.add_argument("--window-length", type=int, default=WINDOW_LENGTH, help="Savitzky-Golay window (odd)")
+    parser.add_argument("--polyorder", type=int, default=POLYORDER, help="Savitzky-Golay polynomial order")
+    parser.add_argument("--rigid-body", type=int, nargs="+", help="1-based indices of a rigid body's markers")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Number of frames per chunk")
+    parser.add_argument("--output-dir", type=Path, help="Output directory (default: the trajectory's directory)")
+    args = parser.parse_args()
+
+    trajectory = np.load(args.trajectory, mmap_mode="r")
+    output_dir = args.output_dir or args.trajectory.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rigid_body = None if args.rigid_body is None else [i - 1 for i in args.rigid_body]
+
+    # Outputs are preallocated on disk and filled chunk by chunk.
+    num_frames = len(trajectory)
+    outputs = {
+        name: np.lib.format.open_memmap(output_dir / f"{name}.npy", mode="w+", dtype=np.float64, shape=shape)
+        for name, shape in [
+            ("velocities", trajectory.shape),
+            ("accelerations", trajectory.shape),
+            *([("rotations", (num_frames, 3, 3)), ("angular_velocities", (num_frames, 3))] if rigid_body else []),
+        ]
+    }
+
+    start_time = time.perf_counter()
+    for start, kinematics in iter_kinematics(
+        trajectory, args.fps, args.window_length, args.polyorder, rigid_body, chunk_size=args.chunk_size
+    ):
+        for name, output in outputs.items():
+            values = getattr(kinematics, name)
+            output[start : start + len(values)] = values
+    elapsed_time = time.perf_counter() - start_time
+
+    for output in outputs.values():
+        output.flush()
+    print(
+        f"Computed kinematics of {trajectory.shape[1]} markers over {num_frames} frames in {elapsed_time:.2f} s"
+        f" ({num_frames / max(elapsed_time, 1e-9):.0f} frames/s) to: {output_dir.as_posix()}"
+    )
@@ -1,14 +1,21 @@
 import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Literal
 
 import cv2
 import numpy as np
+from camera_parameters import get_view_key, load_camera_parameters
+from epipolar_geometry import clip_lines_to_image, compute_epipolar_lines, compute_fundamental_matrices
+from optical_flow_propagation import propagate_points
+from subpixel_refinement import refine_points_subpixel
 
 # Configuration
 BASEDIR = "depth-anything-v2"
 IMAGE_DIR = Path(BASEDIR, "color")
 OUTPUT_FILE = Path(BASEDIR, "annotated_coordinates.json")
+PATH_CAMERA_PARAMETERS = Path(BASEDIR, "camera_parameters.json")
 SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")
 MAX_DISPLAY_WIDTH = 1280
 MAX_DISPLAY_HEIGHT = 720
@@ -16,9 +23,26 @@ POINT_RADIUS = 5
 # Colors in BGR order
 POINT_COLOR = (0, 0, 255)
 TEXT_COLOR = (0, 255, 0)
+EPIPOLAR_LINE_COLOR = (255, 255, 0)
+LOST_POINT_COLOR = (0, 165, 255)
 MIN_USER_ZOOM = 0.5
 MAX_USER_ZOOM = 20
 ZOOM_CHANGE_FACTOR = 1.1
+# Sub-pixel refinement of the clicked points. Runs once per image when moving on (N/Q), never inside the click loop.
+REFINE_POINTS_SUBPIXEL = False
+SUBPIXEL_METHOD: Literal["corner", "centroid"] = "corner"
+SUBPIXEL_WINDOW_RADIUS = 5
+# Epipolar guidance for the pending physical -> virtual correspondence. Needs `PATH_CAMERA_PARAMETERS` and assumes the
+# images are undistorted (the fundamental matrices do not model lens distortion).
+SHOW_EPIPOLAR_LINES = True
+# Optical-flow propagation for frame sequences. After annotating a keyframe (N), its points are tracked through the
+# following frames on a worker thread, while the window stays responsive (Q/Esc stops tracking and quits). Frames that
+# track cleanly are saved without being shown, and annotation resumes at the first frame where tracking failed, with
+# the lost points highlighted for correction.
+PROPAGATE_POINTS = False
+PROPAGATION_MAX_FRAMES = None
+PROPAGATION_WINDOW_SIZE = 64
+MAX_FORWARD_BACKWARD_ERROR = 1.0
 
 # Global state variables
 current_points = []
@@ -38,6 +62,16 @@ g_pan_start_mouse_x = 0
 g_pan_start_mouse_y = 0
 g_pan_start_view_center_x = 0
 g_pan_start_view_center_y = 0
+# Index into `current_points` where each view's points start. Pressing V starts the next (virtual) view.
+g_view_start_indices = [0]
+g_fundamental_matrices = {}
+g_camera_parameters = {}
+g_pending_epipolar_line = None
+g_pending_epipolar_endpoints = None
+g_cursor_orig_x = None
+g_cursor_orig_y = None
+# Indices of points lost by the optical-flow propagation. The next clicks relocate these instead of adding new points.
+g_points_to_correct = []
 
 
 def reset_zoom_pan_state():
@@ -71,6 +105,35 @@ def reset_zoom_pan_state():
     )
 
 
+def update_pending_epipolar_line():
+    """Recomputes the epipolar line (and its clipped endpoints) of the physical point awaiting its correspondence."""
+    global g_pending_epipolar_line, g_pending_epipolar_endpoints
+
+    g_pending_epipolar_line = None
+    g_pending_epipolar_endpoints = None
+
+    current_view_index = len(g_view_start_indices) - 1
+    if not g_fundamental_matrices or current_view_index == 0:
+        return
+
+    # The i-th point of a virtual view corresponds to the i-th physical point.
+    num_physical_points = g_view_start_indices[1]
+    pending_index = len(current_points) - g_view_start_indices[-1]
+    if pending_index >= num_physical_points:
+        return
+
+    view_key = get_view_key(g_camera_parameters, current_view_index)
+    fundamental_matrix = g_fundamental_matrices.get(("physical", view_key))
+    if fundamental_matrix is None:
+        return
+
+    # Clipping happens once here, in original image coordinates, so that redraws while zooming/panning only need to
+    # transform two endpoints.
+    g_pending_epipolar_line = compute_epipolar_lines(fundamental_matrix, current_points[pending_index])[0]
+    endpoints = clip_lines_to_image(g_pending_epipolar_line, g_orig_image_width, g_orig_image_height)[0]
+    g_pending_epipolar_endpoints = None if np.isnan(endpoints).any() else endpoints
+
+
 def get_current_view_image_and_draw():
     """Generates the visible image portion and draws points using precomputed image."""
     global original_image, precomputed_image, current_points, g_display_window_name
@@ -133,7 +196,8 @@ def get_current_view_image_and_draw():
         disp_pt_x = (orig_pt_x - view_tl_orig_x) * effective_scale
         disp_pt_y = (orig_pt_y - view_tl_orig_y) * effective_scale
         if 0 <= disp_pt_x < g_display_window_width and 0 <= disp_pt_y < g_display_window_height:
-            cv2.circle(display_canvas, (int(round(disp_pt_x)), int(round(disp_pt_y))), POINT_RADIUS, POINT_COLOR, -1)
+            point_color = LOST_POINT_COLOR if i in g_points_to_correct else POINT_COLOR
+            cv2.circle(display_canvas, (int(round(disp_pt_x)), int(round(disp_pt_y))), POINT_RADIUS, point_color, -1)
             cv2.circle(display_canvas, (int(round(disp_pt_x)), int(round(disp_pt_y))), 1, (255, 255, 255), -1)
             cv2.putText(
                 display_canvas,
@@ -145,6 +209,32 @@ def get_current_view_image_and_draw():
                 1,
             )
 
+    # Draw the epipolar line of the pending correspondence, and the cursor's distance to it.
+    if g_pending_epipolar_endpoints is not None:
+        x1, y1, x2, y2 = g_pending_epipolar_endpoints
+        disp_pt1 = (
+            int(round((x1 - view_tl_orig_x) * effective_scale)),
+            int(round((y1 - view_tl_orig_y) * effective_scale)),
+        )
+        disp_pt2 = (
+            int(round((x2 - view_tl_orig_x) * effective_scale)),
+            int(round((y2 - view_tl_orig_y) * effective_scale)),
+        )
+        cv2.line(display_canvas, disp_pt1, disp_pt2, EPIPOLAR_LINE_COLOR, 1, cv2.LINE_AA)
+
+        if g_cursor_orig_x is not None:
+            a, b, c = g_pending_epipolar_line
+            distance = abs(a * g_cursor_orig_x + b * g_cursor_orig_y + c)
+            cv2.putText(
+                display_canvas,
+                f"Epipolar distance: {distance:.2f} px",
+                (10, 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                EPIPOLAR_LINE_COLOR,
+                1,
+            )
+
     cv2.imshow(g_display_window_name, display_canvas)
 
 
@@ -155,7 +245,7 @@ def mouse_callback(event, x, y, flags, param):
     global g_is_panning, g_pan_start_mouse_x, g_pan_start_mouse_y
     global g_pan_start_view_center_x, g_pan_start_view_center_y
     global g_base_scale_factor, g_display_window_width, g_display_window_height
-    global g_orig_image_width, g_orig_image_height
+    global g_orig_image_width, g_orig_image_height, g_cursor_orig_x, g_cursor_orig_y
 
     if original_image is None:
         return
@@ -173,8 +263,14 @@ def mouse_callback(event, x, y, flags, param):
         original_pt_x = max(0.0, min(original_pt_x, float(g_orig_image_width - 1)))
         original_pt_y = max(0.0, min(original_pt_y, float(g_orig_image_height - 1)))
 
-        current_points.append((int(round(original_pt_x)), int(round(original_pt_y))))
-        print(f"Clicked display: ({x}, {y}) -> Original: ({current_points[-1][0]}, {current_points[-1][1]})")
+        if g_points_to_correct:
+            corrected_index = g_points_to_correct.pop(0)
+            current_points[corrected_index] = (original_pt_x, original_pt_y)
+            print(f"Corrected point {corrected_index + 1}: ({original_pt_x:.2f}, {original_pt_y:.2f})")
+        else:
+            current_points.append((original_pt_x, original_pt_y))
+            print(f"Clicked display: ({x}, {y}) -> Original: ({original_pt_x:.2f}, {original_pt_y:.2f})")
+        update_pending_epipolar_line()
         get_current_view_image_and_draw()
 
     # Zoom (Mouse Wheel)
@@ -226,10 +322,67 @@ def mouse_callback(event, x, y, flags, param):
     elif event == cv2.EVENT_RBUTTONUP:
         g_is_panning = False
 
+    # Live point-to-epipolar-line distance (only redraws while a correspondence is pending).
+    elif event == cv2.EVENT_MOUSEMOVE and g_pending_epipolar_line is not None:
+        effective_scale = g_base_scale_factor * g_user_zoom_level
+        g_cursor_orig_x = g_view_center_orig_x + (x - 0.5 * g_display_window_width) / effective_scale
+        g_cursor_orig_y = g_view_center_orig_y + (y - 0.5 * g_display_window_height) / effective_scale
+        get_current_view_image_and_draw()
+
+
+def start_next_view():
+    """Marks the end of the current view's points. Following clicks belong to the next (virtual) view."""
+    num_views = max(len(g_camera_parameters), 2)
+    if len(current_points) == g_view_start_indices[-1]:
+        print("No points marked in the current view yet.")
+        return
+    if len(g_view_start_indices) >= num_views:
+        print(f"Already marking the last view ({num_views} views).")
+        return
+    if len(g_view_start_indices) > 1 and len(current_points) - g_view_start_indices[-1] != g_view_start_indices[1]:
+        print(f"Warning: this view's point count differs from the physical view's ({g_view_start_indices[1]}).")
+
+    g_view_start_indices.append(len(current_points))
+    print(f"Now marking view {len(g_view_start_indices)} (virtual {len(g_view_start_indices) - 1}).")
+    update_pending_epipolar_line()
+
+
+def create_annotation(filename: str, points: list[list[float]], view_start_indices: list[int]) -> dict:
+    """
+    Creates the JSON entry for an image, recording the number of physical points if several views were marked, and
+    where each view starts if their point counts differ.
+    """
+    annotation = {"filename": filename}
+    if len(view_start_indices) > 1:
+        annotation["num_physical_points"] = view_start_indices[1]
+        view_counts = np.diff([*view_start_indices, len(points)])
+        if np.any(view_counts != view_counts[0]):
+            annotation["view_start_indices"] = list(view_start_indices)
+    annotation["points"] = points
+    return annotation
+
+
+def finalize_points(image: np.ndarray, points: list[tuple[float, float]]) -> list[list[float]]:
+    """Applies the (optional) sub-pixel refinement to all points of an image in one batch."""
+    if not REFINE_POINTS_SUBPIXEL:
+        return [[float(x), float(y)] for x, y in points]
+
+    clicked_points = np.array(points, dtype=np.float64)
+    refined_points = refine_points_subpixel(
+        image, clicked_points, method=SUBPIXEL_METHOD, window_radius=SUBPIXEL_WINDOW_RADIUS
+    )
+    shifts = np.linalg.norm(refined_points - clicked_points, axis=1)
+    print(
+        f"Refined {len(points)} points to sub-pixel ({SUBPIXEL_METHOD}), mean shift: {shifts.mean():.2f} px, max shift:"
+        f" {shifts.max():.2f} px."
+    )
+    return refined_points.tolist()
+
 
 def main():
     global current_points, original_image, g_display_window_name, precomputed_image
-    global g_orig_image_width, g_orig_image_height
+    global g_orig_image_width, g_orig_image_height, g_view_start_indices
+    global g_camera_parameters, g_fundamental_matrices, g_points_to_correct
 
     if not IMAGE_DIR.is_dir():
         print(f"Error: Directory '{IMAGE_DIR}' not found.")
@@ -241,13 +394,34 @@ def main():
         print(f"No supported images found in '{IMAGE_DIR}'.")
         return
 
+    if SHOW_EPIPOLAR_LINES:
+        if PATH_CAMERA_PARAMETERS.is_file():
+            g_camera_parameters = load_camera_parameters(PATH_CAMERA_PARAMETERS)
+            g_fundamental_matrices = compute_fundamental_matrices(g_camera_parameters)
+        else:
+            print(f"Warning: '{PATH_CAMERA_PARAMETERS}' not found, epipolar lines disabled.")
+
+    propagated_points = {}
+    propagation_failure = None
+    propagation_view_start_indices = [0]
+    propagation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="propagation")
+
     all_annotations = []
     quit_app = False
 
-    for image_path in image_files:
+    for image_index, image_path in enumerate(image_files):
         if quit_app:
             break
 
+        # Frames that tracked cleanly need no manual input.
+        if image_index in propagated_points:
+            all_annotations.append(
+                create_annotation(
+                    image_path.name, propagated_points.pop(image_index).tolist(), propagation_view_start_indices
+                )
+            )
+            continue
+
         original_image = cv2.imread(image_path.as_posix())
 
         if original_image is None:
@@ -255,7 +429,16 @@ def main():
             continue
 
         current_points = []
+        g_view_start_indices = [0]
+        g_points_to_correct = []
+        if propagation_failure is not None and propagation_failure.failed_frame_index == image_index:
+            current_points = [tuple(point) for point in propagation_failure.failed_frame_points.tolist()]
+            g_view_start_indices = list(propagation_view_start_indices)
+            g_points_to_correct = np.flatnonzero(propagation_failure.failed_point_mask).tolist()
+            print(f"Tracking lost points {[i + 1 for i in g_points_to_correct]}, click to relocate them in that order.")
+        propagation_failure = None
         reset_zoom_pan_state()
+        update_pending_epipolar_line()
         cv2.namedWindow(g_display_window_name, cv2.WINDOW_NORMAL)
         cv2.resizeWindow(g_display_window_name, g_display_window_width, g_display_window_height)
         cv2.setMouseCallback(g_display_window_name, mouse_callback)
@@ -266,30 +449,85 @@ def main():
             f" {g_display_window_width}x{g_display_window_height}"
         )
         print("Left-click: Add point. Mouse Wheel: Zoom. Right-Drag: Pan.")
-        print("N:Next U:Undo R:ResetPoints Z:ResetView Q/Esc:Quit")
+        print("N:Next U:Undo R:ResetPoints Z:ResetView V:NextView Q/Esc:Quit")
 
         get_current_view_image_and_draw()
 
+        propagation_future: Future | None = None
+        propagation_stop_event = threading.Event()
+
         while True:
             key = cv2.waitKey(20) & 0xFF
 
+            if propagation_future is not None:
+                # The points were saved already. Keep pumping the window until the tracker is done, or stop it.
+                if key == ord("q") or key == 27:
+                    propagation_stop_event.set()
+                    propagation_future.result()
+                    print("Stopped propagation.")
+                    quit_app = True
+                    break
+                if not propagation_future.done():
+                    continue
+
+                propagation_result = propagation_future.result()
+                propagated_points = propagation_result.tracked_points
+                if propagation_result.failed_frame_index is None:
+                    print(f"Propagated points to {len(propagated_points)} frames.")
+                else:
+                    propagation_failure = propagation_result
+                    failed_filename = image_files[propagation_result.failed_frame_index].name
+                    print(
+                        f"Propagated points to {len(propagated_points)} frames, tracking failed on {failed_filename}."
+                    )
+                break
+
             if key == ord("n"):
                 if current_points:
                     print(f"Saved {len(current_points)} points for {image_path.name}.")
-                    all_annotations.append({"filename": image_path.name, "points": list(current_points)})
+                    points = finalize_points(original_image, current_points)
+                    all_annotations.append(create_annotation(image_path.name, points, g_view_start_indices))
+                    if PROPAGATE_POINTS and image_index + 1 < len(image_files):
+                        print("Propagating points to the following frames... (Q/Esc: stop and quit)")
+                        propagation_view_start_indices = list(g_view_start_indices)
+                        # Clicks would edit the points that are being tracked.
+                        cv2.setMouseCallback(g_display_window_name, lambda *args: None)
+                        propagation_future = propagation_executor.submit(
+                            propagate_points,
+                            image_files,
+                            image_index,
+                            np.array(points),
+                            max_frames=PROPAGATION_MAX_FRAMES,
+                            max_forward_backward_error=MAX_FORWARD_BACKWARD_ERROR,
+                            window_size=PROPAGATION_WINDOW_SIZE,
+                            stop_event=propagation_stop_event,
+                        )
+                        continue
                 break
 
             elif key == ord("u"):
                 if current_points:
                     current_points.pop()
+                    if len(current_points) in g_points_to_correct:
+                        g_points_to_correct.remove(len(current_points))
+                    if len(g_view_start_indices) > 1 and len(current_points) < g_view_start_indices[-1]:
+                        g_view_start_indices.pop()
                     print("Undid last point.")
+                    update_pending_epipolar_line()
                     get_current_view_image_and_draw()
                 else:
                     print("No points to undo.")
 
             elif key == ord("r"):
                 current_points = []
+                g_view_start_indices = [0]
+                g_points_to_correct = []
                 print("Reset all points for this image.")
+                update_pending_epipolar_line()
+                get_current_view_image_and_draw()
+
+            elif key == ord("v"):
+                start_next_view()
                 get_current_view_image_and_draw()
 
             elif key == ord("z"):
@@ -300,12 +538,15 @@ def main():
             elif key == ord("q") or key == 27:
                 if current_points:
                     print(f"Saved {len(current_points)} points for {image_path.name} before quitting.")
-                    all_annotations.append({"filename": image_path.name, "points": list(current_points)})
+                    points = finalize_points(original_image, current_points)
+                    all_annotations.append(create_annotation(image_path.name, points, g_view_start_indices))
                 quit_app = True
                 break
 
         cv2.destroyWindow(g_display_window_name)
 
+    propagation_executor.shutdown()
+
     if all_annotations:
         with open(OUTPUT_FILE, "w") as f:
             json.dump(all_annotations, f, indent=2)
@@ -0,0 +1,183 @@
+"""
+Mirror-plane model of the camera rig: every virtual view is the physical camera reflected in a mirror plane.
+
+`plot_virtual_cam.m` and `epipolar_geometry.m` treat each mirror view as an independent virtual camera with a
+left-handed rotation (6 degrees of freedom). Physically, a world point X seen in a mirror with unit normal n and
+distance d (the plane n^T X = d, in world coordinates) is seen by the physical camera at its reflection
+
+    X' = D X + 2 d n, with the Householder reflection D = I - 2 n n^T,
+
+so a virtual view's extrinsics are fully determined by the physical camera's and the mirror plane's 3 parameters:
+
+    R_v = R_p D, T_v = T_p + 2 d R_p n.
+
+The planes are estimated from the existing (BCT) extrinsics, and the residuals of the fit tell how far the independent
+calibration of each mirror view is from a physical reflection. `mirror_camera_parameters` turns the planes back into
+camera parameters with exact reflections, which any code using P = K [R | T] (e.g., `triangulation.py`) can use as-is,
+and `bundle_adjustment.py --parameterization mirror` refines the planes directly (3 instead of 6 parameters per view).
+
+Usage:
+    python mirror_rig.py --bct-params bct_params.mat
+    python mirror_rig.py --bct-params bct_params.mat --output bct_params_mirror.mat
+
+References
+----------
+1. Hesch, Mourikis & Roumeliotis, Mirror-Based Extrinsic Camera Calibration, WAFR 2008.
+"""
+
+import argparse
+import copy
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from camera_parameters import load_bct_params, save_bct_params
+
+PHYSICAL_VIEW = "physical"
+
+
+class MirrorPlane(NamedTuple):
+    """A mirror plane n^T X = d in world coordinates, fitted to a virtual view's extrinsics."""
+
+    normal: np.ndarray
+    """(3,) unit normal, oriented so that the distance is non-negative."""
+    distance: float
+    """Distance of the plane from the world origin."""
+    rotation_residual: float
+    """Angle (in degrees) between the virtual view's rotation and the reflection of the physical camera's rotation."""
+    translation_residual: float
+    """Distance between the virtual view's translation and the reflection of the physical camera's translation."""
+
+
+def householder_reflections(normals: np.ndarray) -> np.ndarray:
+    """Householder reflections I - 2 n n^T (..., 3, 3) of (..., 3) unit normals."""
+    normals = np.asarray(normals, dtype=np.float64)
+    return np.eye(3) - 2 * normals[..., :, None] * normals[..., None, :]
+
+
+def reflect_extrinsics(
+    rotation: np.ndarray, translation: np.ndarray, normals: np.ndarray, distances: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    World-to-camera rotations (M, 3, 3) and translations (M, 3) of the virtual views of a physical camera with the
+    given rotation (3, 3) and translation (3,) in M mirror planes with (M, 3) unit normals and (M,) distances.
+    """
+    normals = np.atleast_2d(normals)
+    rotations = rotation @ householder_reflections(normals)
+    translations = np.ravel(translation) + 2 * np.atleast_1d(distances)[:, None] * normals @ rotation.T
+    return rotations, translations
+
+
+def estimate_mirror_plane(
+    rotation: np.ndarray, translation: np.ndarray, virtual_rotation: np.ndarray, virtual_translation: np.ndarray
+) -> MirrorPlane:
+    """
+    Fit the mirror plane that best explains a virtual view as the reflection of the physical camera.
+
+    The closest reflection (in the Frobenius norm) to R_p^T R_v is I - 2 n n^T with n the eigenvector of the smallest
+    eigenvalue of its symmetric part. The distance is then the least squares solution of T_v - T_p = 2 d R_p n.
+    """
+    translation = np.ravel(translation)
+    virtual_translation = np.ravel(virtual_translation)
+    relative = rotation.T @ virtual_rotation
+    normal = np.linalg.eigh(0.5 * (relative + relative.T))[1][:, 0]
+    distance = 0.5 * float(normal @ rotation.T @ (virtual_translation - translation))
+    if distance < 0:
+        normal, distance = -normal, -distance
+
+    reflected_rotation, reflected_translation = reflect_extrinsics(rotation, translation, normal, distance)
+    cos_angle = (np.trace(reflected_rotation[0].T @ virtual_rotation) - 1) / 2
+    rotation_residual = float(np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0))))
+    translation_residual = float(np.linalg.norm(reflected_translation[0] - virtual_translation))
+    return MirrorPlane(normal, distance, rotation_residual, translation_residual)
+
+
+def estimate_mirror_planes(camera_parameters: dict[str, dict[str, np.ndarray]]) -> dict[str, MirrorPlane]:
+    """
+    Fit the mirror plane of every virtual view.
+
+    Parameters
+    ----------
+    camera_parameters : dict[str, dict[str, np.ndarray]]
+        Camera parameters, e.g. from `camera_parameters.load_bct_params`.
+
+    Returns
+    -------
+    dict[str, MirrorPlane]
+        Maps each virtual view key to its mirror plane.
+    """
+    physical = camera_parameters[PHYSICAL_VIEW]
+    return {
+        view_key: estimate_mirror_plane(
+            physical["rotation"], physical["translation"], parameters["rotation"], parameters["translation"]
+        )
+        for view_key, parameters in camera_parameters.items()
+        if view_key != PHYSICAL_VIEW
+    }
+
+
+def mirror_camera_parameters(
+    camera_parameters: dict[str, dict[str, np.ndarray]], mirror_planes: dict[str, MirrorPlane] | None = None
+) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Copy of the camera parameters where every virtual view's extrinsics are the exact reflection of the physical
+    camera in its mirror plane (fitted with `estimate_mirror_planes` unless given). Intrinsics are kept per view.
+    """
+    if mirror_planes is None:
+        mirror_planes = estimate_mirror_planes(camera_parameters)
+
+    physical = camera_parameters[PHYSICAL_VIEW]
+    mirrored = copy.deepcopy(camera_parameters)
+    view_keys = list(mirror_planes)
+    rotations, translations = reflect_extrinsics(
+        physical["rotation"],
+        physical["translation"],
+        np.stack([mirror_planes[view_key].normal for view_key in view_keys]),
+        np.array([mirror_planes[view_key].distance for view_key in view_keys]),
+    )
+    for view_key, rotation, translation in zip(view_keys, rotations, translations):
+        parameters = mirrored[view_key]
+        parameters["rotation"] = rotation
+        parameters["translation"] = translation.reshape(3, 1)
+        parameters["extrinsics"] = np.hstack((rotation, parameters["translation"]))
+    return mirrored
+
+
+def tangent_bases(normals: np.ndarray) -> np.ndarray:
+    """(M, 3, 2) orthonormal bases of the planes perpendicular to (M, 3) unit normals."""
+    return np.swapaxes(np.linalg.svd(np.atleast_2d(normals)[:, None, :])[2][:, 1:, :], 1, 2)
+
+
+def normals_from_tangent_coordinates(
+    initial_normals: np.ndarray, bases: np.ndarray, coordinates: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Unit normals n = u / |u|, u = n0 + B a (M, 3), of (M, 2) tangent coordinates a around (M, 3) initial normals n0
+    with (M, 3, 2) tangent bases B, and their Jacobians dn/da = (I - n n^T) B / |u| (M, 3, 2).
+
+    Together with the distance, these are the 3 parameters of a mirror plane during optimization.
+    """
+    unnormalized = initial_normals + (bases @ coordinates[..., None])[..., 0]
+    norms = np.linalg.norm(unnormalized, axis=-1)
+    normals = unnormalized / norms[:, None]
+    projections = np.eye(3) - normals[:, :, None] * normals[:, None, :]
+    return normals, projections @ bases / norms[:, None, None]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the mirror planes of the virtual views of a BCT calibration.")
+    parser.add_argument("--bct-params", type=Path, required=True, help="Merged BCT calibration file (bct_params.mat)")
+    parser.add_argument("--output", type=Path, help="Write the calibration with exact mirror reflections here (.mat)")
+    args = parser.parse_args()
+
+    camera_parameters = load_bct_params(args.bct_params)
+    mirror_planes = estimate_mirror_planes(camera_parameters)
+    for view_key, plane in mirror_planes.items():
+        print(
+            f"{view_key}: normal [{', '.join(f'{c:.6f}' for c in plane.normal)}], distance {plane.distance:.4f}"
+            f" | residuals: rotation {plane.rotation_residual:.4f} deg, translation {plane.translation_residual:.4f}"
+        )
+
+    if args.output is not None:
+        save_bct_params(args.bct_params, args.output, mirror_camera_parameters(camera_parameters, mirror_planes))
+        print(f"Calibration with exact mirror reflections saved to: {args.output}")
@@ -0,0 +1,198 @@
+"""
+Propagation of annotated points across consecutive video frames with pyramidal Lucas-Kanade optical flow.
+
+The points annotated on a keyframe are tracked frame to frame with `cv2.calcOpticalFlowPyrLK`. Every step is verified
+with a forward-backward check (track forward, track the result back, compare with where we started), and propagation
+stops at the first frame where any point fails it, so that only those frames need manual correction.
+
+Frames are decoded by a producer thread into a bounded queue (the "frame window") while the tracker consumes them, so
+decoding overlaps with tracking.
+"""
+
+import queue
+import threading
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import cv2
+import numpy as np
+
+# LK defaults; the window should comfortably cover the inter-frame motion at the pyramid's coarsest level.
+LK_WINDOW_SIZE = (21, 21)
+LK_MAX_PYRAMID_LEVEL = 3
+LK_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+
+
+class PropagationResult(NamedTuple):
+    """Result of propagating a keyframe's points through the following frames."""
+
+    tracked_points: dict[int, np.ndarray]
+    """Frame index -> Nx2 points, for every frame where all points were tracked successfully."""
+    failed_frame_index: int | None
+    """Index of the first frame where tracking failed, or None if propagation ran to the end."""
+    failed_frame_points: np.ndarray | None
+    """Nx2 best-effort points on the failed frame. Lost points keep their last successfully tracked position."""
+    failed_point_mask: np.ndarray | None
+    """(N,) boolean mask of the points that failed on the failed frame."""
+
+
+def track_points_forward_backward(
+    previous_gray: np.ndarray,
+    next_gray: np.ndarray,
+    points: np.ndarray,
+    max_forward_backward_error: float = 1.0,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Track points from one frame to the next, with a forward-backward consistency check.
+
+    Parameters
+    ----------
+    previous_gray, next_gray : np.ndarray
+        Consecutive grayscale frames.
+    points : np.ndarray
+        Nx2 point locations on `previous_gray`.
+    max_forward_backward_error : float, optional
+        Maximum distance (in pixels) between a point and its forward-backward tracked self to accept the track.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The Nx2 tracked points on `next_gray`, the (N,) boolean mask of successfully tracked points, and the (N,)
+        forward-backward errors.
+    """
+    points_forward_in = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    lk_parameters = dict(winSize=LK_WINDOW_SIZE, maxLevel=LK_MAX_PYRAMID_LEVEL, criteria=LK_CRITERIA)
+
+    points_forward, status_forward, _ = cv2.calcOpticalFlowPyrLK(
+        previous_gray, next_gray, points_forward_in, None, **lk_parameters
+    )
+    points_backward, status_backward, _ = cv2.calcOpticalFlowPyrLK(
+        next_gray, previous_gray, points_forward, None, **lk_parameters
+    )
+
+    forward_backward_errors = np.linalg.norm((points_backward - points_forward_in).reshape(-1, 2), axis=1)
+    valid = (
+        status_forward.ravel().astype(bool)
+        & status_backward.ravel().astype(bool)
+        & (forward_backward_errors < max_forward_backward_error)
+    )
+
+    # Tracks that leave the image are failures too.
+    height, width = next_gray.shape[:2]
+    points_forward = points_forward.reshape(-1, 2).astype(np.float64)
+    valid &= (
+        (points_forward[:, 0] >= 0)
+        & (points_forward[:, 0] <= width - 1)
+        & (points_forward[:, 1] >= 0)
+        & (points_forward[:, 1] <= height - 1)
+    )
+
+    return points_forward, valid, forward_backward_errors
+
+
+def iter_frames_grayscale(image_paths: list[Path], window_size: int = 64) -> Iterator[np.ndarray | None]:
+    """
+    Decode frames to grayscale on a producer thread, keeping at most `window_size` decoded frames ahead of the consumer.
+
+    Yields None for frames that could not be read. Stopping iteration early (closing the generator) stops the decoder.
+    """
+    frame_queue: queue.Queue = queue.Queue(maxsize=window_size)
+    stop_event = threading.Event()
+    end_of_frames = object()
+
+    def put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode_frames():
+        for image_path in image_paths:
+            if not put(cv2.imread(Path(image_path).as_posix(), cv2.IMREAD_GRAYSCALE)):
+                return
+        put(end_of_frames)
+
+    decoder = threading.Thread(target=decode_frames)
+    decoder.start()
+
+    try:
+        while True:
+            frame = frame_queue.get()
+            if frame is end_of_frames:
+                return
+            yield frame
+    finally:
+        # The decoder notices within one frame (or one put timeout), so joining keeps it from outliving the consumer.
+        stop_event.set()
+        decoder.join()
+
+
+def propagate_points(
+    image_paths: list[Path],
+    keyframe_index: int,
+    keyframe_points: np.ndarray,
+    max_frames: int | None = None,
+    max_forward_backward_error: float = 1.0,
+    window_size: int = 64,
+    stop_event: threading.Event | None = None,
+) -> PropagationResult:
+    """
+    Track a keyframe's points through the following frames until tracking fails or the frames run out.
+
+    Parameters
+    ----------
+    image_paths : list[Path]
+        Sorted paths of all frames in the sequence.
+    keyframe_index : int
+        Index of the annotated keyframe in `image_paths`.
+    keyframe_points : np.ndarray
+        Nx2 annotated points on the keyframe.
+    max_frames : int, optional
+        Maximum number of frames to propagate to after the keyframe. Defaults to all remaining frames.
+    max_forward_backward_error : float, optional
+        See `track_points_forward_backward`.
+    window_size : int, optional
+        Number of frames decoded ahead of the tracker.
+    stop_event : threading.Event, optional
+        When propagating on another thread, set this to stop early. The frames tracked so far are returned.
+
+    Returns
+    -------
+    PropagationResult
+        The tracked points per frame and, if tracking failed, where and for which points.
+    """
+    stop_index = len(image_paths) if max_frames is None else min(len(image_paths), keyframe_index + 1 + max_frames)
+    tracked_points = {}
+    points = np.asarray(keyframe_points, dtype=np.float64).reshape(-1, 2)
+    frames = iter_frames_grayscale(image_paths[keyframe_index:stop_index], window_size)
+
+    try:
+        previous_gray = next(frames, None)
+        if previous_gray is None:
+            return PropagationResult(tracked_points, None, None, None)
+
+        for frame_index, next_gray in enumerate(frames, start=keyframe_index + 1):
+            if stop_event is not None and stop_event.is_set():
+                break
+            if next_gray is None:
+                failed_point_mask = np.ones(len(points), dtype=bool)
+                return PropagationResult(tracked_points, frame_index, points.copy(), failed_point_mask)
+
+            next_points, valid, _ = track_points_forward_backward(
+                previous_gray, next_gray, points, max_forward_backward_error
+            )
+            if not valid.all():
+                failed_frame_points = np.where(valid[:, None], next_points, points)
+                return PropagationResult(tracked_points, frame_index, failed_frame_points, ~valid)
+
+            tracked_points[frame_index] = next_points
+            points = next_points
+            previous_gray = next_gray
+
+    finally:
+        frames.close()
+
+    return PropagationResult(tracked_points, None, None, None)
@@ -1,13 +1,14 @@
-import json
 from pathlib import Path
 
 import cv2
 import numpy as np
+from annotations import Annotations
 
 # Configuration
 BASEDIR = "depth-anything-v2"
 IMAGE_DIR = Path(BASEDIR, "color")
 PATH_ANNOTATED_COORDINATES = Path(BASEDIR, "annotated_coordinates.json")
+N_VIEWS = 2
 DISPLAY_MAX_WIDTH = 1280
 DISPLAY_MAX_HEIGHT = 720
 POINT_RADIUS = 2
@@ -232,23 +233,22 @@ def mouse_callback(event, x, y, flags, param):
 def main():
     global original_image, g_display_window_name, physical_image_points, virtual_image_points, precomputed_image
 
-    with open(PATH_ANNOTATED_COORDINATES, "r") as f:
-        annotations = json.load(f)
+    annotations = Annotations.load_json(PATH_ANNOTATED_COORDINATES, N_VIEWS)
 
     cv2.namedWindow(g_display_window_name, cv2.WINDOW_NORMAL)
     cv2.setMouseCallback(g_display_window_name, mouse_callback)
 
-    for annotation in annotations:
-        filename: str = annotation["filename"]
-        points: list[list[int, int]] = annotation["points"]
+    for filename in annotations:
+        points, _ = annotations.get(filename)
         original_image = cv2.imread((IMAGE_DIR / filename).as_posix())
 
         if original_image is None:
             print(f"Failed to load image: {(IMAGE_DIR / filename).as_posix()}")
             continue
 
-        physical_image_points = points[: len(points) // 2]
-        virtual_image_points = points[len(points) // 2 :]
+        # Missing points are NaN, which are never inside the view, so the others keep their numbers.
+        physical_image_points = points[0].tolist()
+        virtual_image_points = points[1:].reshape(-1, 2).tolist()
         reset_zoom_pan_state()
         cv2.resizeWindow(g_display_window_name, g_display_window_width, g_display_window_height)
         print(f"\n--- Displaying: {filename} ---")
@@ -1,11 +1,13 @@
-import json
 from pathlib import Path
-from typing import Any, Literal
+from typing import Literal
 
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
+from dataset import Dataset
+from distortion import undistort_points
 from point_set_registration_3d import register_points_3d_procrustes
+from projection import ProjectionKernel
 
 np.set_printoptions(suppress=True)
 
@@ -18,139 +20,82 @@ PLOT_POINTS = {
 }
 TRANSLATE_MDE_TO_BASELINE_FOR_DISPLAY = True
 USE_IMAGE_CENTER_AS_PRINCIPAL_POINT = False
+# Set if the annotated (color and depth) images are distorted. Depths are still sampled at the annotated pixels, but the
+# rays are backprojected through the undistorted pixels, using each view's "distortion" in the camera parameters.
+UNDISTORT_POINTS = False
 N_VIEWS = 2
 
 PATH_OUTPUT_IMAGE_ORIGINAL = Path(BASEDIR, "3d_points_original.png")
 PATH_OUTPUT_IMAGE_ALIGNED = Path(BASEDIR, "3d_points_aligned.png")
 PATH_OUTPUT_2D_IMAGE = Path(BASEDIR, "2d_points_per_image.png")
 
-PATH_ANNOTATED_COORDINATES = Path(BASEDIR, "annotated_coordinates.json")
-PATH_DEPTH_SCALES = Path(BASEDIR, "depth_scales.json")
-PATH_CAMERA_PARAMETERS = Path(BASEDIR, "camera_parameters.json")
-PATH_BASELINE_POINTS = Path(BASEDIR, "baseline_world_points.json")
 REGISTRATION_ALGORITHM: Literal["procrustes", "horn"] = "procrustes"
 
 
-def project_to_2d(points3d, intrinsics, extrinsics=None, image_size=None):
+def project_to_2d(points3d, kernel: ProjectionKernel, space: str = "world"):
     """
-    Project 3D points to 2D image coordinates using camera intrinsics and optional extrinsics.
+    Project (N, 3) points into every view of the rig, or (V, N, 3) points into their own views, in one call.
+    Points outside the image (or behind the camera) are NaN, so they are not plotted.
     """
-    points3d = np.asarray(points3d)
+    projection = kernel(points3d, space)
+    return np.where(projection.visible[..., None], projection.pixels, np.nan)
 
-    if extrinsics is not None:
-        homogeneous_points = np.hstack((points3d, np.ones((len(points3d), 1))))
-        points_camera = (extrinsics @ homogeneous_points.T).T[:, :3]
-    else:
-        points_camera = points3d
 
-    points2d = np.dot(points_camera, intrinsics.T)
-    points2d = points2d[:, :2] / points2d[:, 2:3]
-
-    if image_size is not None:
-        points2d[:, 0] = np.clip(points2d[:, 0], 0, image_size[0] - 1)
-        points2d[:, 1] = np.clip(points2d[:, 1], 0, image_size[1] - 1)
-
-    return points2d
-
-
-# Load camera parameters
-with open(PATH_CAMERA_PARAMETERS, "r") as f:
-    camera_parameters = json.load(f)
-
-available_views = list(camera_parameters.keys())
-required_views = ["physical"] + [f"virtual_{i+1}" for i in range(N_VIEWS - 1)]
-if len(available_views) < N_VIEWS:
-    print(
-        f"Error: Expected {N_VIEWS} camera parameter sets ('physical' + {N_VIEWS-1} virtual), found "
-        f"{len(available_views)}: {available_views}"
-    )
-    raise ValueError("Insufficient camera parameter sets")
-
-# Load annotations, depth scales, and baseline points
-with PATH_ANNOTATED_COORDINATES.open("r") as f:
-    annotations: list[dict[str, Any]] = json.load(f)
-
-with PATH_DEPTH_SCALES.open("r") as f:
-    depth_scales: dict[str, float] = json.load(f)
-
-with PATH_BASELINE_POINTS.open("r") as f:
-    baseline_points: list[dict[str, Any]] = json.load(f)
+# Load camera parameters, annotations, depth scales, and baseline points once, indexed by filename and view. All
+# matrices of all views are precomputed by the rig.
+dataset = Dataset(BASEDIR, N_VIEWS)
+rig = dataset.rig
+plot_view_keys = [
+    "physical" if i == 0 else f"virtual_{i+1}" if f"virtual_{i+1}" in rig.view_keys else "virtual"
+    for i in range(N_VIEWS)
+]
 
 image_3d_points = {}
 image_2d_points = {}
 
-for annotation in annotations:
-    filename: str = annotation["filename"]
-    points_2d = np.array(annotation["points"], dtype=np.float32)
-
-    depth_image_name = filename.replace(".jpg", "_depth_scaled.png")
-    color_image_path = Path(BASEDIR, "color") / filename
-    depth_image_path = Path(BASEDIR, "depth") / depth_image_name
-
-    depth_image = cv2.imread(depth_image_path.as_posix(), cv2.IMREAD_UNCHANGED)
+for filename in dataset:
+    depth_image = dataset.load_depth_image(filename)
     if depth_image is None:
-        print(f"Warning: Could not load depth image {depth_image_path.as_posix()}")
+        print(f"Warning: Could not load depth image for {filename}")
         continue
 
-    color_image = cv2.imread(color_image_path.as_posix())
+    color_image = dataset.load_color_image(filename)
     if color_image is None:
-        print(f"Warning: Could not load color image {color_image_path.as_posix()}")
+        print(f"Warning: Could not load color image {filename}")
         continue
     h, w = color_image.shape[:2]
 
-    current_depth_scale = depth_scales.get(depth_image_name)
+    current_depth_scale = dataset.get_depth_scale(filename)
     if current_depth_scale is None:
-        print(f"Warning: No depth scale found for {depth_image_name}")
+        print(f"Warning: No depth scale found for {filename}")
         continue
 
-    points_per_view = len(points_2d) // N_VIEWS
-    view_points_2d = [points_2d[i * points_per_view : (i + 1) * points_per_view] for i in range(N_VIEWS)]
-
-    view_params = []
-    for i in range(N_VIEWS):
-        view_key = "physical" if i == 0 else f"virtual_{i}" if f"virtual_{i}" in camera_parameters else "virtual"
-        view_params.append({
-            "intrinsics": np.array(camera_parameters[view_key]["intrinsics"]["array"], dtype=np.float32),
-            "extrinsics": np.array(camera_parameters[view_key]["extrinsics"]["array"], dtype=np.float32),
-        })
-
-    points_3d = []
-    for i, (points, params) in enumerate(zip(view_points_2d, view_params)):
-        fx, fy = params["intrinsics"][0, 0], params["intrinsics"][1, 1]
-        cx, cy = (
-            (w / 2, h / 2)
-            if USE_IMAGE_CENTER_AS_PRINCIPAL_POINT
-            else (params["intrinsics"][0, 2], params["intrinsics"][1, 2])
-        )
-
-        depth_values = depth_image[points[:, 1].astype(int), points[:, 0].astype(int)]
-        metric_depths = depth_values / current_depth_scale
-        x = (points[:, 0] - cx) * metric_depths / fx * 1000
-        y = (points[:, 1] - cy) * metric_depths / fy * 1000
-        z = metric_depths * 1000
-        view_points_3d = np.stack((x, y, z), axis=1)
-
-        if SPACE == "world":
-            rotation_matrix_inverse = params["extrinsics"][:3, :3].T
-            translation_inverse = -rotation_matrix_inverse @ params["extrinsics"][:3, 3]
-            inverse_extrinsics = np.hstack((rotation_matrix_inverse, translation_inverse[:, np.newaxis]))
-            homogeneous_points = np.hstack((view_points_3d, np.ones((len(view_points_3d), 1))))
-            view_points_3d = (inverse_extrinsics @ homogeneous_points.T).T[:, :3]
-
-        points_3d.append(view_points_3d)
-
-    points_3d = np.vstack(points_3d)
+    view_points_2d, valid = dataset.get_points(filename)
+    points_per_view = view_points_2d.shape[1]
+    view_points_2d_undistorted = view_points_2d
+    if UNDISTORT_POINTS:
+        view_points_2d_undistorted = undistort_points(view_points_2d, rig.intrinsics, rig.distortion).points
+
+    # Backproject all views at once, at the metric depths (in mm) sampled at the annotated pixels.
+    image_rig = rig.with_principal_point((w / 2, h / 2)) if USE_IMAGE_CENTER_AS_PRINCIPAL_POINT else rig
+    # Points missing in a view get NaN depths, so their 3D points are NaN: they are not plotted, and are left out of the
+    # diagnostics and registration below.
+    pixels = np.rint(np.where(valid[..., None], view_points_2d, 0)).astype(int)
+    depth_values = np.where(valid, depth_image[pixels[..., 1], pixels[..., 0]], np.nan)
+    metric_depths = depth_values / current_depth_scale
+    points_3d = image_rig.backproject(view_points_2d_undistorted, metric_depths * 1000, space=SPACE).reshape(-1, 3)
     image_3d_points[filename] = points_3d
 
     # Procrustes alignment with diagnostics
-    points_per_view = len(points_3d) // N_VIEWS
-    view_points_3d = [points_3d[i * points_per_view : (i + 1) * points_per_view] for i in range(N_VIEWS)]
+    view_points_3d = list(points_3d.reshape(N_VIEWS, points_per_view, 3))
     physical_points = view_points_3d[0]
     aligned_points_3d = [physical_points]
 
-    # Diagnostic: Print point set statistics
+    # Diagnostic: Print point set statistics, over the points annotated in every view so the views are comparable.
     print(f"\nDiagnostics for {filename}:")
+    annotated_in_all_views = np.all(valid, axis=0)
     for i, points in enumerate(view_points_3d):
+        points = points[annotated_in_all_views]
         if len(points) > 0:
             centroid = np.mean(points, axis=0)
             scale = np.sqrt(np.sum((points - centroid) ** 2) / len(points)) if len(points) > 0 else 0
@@ -160,38 +105,35 @@ for annotation in annotations:
             )
 
     for i in range(1, N_VIEWS):
-        if len(view_points_3d[i]) > 0 and len(physical_points) > 0:
+        # Only points annotated in both views correspond (the others are NaN).
+        common = valid[0] & valid[i]
+        if np.any(common):
             try:
                 registration_params = register_points_3d_procrustes(
-                    physical_points, view_points_3d[i], apply_scaling=True
+                    physical_points[common], view_points_3d[i][common], do_scale=True
                 )
-                registered_query_points = registration_params.registered_query_points
+                registered_query_points = np.full_like(physical_points, np.nan)
+                registered_query_points[common] = registration_params.registered_query_points
                 transform = registration_params.transform
                 metrics = registration_params.metrics
+                aligned_points_3d.append(registered_query_points)
             except Exception as e:
                 print(f"Procrustes alignment failed for virtual view {i} of {filename}: {e}")
                 aligned_points_3d.append(view_points_3d[i])
         else:
-            print(f"Skipping alignment for virtual view {i} of {filename}: Empty point set")
+            print(f"Skipping alignment for virtual view {i} of {filename}: No points annotated in both views")
             aligned_points_3d.append(view_points_3d[i])
 
     aligned_points_3d = np.vstack(aligned_points_3d)
     image_3d_points[filename + "_aligned"] = aligned_points_3d
 
-    points_2d_projected = []
-    for i, (points, params) in enumerate(zip(view_points_3d, view_params)):
-        extrinsics = params["extrinsics"] if SPACE == "world" else None
-        points_2d = project_to_2d(points, params["intrinsics"], extrinsics, image_size=(w, h))
-        points_2d_projected.append(points_2d)
-
-    aligned_points_2d_projected = []
-    aligned_view_points_3d = [
-        aligned_points_3d[i * points_per_view : (i + 1) * points_per_view] for i in range(N_VIEWS)
-    ]
-    for i, (points, params) in enumerate(zip(aligned_view_points_3d, view_params)):
-        extrinsics = params["extrinsics"] if SPACE == "world" else None
-        points_2d = project_to_2d(points, params["intrinsics"], extrinsics, image_size=(w, h))
-        aligned_points_2d_projected.append(points_2d)
+    # The annotated images are distorted if the points had to be undistorted, so distort the projections back.
+    kernel = ProjectionKernel(rig, points_per_view, image_size=(w, h), distort=UNDISTORT_POINTS)
+    points_2d_projected = list(project_to_2d(np.stack(view_points_3d), kernel, SPACE))
+
+    # Each view's aligned points, projected into their own view.
+    aligned_view_points_3d = aligned_points_3d.reshape(-1, points_per_view, 3)
+    aligned_points_2d_projected = list(project_to_2d(aligned_view_points_3d, kernel, SPACE))
 
     image_2d_points[filename] = {"original": points_2d_projected, "aligned": aligned_points_2d_projected}
 
@@ -205,21 +147,13 @@ for idx, (key, points_3d) in enumerate((k, v) for k, v in image_3d_points.items(
     ax = fig_3d_original.add_subplot(rows, cols, idx + 1, projection="3d")
     filename = key
 
-    points_per_view = len(points_3d) // N_VIEWS
-    view_points = [points_3d[i * points_per_view : (i + 1) * points_per_view] for i in range(N_VIEWS)]
+    view_points = list(points_3d.reshape(N_VIEWS, -1, 3))
 
-    this_image_baseline_points = next(
-        (bp["points"] for bp in baseline_points if bp["filename"] == filename and bp["points"]), []
-    )
-    baseline_points_array = (
-        np.array(this_image_baseline_points, dtype=np.float32) if this_image_baseline_points else None
-    )
+    baseline_points_array = dataset.get_baseline_points(filename)
 
     if baseline_points_array is not None and len(baseline_points_array) > 0 and SPACE == "camera":
-        extrinsics = np.array(camera_parameters["physical"]["extrinsics"]["array"], dtype=np.float32)
-        ones = np.ones((len(baseline_points_array), 1))
-        homogeneous_baseline = np.hstack((baseline_points_array, ones))
-        baseline_points_array = (extrinsics @ homogeneous_baseline.T).T[:, :3]
+        world_to_camera = rig.world_to_camera[0]
+        baseline_points_array = baseline_points_array @ world_to_camera[:3, :3].T + world_to_camera[:3, 3]
 
     if baseline_points_array is not None and len(baseline_points_array) > 0 and TRANSLATE_MDE_TO_BASELINE_FOR_DISPLAY:
         target_points = view_points[0]
@@ -233,9 +167,7 @@ for idx, (key, points_3d) in enumerate((k, v) for k, v in image_3d_points.items(
     labels = ["Physical Points"] + [f"Virtual {i+1} Points" for i in range(1, N_VIEWS)]
 
     for i, points in enumerate(view_points):
-        if len(points) > 0 and PLOT_POINTS.get(
-            "physical" if i == 0 else f"virtual_{i+1}" if f"virtual_{i+1}" in camera_parameters else "virtual", True
-        ):
+        if len(points) > 0 and PLOT_POINTS.get(plot_view_keys[i], True):
             ax.scatter(points[0, 0], points[0, 1], points[0, 2], c=colors[i], marker=markers[i])
             ax.scatter(points[1:, 0], points[1:, 1], points[1:, 2], c=colors[i], marker=markers[i], label=labels[i])
 
@@ -267,21 +199,13 @@ for idx, (key, points_3d) in enumerate((k, v) for k, v in image_3d_points.items(
     ax = fig_3d_aligned.add_subplot(rows, cols, idx + 1, projection="3d")
     filename = key.replace("_aligned", "")
 
-    points_per_view = len(points_3d) // N_VIEWS
-    view_points = [points_3d[i * points_per_view : (i + 1) * points_per_view] for i in range(N_VIEWS)]
+    view_points = list(points_3d.reshape(N_VIEWS, -1, 3))
 
-    this_image_baseline_points = next(
-        (bp["points"] for bp in baseline_points if bp["filename"] == filename and bp["points"]), []
-    )
-    baseline_points_array = (
-        np.array(this_image_baseline_points, dtype=np.float32) if this_image_baseline_points else None
-    )
+    baseline_points_array = dataset.get_baseline_points(filename)
 
     if baseline_points_array is not None and len(baseline_points_array) > 0 and SPACE == "camera":
-        extrinsics = np.array(camera_parameters["physical"]["extrinsics"]["array"], dtype=np.float32)
-        ones = np.ones((len(baseline_points_array), 1))
-        homogeneous_baseline = np.hstack((baseline_points_array, ones))
-        baseline_points_array = (extrinsics @ homogeneous_baseline.T).T[:, :3]
+        world_to_camera = rig.world_to_camera[0]
+        baseline_points_array = baseline_points_array @ world_to_camera[:3, :3].T + world_to_camera[:3, 3]
 
     if baseline_points_array is not None and len(baseline_points_array) > 0 and TRANSLATE_MDE_TO_BASELINE_FOR_DISPLAY:
         target_points = view_points[0]
@@ -295,9 +219,7 @@ for idx, (key, points_3d) in enumerate((k, v) for k, v in image_3d_points.items(
     labels = ["Physical Points"] + [f"Aligned Virtual {i+1} Points" for i in range(1, N_VIEWS)]
 
     for i, points in enumerate(view_points):
-        if len(points) > 0 and PLOT_POINTS.get(
-            "physical" if i == 0 else f"virtual_{i+1}" if f"virtual_{i+1}" in camera_parameters else "virtual", True
-        ):
+        if len(points) > 0 and PLOT_POINTS.get(plot_view_keys[i], True):
             ax.scatter(points[0, 0], points[0, 1], points[0, 2], c=colors[i], marker=markers[i])
             ax.scatter(points[1:, 0], points[1:, 1], points[1:, 2], c=colors[i], marker=markers[i], label=labels[i])
 
@@ -326,9 +248,7 @@ plt.savefig(PATH_OUTPUT_IMAGE_ALIGNED.as_posix())
 # Plotting 2D projections on color images
 fig_2d = plt.figure(figsize=(5 * cols, 5 * rows))
 for idx, (filename, points_data) in enumerate(image_2d_points.items()):
-    color_image_path = Path(BASEDIR, "color") / filename
-    color_image = cv2.imread(color_image_path.as_posix())
-    color_image = cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB)
+    color_image = cv2.cvtColor(dataset.load_color_image(filename), cv2.COLOR_BGR2RGB)
     h, w = color_image.shape[:2]
 
     ax = fig_2d.add_subplot(rows, cols, idx + 1)
@@ -339,9 +259,7 @@ for idx, (filename, points_data) in enumerate(image_2d_points.items()):
     labels = ["Physical Points"] + [f"Virtual {i+1} Points" for i in range(1, N_VIEWS)]
 
     for i, points in enumerate(points_data["original"]):
-        if len(points) > 0 and PLOT_POINTS.get(
-            "physical" if i == 0 else f"virtual_{i+1}" if f"virtual_{i+1}" in camera_parameters else "virtual", True
-        ):
+        if len(points) > 0 and PLOT_POINTS.get(plot_view_keys[i], True):
             ax.scatter(
                 points[0, 0],
                 points[0, 1],
@@ -352,9 +270,7 @@ for idx, (filename, points_data) in enumerate(image_2d_points.items()):
             ax.scatter(points[1:, 0], points[1:, 1], c=colors[i], marker=markers[i], s=50, label=labels[i])
 
     for i, points in enumerate(points_data["aligned"][1:], start=1):
-        if len(points) > 0 and PLOT_POINTS.get(
-            f"virtual_{i+1}" if f"virtual_{i+1}" in camera_parameters else "virtual", True
-        ):
+        if len(points) > 0 and PLOT_POINTS.get(plot_view_keys[i], True):
             ax.scatter(
                 points[0, 0],
                 points[0, 1],
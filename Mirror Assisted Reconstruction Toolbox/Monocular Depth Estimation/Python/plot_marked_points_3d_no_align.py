@@ -5,6 +5,7 @@ from typing import Any, Literal
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
+from annotations import points_from_json
 
 np.set_printoptions(suppress=True)
 
@@ -53,7 +54,7 @@ image_3d_points = {}  # filename -> array of (X, Y, Z) points
 
 for annotation in annotations:
     filename: str = annotation["filename"]
-    points_2d = np.array(annotation["points"], dtype=np.float32)
+    points_2d = points_from_json(annotation["points"]).astype(np.float32)
 
     depth_image_name = filename.replace(".jpg", "_depth_scaled.png")
     color_image_path = Path(BASEDIR, "color") / filename
@@ -100,7 +101,10 @@ for annotation in annotations:
             else (params["intrinsics"][0, 2], params["intrinsics"][1, 2])
         )
 
-        depth_values = depth_image[points[:, 1].astype(int), points[:, 0].astype(int)]
+        # Missing points (NaN) get NaN depths, so their 3D points are NaN and not plotted.
+        annotated = np.all(np.isfinite(points), axis=1)
+        depth_values = np.full(len(points), np.nan)
+        depth_values[annotated] = depth_image[points[annotated, 1].astype(int), points[annotated, 0].astype(int)]
         metric_depths = depth_values / current_depth_scale
         x = (points[:, 0] - cx) * metric_depths / fx * 1000
         y = (points[:, 1] - cy) * metric_depths / fy * 1000
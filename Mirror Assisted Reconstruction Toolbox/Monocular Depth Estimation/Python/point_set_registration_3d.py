@@ -560,6 +560,161 @@ def register_points_3d_procrustes(
     return registration_params_3d
 
 
+class BatchedRegistrationTransforms3d(NamedTuple):
+    """
+    The rigid (if scaling disabled) or similarity (if scaling enabled) transformations that map a batch of B query point
+    sets onto their target point sets.
+    """
+
+    rotation_matrices: np.ndarray
+    """(B, 3, 3) rotation matrices. NaN for point sets with fewer than three valid correspondences."""
+    translation_vectors: np.ndarray
+    """(B, 3, 1) translation vectors."""
+    scale_factors: np.ndarray
+    """(B,) scaling factors."""
+    rms_errors: np.ndarray
+    """(B,) root mean square errors between the registered query points and the target points."""
+
+
+def register_points_3d_batched(
+    points_query: np.ndarray,
+    points_target: np.ndarray,
+    do_scale: bool = True,
+    do_translation: bool = True,
+    enforce_valid_rotation: bool = True,
+    algorithm: Literal["horn", "procrustes"] = "procrustes",
+) -> BatchedRegistrationTransforms3d:
+    """
+    Register a batch of 3D point sets (query) onto another batch of 3D point sets (target) at once, e.g. a rigid body's
+    marker template onto the reconstructed markers of every frame of a trajectory.
+
+    Solves the same problem as `register_points_3d_procrustes` (SVD of the covariance matrices) or
+    `register_points_3d_horn` (eigenvectors of Horn's quaternion matrices), but for all point sets in one vectorized
+    call. Correspondences with a NaN coordinate on either side are left out of their point set's fit, so occluded
+    markers are handled per set.
+
+    Parameters
+    ----------
+    points_query : array_like
+        The points to be registered onto target points, (B, N, 3), or (N, 3) to register the same points onto every
+        target point set.
+    points_target : array_like
+        The target points, (B, N, 3).
+    do_scale : bool, optional
+        If True, scale the points.
+    do_translation : bool, optional
+        If True, translate the points.
+    enforce_valid_rotation : bool, optional
+        If True, enforce valid rotation matrices (determinant = 1). If False, reflections (e.g., mirror-like
+        permutation transforms) are allowed.
+    algorithm : Literal["horn", "procrustes"], optional
+        - "procrustes" : SVD of the covariance matrices.
+        - "horn" : Horn's quaternion method. Always yields proper rotations.
+
+    Returns
+    -------
+    BatchedRegistrationTransforms3d
+        The transforms of all point sets with their RMS errors. The transform of the b-th set maps query point x to
+        `scale_factors[b] * rotation_matrices[b] @ x + translation_vectors[b]`.
+    """
+    TOLERANCE_NEAR_ZERO = 1e-9
+    MIN_POINTS = 3
+
+    points_target = np.asarray(points_target, dtype=np.float64)
+    points_query = np.broadcast_to(np.asarray(points_query, dtype=np.float64), points_target.shape)
+    if points_target.ndim != 3 or points_target.shape[-1] != 3:
+        raise ValueError("Target points must be BxNx3.")
+
+    # Per point set weights: only the correspondences valid on both sides count.
+    valid = np.all(np.isfinite(points_query), axis=-1) & np.all(np.isfinite(points_target), axis=-1)
+    weights = valid.astype(np.float64)[..., None]
+    num_points = valid.sum(axis=1)
+    points_query = np.where(valid[..., None], points_query, 0.0)
+    points_target = np.where(valid[..., None], points_target, 0.0)
+
+    # Empty sets get a zero centroid so the decompositions below stay finite, they are set to NaN at the end anyway.
+    denominators = np.maximum(num_points, 1)[:, None, None]
+    centroid_query = (points_query * weights).sum(axis=1, keepdims=True) / denominators
+    centroid_target = (points_target * weights).sum(axis=1, keepdims=True) / denominators
+    centered_query = (points_query - centroid_query) * weights
+    centered_target = (points_target - centroid_target) * weights
+
+    # (B, 3, 3) covariance matrices, as in the single point set versions.
+    covariance_matrices = np.swapaxes(centered_query, 1, 2) @ centered_target
+
+    if algorithm == "procrustes":
+        u, _, vt = np.linalg.svd(np.swapaxes(covariance_matrices, 1, 2))
+        if enforce_valid_rotation:
+            # Flip the last singular vector of the sets whose rotation would be a reflection.
+            signs = np.sign(np.linalg.det(u @ vt))
+            vt[:, -1, :] *= np.where(signs == 0, 1.0, signs)[:, None]
+        rotation_matrices = u @ vt
+
+    elif algorithm == "horn":
+        S = covariance_matrices
+        Sxx, Sxy, Sxz = S[:, 0, 0], S[:, 0, 1], S[:, 0, 2]
+        Syx, Syy, Syz = S[:, 1, 0], S[:, 1, 1], S[:, 1, 2]
+        Szx, Szy, Szz = S[:, 2, 0], S[:, 2, 1], S[:, 2, 2]
+
+        # fmt: off
+        N_q = np.stack([
+            np.stack([Sxx + Syy + Szz,          Syz - Szy,           Szx - Sxz,           Sxy - Syx], axis=-1),
+            np.stack([      Syz - Szy,    Sxx - Syy - Szz,           Sxy + Syx,           Szx + Sxz], axis=-1),
+            np.stack([      Szx - Sxz,          Sxy + Syx,    -Sxx + Syy - Szz,           Syz + Szy], axis=-1),
+            np.stack([      Sxy - Syx,          Szx + Sxz,           Syz + Szy,    -Sxx - Syy + Szz], axis=-1),
+        ], axis=-2)
+        # fmt: on
+
+        # N_q is symmetric, so eigh (ascending eigenvalues) gives the optimal quaternion as the last eigenvector.
+        _, eigenvectors = np.linalg.eigh(N_q)
+        q0, q1, q2, q3 = np.moveaxis(eigenvectors[..., -1], -1, 0)
+
+        # Convert the quaternions to rotation matrices, as in `register_points_3d_horn`.
+        rotation_matrices = np.empty((len(q0), 3, 3))
+        rotation_matrices[:, 0, 0] = q0**2 + q1**2 - q2**2 - q3**2
+        rotation_matrices[:, 0, 1] = 2 * (q1 * q2 - q0 * q3)
+        rotation_matrices[:, 0, 2] = 2 * (q1 * q3 + q0 * q2)
+        rotation_matrices[:, 1, 0] = 2 * (q1 * q2 + q0 * q3)
+        rotation_matrices[:, 1, 1] = q0**2 - q1**2 + q2**2 - q3**2
+        rotation_matrices[:, 1, 2] = 2 * (q2 * q3 - q0 * q1)
+        rotation_matrices[:, 2, 0] = 2 * (q1 * q3 - q0 * q2)
+        rotation_matrices[:, 2, 1] = 2 * (q2 * q3 + q0 * q1)
+        rotation_matrices[:, 2, 2] = q0**2 - q1**2 - q2**2 + q3**2
+
+    else:
+        raise ValueError(f"Unknown registration algorithm: {algorithm}")
+
+    scale_factors = np.ones(len(points_target))
+    if do_scale:
+        # Trace of the rotated covariance matrices over the query sums of squares, as in the single point set versions.
+        sum_squares_query = np.sum(centered_query**2, axis=(1, 2))
+        trace_covariance = np.trace(rotation_matrices @ covariance_matrices, axis1=1, axis2=2)
+        degenerate = sum_squares_query < TOLERANCE_NEAR_ZERO
+        scale_factors = np.where(degenerate, 1.0, trace_covariance / np.where(degenerate, 1.0, sum_squares_query))
+
+    scaled_rotation_matrices = scale_factors[:, None, None] * rotation_matrices
+    translation_vectors = np.zeros((len(points_target), 3, 1))
+    if do_translation:
+        translation_vectors = np.swapaxes(centroid_target, 1, 2) - scaled_rotation_matrices @ np.swapaxes(
+            centroid_query, 1, 2
+        )
+
+    registered_query_points = points_query @ np.swapaxes(scaled_rotation_matrices, 1, 2) + np.swapaxes(
+        translation_vectors, 1, 2
+    )
+    squared_errors = np.sum((registered_query_points - points_target) ** 2, axis=-1) * valid
+    rms_errors = np.sqrt(squared_errors.sum(axis=1) / denominators[:, 0, 0])
+
+    # Too few correspondences to determine a transform.
+    underdetermined = num_points < MIN_POINTS
+    rotation_matrices[underdetermined] = np.nan
+    translation_vectors[underdetermined] = np.nan
+    scale_factors[underdetermined] = np.nan
+    rms_errors[underdetermined] = np.nan
+
+    return BatchedRegistrationTransforms3d(rotation_matrices, translation_vectors, scale_factors, rms_errors)
+
+
 if __name__ == "__main__":
     DO_SCALE = True
     DO_TRANSLATION = True
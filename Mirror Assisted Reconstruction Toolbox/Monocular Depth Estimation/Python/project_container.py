@@ -0,0 +1,362 @@
+"""
+Single-file container for an MDE evaluation project, with random access to every image's data.
+
+A project directory (as read by `plot_marked_points_3d.py`) is spread over many small files: `camera_parameters.json`,
+`annotated_coordinates.json`, `depth_scales.json`, `baseline_world_points.json` and one `depth/<image>_depth_scaled.png`
+per image, all re-read and re-parsed by every script. `pack_project` stores all of it in one file of raw binary
+sections, and `ProjectContainer` opens any section as a memory map, so reading one image's depth map is one seek plus
+a memory map, without touching the other images. A single file is also much faster to copy between machines than the
+thousands of small files of a full project.
+
+    <project>.lcmproj = [ header (256 B, zero-padded JSON) | section | section | ... | index (JSON) ]
+
+The header records where the index is. The index records each section's dtype, shape and (64-byte aligned) offset,
+the view keys of the rig, and per image its filename, number of physical points, view start indices (if the views
+have different numbers of points), depth scale and depth image name.
+Sections are named by key paths:
+
+    rig/intrinsics, rig/rotations, rig/translations, rig/distortion   (V, 3, 3), (V, 3, 3), (V, 3), (V, 5) float64
+    images/<filename>/points                                           (N, 2) float64 annotated pixels (NaN if missing)
+    images/<filename>/depth                                            (H, W) depth image as stored (e.g., uint16)
+    images/<filename>/baseline_points                                  (M, 3) float64 reconstructed world points
+
+The depth images are kept as they are, so packing is lossless and as compact as the scaled images; the metric depth is
+only computed (depth image / depth scale) when read. `unpack_project` writes the original files back.
+
+Usage:
+    python project_container.py pack depth-anything-v2 depth-anything-v2.lcmproj
+    python project_container.py unpack depth-anything-v2.lcmproj unpacked
+    python project_container.py info depth-anything-v2.lcmproj
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from annotations import points_from_json, points_to_json
+from camera_parameters import camera_parameters_to_json
+from camera_rig import CameraRig
+
+PROJECT_SUFFIX = ".lcmproj"
+PROJECT_MAGIC = "LCMART-PROJECT"
+PROJECT_VERSION = 1
+HEADER_SIZE = 256
+SECTION_ALIGNMENT = 64
+
+CAMERA_PARAMETERS_FILENAME = "camera_parameters.json"
+ANNOTATED_COORDINATES_FILENAME = "annotated_coordinates.json"
+DEPTH_SCALES_FILENAME = "depth_scales.json"
+BASELINE_POINTS_FILENAME = "baseline_world_points.json"
+DEPTH_DIRNAME = "depth"
+DEPTH_IMAGE_SUFFIX = "_depth_scaled.png"
+
+
+def get_depth_image_name(filename: str) -> str:
+    """Name of the (scaled) depth image of a color image, as written by the MDE inference scripts."""
+    return f"{Path(filename).stem}{DEPTH_IMAGE_SUFFIX}"
+
+
+class ProjectWriter:
+    """
+    Stream sections into a new project container. The container replaces `path_project` only once closed, so an
+    interrupted pack never leaves a truncated container behind.
+    """
+
+    def __init__(self, path_project: Path):
+        self.path_project = Path(path_project)
+        self.path_temp = self.path_project.with_name(self.path_project.name + ".tmp")
+        self.file = self.path_temp.open("wb")
+        self.file.write(b"\0" * HEADER_SIZE)
+        self.index = {"sections": {}, "view_keys": [], "images": []}
+
+    def set_view_keys(self, view_keys: list[str]) -> None:
+        """Record the view keys of the rig sections, in view order."""
+        self.index["view_keys"] = list(view_keys)
+
+    def add_image(self, filename: str, **metadata) -> None:
+        """Record an image (in order) with its metadata, e.g. its number of physical points and depth scale."""
+        self.index["images"].append({"filename": filename, **metadata})
+
+    def add_section(self, name: str, array: np.ndarray) -> None:
+        """Append an array as a section."""
+        if name in self.index["sections"]:
+            raise ValueError(f"Duplicate project section: {name}")
+        array = np.ascontiguousarray(array)
+        padding = -self.file.tell() % SECTION_ALIGNMENT
+        self.file.write(b"\0" * padding)
+        offset = self.file.tell()
+        self.file.write(array.data)
+        self.index["sections"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+
+    def close(self) -> None:
+        """Write the index and header, and move the container into place."""
+        try:
+            encoded_index = json.dumps(self.index).encode()
+            index_offset = self.file.tell()
+            self.file.write(encoded_index)
+            header = {
+                "magic": PROJECT_MAGIC,
+                "version": PROJECT_VERSION,
+                "index_offset": index_offset,
+                "index_size": len(encoded_index),
+            }
+            self.file.seek(0)
+            self.file.write(json.dumps(header).encode().ljust(HEADER_SIZE, b"\0"))
+            self.file.close()
+            os.replace(self.path_temp, self.path_project)
+        finally:
+            self.file.close()
+            self.path_temp.unlink(missing_ok=True)
+
+    def abort(self) -> None:
+        """Discard the partially written container."""
+        self.file.close()
+        self.path_temp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ProjectWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ProjectContainer:
+    """
+    Random access to a packed project. Arrays are read-only memory maps of their sections, so only the pages actually
+    touched are ever read.
+    """
+
+    def __init__(self, path_project: Path):
+        self.path_project = Path(path_project)
+        with self.path_project.open("rb") as f:
+            try:
+                header = json.loads(f.read(HEADER_SIZE).rstrip(b"\0"))
+            except ValueError:
+                header = {}
+            if header.get("magic") != PROJECT_MAGIC or header.get("version") != PROJECT_VERSION:
+                raise ValueError(f"Not a valid project container: {self.path_project.as_posix()}")
+            f.seek(header["index_offset"])
+            self.index = json.loads(f.read(header["index_size"]))
+
+        self.sections: dict[str, dict] = self.index["sections"]
+        self.images: dict[str, dict] = {image["filename"]: image for image in self.index["images"]}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        section = self.sections[name]
+        shape = tuple(section["shape"])
+        if 0 in shape:
+            return np.empty(shape, dtype=section["dtype"])
+        return np.memmap(self.path_project, dtype=section["dtype"], mode="r", offset=section["offset"], shape=shape)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    @property
+    def filenames(self) -> list[str]:
+        """Filenames of the packed images, in the order of `annotated_coordinates.json`."""
+        return list(self.images)
+
+    def load_rig(self) -> CameraRig:
+        """The camera rig of the project."""
+        rotations, translations = self["rig/rotations"], self["rig/translations"]
+        intrinsics, distortion = self["rig/intrinsics"], self["rig/distortion"]
+        camera_parameters = {
+            view_key: {
+                "intrinsics": intrinsics[i],
+                "rotation": rotations[i],
+                "translation": translations[i],
+                "extrinsics": np.column_stack((rotations[i], translations[i])),
+                "distortion": distortion[i],
+            }
+            for i, view_key in enumerate(self.index["view_keys"])
+        }
+        return CameraRig(camera_parameters, self.index["view_keys"])
+
+    def get_image_section(self, filename: str, name: str) -> np.ndarray | None:
+        """An image's section ("points", "depth" or "baseline_points"), or None if it was not packed."""
+        key = f"images/{filename}/{name}"
+        return self[key] if key in self.sections else None
+
+    def get_points(self, filename: str) -> np.ndarray | None:
+        """(N, 2) annotated pixels of an image."""
+        return self.get_image_section(filename, "points")
+
+    def get_depth_image(self, filename: str) -> np.ndarray | None:
+        """(H, W) depth image of an image, as stored (scaled)."""
+        return self.get_image_section(filename, "depth")
+
+    def get_depth_scale(self, filename: str) -> float | None:
+        """The depth scale of an image's depth image (metric depth = depth image / depth scale), if known."""
+        return self.images[filename].get("depth_scale")
+
+    def get_metric_depth(self, filename: str) -> np.ndarray | None:
+        """(H, W) metric depth map of an image (depth image / depth scale), or None if either is missing."""
+        depth_image, depth_scale = self.get_depth_image(filename), self.get_depth_scale(filename)
+        return None if depth_image is None or depth_scale is None else depth_image / depth_scale
+
+    def get_baseline_points(self, filename: str) -> np.ndarray | None:
+        """(M, 3) reconstructed world points of an image."""
+        return self.get_image_section(filename, "baseline_points")
+
+
+def pack_project(project_dir: Path, path_project: Path) -> int:
+    """
+    Pack a project directory into a single container (see the module docstring).
+
+    Parameters
+    ----------
+    project_dir : Path
+        Directory with `camera_parameters.json`, `annotated_coordinates.json` and optionally `depth_scales.json`,
+        `baseline_world_points.json` and the `depth` images.
+    path_project : Path
+        Path to the container to write.
+
+    Returns
+    -------
+    int
+        The number of images packed.
+    """
+    project_dir = Path(project_dir)
+    rig = CameraRig.load(project_dir / CAMERA_PARAMETERS_FILENAME)
+    with Path(project_dir, ANNOTATED_COORDINATES_FILENAME).open("r") as f:
+        annotations: list[dict] = json.load(f)
+    depth_scales: dict[str, float] = {}
+    if Path(project_dir, DEPTH_SCALES_FILENAME).exists():
+        with Path(project_dir, DEPTH_SCALES_FILENAME).open("r") as f:
+            depth_scales = json.load(f)
+    baseline_points: dict[str, list] = {}
+    if Path(project_dir, BASELINE_POINTS_FILENAME).exists():
+        with Path(project_dir, BASELINE_POINTS_FILENAME).open("r") as f:
+            baseline_points = {entry["filename"]: entry["points"] for entry in json.load(f)}
+
+    with ProjectWriter(path_project) as writer:
+        writer.set_view_keys(rig.view_keys)
+        writer.add_section("rig/intrinsics", rig.intrinsics)
+        writer.add_section("rig/rotations", rig.rotations)
+        writer.add_section("rig/translations", rig.translations)
+        writer.add_section("rig/distortion", rig.distortion)
+
+        for annotation in annotations:
+            filename = annotation["filename"]
+            metadata = {}
+            if annotation.get("num_physical_points") is not None:
+                metadata["num_physical_points"] = annotation["num_physical_points"]
+            if annotation.get("view_start_indices") is not None:
+                metadata["view_start_indices"] = list(annotation["view_start_indices"])
+            writer.add_section(f"images/{filename}/points", points_from_json(annotation["points"]))
+
+            depth_image_name = get_depth_image_name(filename)
+            path_depth_image = Path(project_dir, DEPTH_DIRNAME, depth_image_name)
+            depth_image = cv2.imread(path_depth_image.as_posix(), cv2.IMREAD_UNCHANGED)
+            if depth_image is not None:
+                writer.add_section(f"images/{filename}/depth", depth_image)
+                metadata["depth_image_name"] = depth_image_name
+            if depth_scales.get(depth_image_name) is not None:
+                metadata["depth_scale"] = depth_scales[depth_image_name]
+            if depth_image is None or "depth_scale" not in metadata:
+                print(f"Warning: No depth image or depth scale for {filename}")
+
+            if baseline_points.get(filename):
+                writer.add_section(
+                    f"images/{filename}/baseline_points", np.array(baseline_points[filename], dtype=np.float64)
+                )
+            writer.add_image(filename, **metadata)
+
+    return len(annotations)
+
+
+def unpack_project(path_project: Path, output_dir: Path) -> int:
+    """
+    Write the files of a packed project back into a project directory.
+
+    Returns
+    -------
+    int
+        The number of images unpacked.
+    """
+    project = ProjectContainer(path_project)
+    output_dir = Path(output_dir)
+    Path(output_dir, DEPTH_DIRNAME).mkdir(parents=True, exist_ok=True)
+
+    rig = project.load_rig()
+    camera_parameters = {
+        view_key: {
+            "intrinsics": rig.intrinsics[i],
+            "extrinsics": rig.world_to_camera[i, :3],
+            "distortion": rig.distortion[i],
+        }
+        for i, view_key in enumerate(rig.view_keys)
+    }
+    with Path(output_dir, CAMERA_PARAMETERS_FILENAME).open("w") as f:
+        json.dump(camera_parameters_to_json(camera_parameters), f, indent=2)
+
+    annotations, depth_scales, baseline_points = [], {}, []
+    for filename, image in project.images.items():
+        annotation = {"filename": filename}
+        if image.get("num_physical_points") is not None:
+            annotation["num_physical_points"] = image["num_physical_points"]
+        if image.get("view_start_indices") is not None:
+            annotation["view_start_indices"] = image["view_start_indices"]
+        annotation["points"] = points_to_json(project.get_points(filename))
+        annotations.append(annotation)
+
+        depth_image_name = image.get("depth_image_name", get_depth_image_name(filename))
+        if image.get("depth_scale") is not None:
+            depth_scales[depth_image_name] = image["depth_scale"]
+        depth_image = project.get_depth_image(filename)
+        if depth_image is not None:
+            cv2.imwrite(Path(output_dir, DEPTH_DIRNAME, depth_image_name).as_posix(), np.asarray(depth_image))
+        points = project.get_baseline_points(filename)
+        if points is not None:
+            baseline_points.append({"filename": filename, "points": points.tolist()})
+
+    for output_filename, contents in (
+        (ANNOTATED_COORDINATES_FILENAME, annotations),
+        (DEPTH_SCALES_FILENAME, depth_scales),
+        (BASELINE_POINTS_FILENAME, baseline_points),
+    ):
+        with Path(output_dir, output_filename).open("w") as f:
+            json.dump(contents, f, indent=2)
+
+    return len(annotations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack an MDE project into a single file, or unpack it.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_pack = subparsers.add_parser("pack", help="Pack a project directory into a container")
+    parser_pack.add_argument("project_dir", type=Path, help="Project directory (e.g. depth-anything-v2)")
+    parser_pack.add_argument("path_project", type=Path, nargs="?", help=f"Container (default: <dir>{PROJECT_SUFFIX})")
+    parser_unpack = subparsers.add_parser("unpack", help="Unpack a container into a project directory")
+    parser_unpack.add_argument("path_project", type=Path, help="Container")
+    parser_unpack.add_argument("output_dir", type=Path, help="Output directory")
+    parser_info = subparsers.add_parser("info", help="List the sections of a container")
+    parser_info.add_argument("path_project", type=Path, help="Container")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.command == "pack":
+        path_project = args.path_project or args.project_dir.with_name(args.project_dir.name + PROJECT_SUFFIX)
+        num_images = pack_project(args.project_dir, path_project)
+        print(
+            f"Packed {num_images} images into {path_project.as_posix()} ({path_project.stat().st_size / 1e6:.2f} MB)"
+            f" in {time.perf_counter() - start_time:.2f} s."
+        )
+    elif args.command == "unpack":
+        num_images = unpack_project(args.path_project, args.output_dir)
+        print(
+            f"Unpacked {num_images} images into {args.output_dir.as_posix()} in"
+            f" {time.perf_counter() - start_time:.2f} s."
+        )
+    else:
+        project = ProjectContainer(args.path_project)
+        print(f"{args.path_project.as_posix()}: views {project.index['view_keys']}, {len(project.images)} images")
+        for name, section in project.sections.items():
+            print(f"  {name}: {np.dtype(section['dtype']).name} {tuple(section['shape'])} at {section['offset']}")
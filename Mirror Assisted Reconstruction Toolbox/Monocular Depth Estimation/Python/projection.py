@@ -0,0 +1,200 @@
+"""
+Projection of world points into every view of a camera rig at once, with lens distortion and visibility masks.
+
+`ProjectionKernel` projects (N, 3) world points (or (V, N, 3) points per view) into all V views with one batched
+matrix multiplication, applies the Brown-Conrady distortion of each view (same model as `distortion.py`), and flags
+the points that are behind a camera or outside its image instead of clipping them. All intermediate and output arrays
+are allocated once per number of points and reused by every call, so it can run inside optimizer loops without
+allocating.
+
+The returned arrays are views of the kernel's buffers: they are overwritten by the next call, so copy them to keep
+them.
+
+Usage:
+    python projection.py --bct-params bct_params.mat --num-points 100000 --image-size 1280 720
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from camera_rig import CameraRig
+from distortion import distort_points
+from triangulation import project_points
+
+MIN_DEPTH = 1e-9
+
+
+class ProjectionResult(NamedTuple):
+    """Projection of N points into V views (views of the kernel's buffers)."""
+
+    pixels: np.ndarray
+    """(V, N, 2) (distorted) pixel coordinates, NaN for points behind the camera."""
+    visible: np.ndarray
+    """(V, N) boolean mask of the points in front of the camera and inside the image."""
+    depths: np.ndarray
+    """(V, N) depths (z in camera coordinates)."""
+
+
+class ProjectionKernel:
+    """
+    Preallocated projection of points into every view of a rig.
+
+    Parameters
+    ----------
+    rig : CameraRig
+        The camera rig.
+    num_points : int
+        Number of points per call. Calls with another number of points reallocate the buffers.
+    image_size : tuple[int, int] or array_like, optional
+        (width, height) of the images, or (V, 2) sizes per view. Without it, only points behind the cameras are
+        invisible.
+    distort : bool, optional
+        Apply the views' lens distortion. Skipped anyway if all coefficients are zero.
+    """
+
+    def __init__(
+        self,
+        rig: CameraRig,
+        num_points: int,
+        image_size: tuple[int, int] | np.ndarray | None = None,
+        distort: bool = True,
+    ):
+        num_views = rig.num_views
+        self.num_views = num_views
+        self.rotations = np.ascontiguousarray(rig.rotations)
+        self.translations = np.ascontiguousarray(rig.translations[:, :, None])
+
+        # (V, 1) parameters that broadcast against (V, N) coordinates.
+        self.fx, self.fy = rig.intrinsics[:, 0, 0, None], rig.intrinsics[:, 1, 1, None]
+        self.cx, self.cy = rig.intrinsics[:, 0, 2, None], rig.intrinsics[:, 1, 2, None]
+        self.skew = rig.intrinsics[:, 0, 1, None]
+        self.k1, self.k2, self.p1, self.p2, self.k3 = (c[:, None] for c in rig.distortion.T)
+        self.two_p1, self.two_p2 = 2 * self.p1, 2 * self.p2
+        self.distort = distort and bool(np.any(rig.distortion != 0))
+
+        self.max_pixels = None
+        if image_size is not None:
+            image_sizes = np.broadcast_to(np.asarray(image_size, dtype=np.float64), (num_views, 2))
+            self.max_pixels = image_sizes.T[:, :, None] - 1
+
+        self._allocate(num_points)
+
+    def _allocate(self, num_points: int) -> None:
+        # Coordinates are stored planar, (V, 3, N) and (2, V, N), so every elementwise step runs on contiguous rows.
+        shape = (self.num_views, num_points)
+        self.num_points = num_points
+        self.camera_points = np.empty((self.num_views, 3, num_points))
+        self.pixels = np.empty((2, *shape))
+        self.visible = np.empty(shape, dtype=bool)
+        self.inside = np.empty(shape, dtype=bool)
+        self.x, self.y, self.r2, self.radial, self.temp = (np.empty(shape) for _ in range(5))
+
+    def __call__(self, points_3d: np.ndarray, space: str = "world") -> ProjectionResult:
+        """
+        Project (N, 3) world points into every view, or (V, N, 3) points into their own views. With `space="camera"`,
+        the (V, N, 3) points are in each view's own camera coordinates.
+        """
+        points_3d = np.asarray(points_3d, dtype=np.float64)
+        if points_3d.shape[-2] != self.num_points:
+            self._allocate(points_3d.shape[-2])
+        x, y, r2, radial, temp = self.x, self.y, self.r2, self.radial, self.temp
+        u, v = self.pixels
+
+        # Camera coordinates of all points in all views: one batched matrix multiplication.
+        if space == "world":
+            np.matmul(self.rotations, np.swapaxes(points_3d, -1, -2), out=self.camera_points)
+            self.camera_points += self.translations
+        else:
+            self.camera_points[...] = np.swapaxes(points_3d, -1, -2)
+        depths = self.camera_points[:, 2]
+        np.greater(depths, MIN_DEPTH, out=self.visible)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(self.camera_points[:, 0], depths, out=x)
+            np.divide(self.camera_points[:, 1], depths, out=y)
+        np.logical_not(self.visible, out=self.inside)
+        np.copyto(x, np.nan, where=self.inside)
+        np.copyto(y, np.nan, where=self.inside)
+
+        if self.distort:
+            # radial = 1 + k1 r^2 + k2 r^4 + k3 r^6, plus the tangential terms (see `distortion.py`).
+            np.multiply(x, x, out=r2)
+            np.multiply(y, y, out=temp)
+            r2 += temp
+            np.multiply(self.k3, r2, out=radial)
+            radial += self.k2
+            radial *= r2
+            radial += self.k1
+            radial *= r2
+            radial += 1.0
+
+            # x_d = x radial + 2 p1 x y + p2 (r^2 + 2 x^2), y_d = y radial + p1 (r^2 + 2 y^2) + 2 p2 x y
+            np.multiply(x, x, out=u)
+            u *= 2
+            u += r2
+            u *= self.p2
+            np.multiply(y, y, out=v)
+            v *= 2
+            v += r2
+            v *= self.p1
+            np.multiply(x, y, out=temp)
+            np.multiply(temp, self.two_p1, out=r2)
+            u += r2
+            np.multiply(temp, self.two_p2, out=r2)
+            v += r2
+            x *= radial
+            x += u
+            y *= radial
+            y += v
+
+        # u = fx x + skew y + cx, v = fy y + cy
+        np.multiply(self.fx, x, out=u)
+        np.multiply(self.skew, y, out=temp)
+        u += temp
+        u += self.cx
+        np.multiply(self.fy, y, out=v)
+        v += self.cy
+
+        if self.max_pixels is not None:
+            for coordinates, max_coordinates in zip(self.pixels, self.max_pixels):
+                np.greater_equal(coordinates, 0, out=self.inside)
+                self.visible &= self.inside
+                np.less_equal(coordinates, max_coordinates, out=self.inside)
+                self.visible &= self.inside
+
+        return ProjectionResult(np.moveaxis(self.pixels, 0, -1), self.visible, depths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the multi-view projection kernel.")
+    parser.add_argument("--bct-params", type=Path, required=True, help="Merged BCT calibration file (bct_params.mat)")
+    parser.add_argument("--num-points", type=int, default=100000, help="Number of random points")
+    parser.add_argument("--image-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Image size")
+    parser.add_argument("--repeats", type=int, default=20, help="Number of timed calls")
+    args = parser.parse_args()
+
+    rig = CameraRig.load(args.bct_params)
+    rng = np.random.default_rng(0)
+    # Random points around the world origin (the calibration board), which every view sees.
+    scale = np.median(np.linalg.norm(rig.camera_centers, axis=1)) * 0.1
+    points_3d = rng.normal(scale=scale, size=(args.num_points, 3))
+
+    kernel = ProjectionKernel(rig, args.num_points, args.image_size)
+    kernel(points_3d)
+    start_time = time.perf_counter()
+    for _ in range(args.repeats):
+        result = kernel(points_3d)
+    elapsed_time = (time.perf_counter() - start_time) / args.repeats
+
+    start_time = time.perf_counter()
+    for _ in range(args.repeats):
+        reference = distort_points(project_points(rig.projection_matrices, points_3d), rig.intrinsics, rig.distortion)
+    reference_time = (time.perf_counter() - start_time) / args.repeats
+
+    print(f"Kernel: {rig.num_views} views x {args.num_points} points in {elapsed_time * 1000:.2f} ms per call")
+    print(f"project_points + distort_points: {reference_time * 1000:.2f} ms per call")
+    print(f"Max. difference: {np.nanmax(np.abs(result.pixels - reference)):.3e} px")
+    print(f"Visible per view: {', '.join(str(count) for count in result.visible.sum(axis=1))}")
@@ -0,0 +1,314 @@
+"""
+Streaming reconstruction of DLTdv8a tracked points, the Python counterpart of `reconstruct_tracked_pts_bct.m` (with
+`reconstruction_process_trackfile.m` and `save_reconstructed_pts_dltdv8a.m`).
+
+Instead of loading the whole trackfile, the flat DLTdv8a CSV (`xypts.csv`) is read in chunks of frames. Each chunk is
+reordered from the DLTdv8a layout (pt1_cam1_X, pt1_cam1_Y, pt1_cam2_X, ...) into views x points and triangulated in one
+vectorized call (see `triangulation.py`). Markers occluded in some views (NaN) are triangulated from the remaining
+views, and frames without any tracked data are skipped, as in MATLAB.
+
+The results are written incrementally to NumPy binaries preallocated on disk (`np.lib.format.open_memmap`), so memory
+stays flat no matter how long the recording is:
+
+    <output_dir>/
+    ├── <prefix>xyzpts.npy                  (frames, points, 3) world points, NaN where not reconstructed
+    ├── <prefix>reprojection_errors.npy     (frames, views, points) pixel reprojection errors
+    ├── reprojection_errors_per_view.csv    Frame, View, MeanError, RMSError, Variance, StdDev (valid frames)
+    └── <prefix>xyzpts.csv                  (with --csv) DLTdv8a 3D trackfile (`save_reconstructed_pts_dltdv8a.m`)
+
+Frame numbers are 1-based rows of the trackfile, as in DLTdv8a. Load the outputs lazily with
+`np.load(path, mmap_mode="r")`.
+
+Usage:
+    python reconstruct_trackfile.py trackfiles/xypts.csv --bct-params calibration/bct_params.mat
+    python reconstruct_trackfile.py trial1xypts.csv --bct-params bct_params.mat --undistort --csv --chunk-size 50000
+    python reconstruct_trackfile.py trial1xypts.csv --dlt-coefs dlt_coefs.csv
+"""
+
+import argparse
+import time
+import warnings
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from camera_parameters import load_bct_params
+from dlt_conversion import camera_parameters_from_dlt, load_dlt_coefs
+from distortion import stack_view_parameters, undistort_points
+from triangulation import projection_matrices_from_camera_parameters, triangulate_points
+
+# Configuration (mirrors the defaults in `defaults.m`)
+DLTDV_TRACKFILE_HEADER_OFFSET = 1
+DLTDV_TRACKFILE_2D_BASE = "xypts"
+DLTDV_TRACKFILE_3D_BASE = "xyzpts"
+DLTDV_EXT = ".csv"
+REPROJECTION_ERRORS_BASE = "reprojection_errors"
+PER_VIEW_ERRORS_FILENAME = "reprojection_errors_per_view.csv"
+CHUNK_SIZE = 10000  # frames per chunk
+DIM_COORDS = 2
+
+
+class TrackfileReconstructionSummary(NamedTuple):
+    """Summary of a trackfile reconstruction."""
+
+    num_frames: int
+    """Number of frames (data rows) in the trackfile."""
+    num_valid_frames: int
+    """Number of frames with any tracked data."""
+    num_points: int
+    """Number of tracked (physical) points."""
+    per_view_mean_reprojection_error: np.ndarray
+    """(V,) mean reprojection errors of each view over all frames and points."""
+    per_view_rms_reprojection_error: np.ndarray
+    """(V,) RMS reprojection errors of each view over all frames and points."""
+    path_points: Path
+    """Path to the (frames, points, 3) world points."""
+    path_errors: Path
+    """Path to the (frames, views, points) reprojection errors."""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reconstruct DLTdv8a tracked points with the BCT camera parameters.")
+    parser.add_argument("trackfile", type=Path, help="DLTdv8a 2D trackfile in flat format (e.g., xypts.csv)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--bct-params", type=Path, help="Merged BCT calibration file (bct_params.mat)")
+    group.add_argument("--dlt-coefs", type=Path, help="DLTdv8a DLT coefficients file (dlt_coefs.csv, no distortion)")
+    parser.add_argument(
+        "--view-labels", type=int, nargs="+", help="BCT view labels of the DLT columns (with --dlt-coefs, default 1..V)"
+    )
+    parser.add_argument("--output-dir", type=Path, help="Output directory (default: the trackfile's directory)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Number of frames per chunk")
+    parser.add_argument(
+        "--method", choices=["auto", "linear", "iterative", "optimal"], default="auto", help="Triangulation method"
+    )
+    parser.add_argument("--undistort", action="store_true", help="Undistort the tracked pixels first")
+    parser.add_argument("--csv", action="store_true", help="Also write the DLTdv8a 3D trackfile (xyzpts.csv)")
+    return parser.parse_args()
+
+
+def count_trackfile_frames(path_trackfile: Path) -> tuple[int, int]:
+    """
+    Count the frames (non-empty data rows) of a flat DLTdv8a trackfile without parsing it.
+
+    Returns
+    -------
+    tuple[int, int]
+        The number of frames and the number of values per frame (from the header).
+    """
+    with Path(path_trackfile).open("r") as f:
+        header = list(islice(f, DLTDV_TRACKFILE_HEADER_OFFSET))[-1]
+        num_frames = sum(1 for line in f if line.strip())
+    return num_frames, len(header.split(","))
+
+
+def iter_trackfile_chunks(path_trackfile: Path, num_views: int, chunk_size: int = CHUNK_SIZE):
+    """
+    Read a flat DLTdv8a trackfile in chunks of frames (like `reconstruction_process_trackfile.m`, without loading it).
+
+    Parameters
+    ----------
+    path_trackfile : Path
+        Path to the DLTdv8a 2D trackfile (pt1_cam1_X, pt1_cam1_Y, pt1_cam2_X, ..., one row per frame).
+    num_views : int
+        Number of views (trackfile "cameras").
+    chunk_size : int, optional
+        Maximum number of frames per chunk.
+
+    Yields
+    ------
+    tuple[int, np.ndarray]
+        The 0-based index of the chunk's first frame, and the chunk's pixels of shape (frames, views, points, 2).
+    """
+    with Path(path_trackfile).open("r") as f:
+        for _ in range(DLTDV_TRACKFILE_HEADER_OFFSET):
+            f.readline()
+        first_frame = 0
+        while lines := [line for line in islice(f, chunk_size) if line.strip()]:
+            values = np.loadtxt(lines, delimiter=",", dtype=np.float64, ndmin=2)
+            num_points = values.shape[1] // (num_views * DIM_COORDS)
+            # The view changes before the point in DLTdv8a: (frames, points, views, 2) -> (frames, views, points, 2).
+            pixels = values.reshape(len(values), num_points, num_views, DIM_COORDS).transpose(0, 2, 1, 3)
+            yield first_frame, pixels
+            first_frame += len(values)
+
+
+def reconstruct_trackfile(
+    path_trackfile: Path,
+    path_bct_params: Path | None = None,
+    output_dir: Path | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    method: str = "auto",
+    undistort: bool = False,
+    write_csv: bool = False,
+    path_dlt_coefficients: Path | None = None,
+    view_labels: list[int] | None = None,
+) -> TrackfileReconstructionSummary:
+    """
+    Reconstruct all tracked points of a DLTdv8a trackfile, chunk by chunk, writing the results as they are computed.
+
+    Parameters
+    ----------
+    path_trackfile : Path
+        Path to the DLTdv8a 2D trackfile in flat format.
+    path_bct_params : Path, optional
+        Path to the merged BCT calibration file. Its views must be in the same order as the trackfile's cameras.
+    output_dir : Path, optional
+        Output directory. Defaults to the trackfile's directory.
+    chunk_size : int, optional
+        Number of frames triangulated per call. Memory use is proportional to it, not to the number of frames.
+    method : str, optional
+        Triangulation method, see `triangulation.triangulate_points`.
+    undistort : bool, optional
+        Undistort the tracked pixels first, if they were tracked on distorted videos.
+    write_csv : bool, optional
+        Also write the world points as a DLTdv8a 3D trackfile (`xyzpts.csv`).
+    path_dlt_coefficients : Path, optional
+        Path to a DLTdv8a DLT coefficients file (see `dlt_conversion.py`) to use instead of `path_bct_params`.
+    view_labels : list[int], optional
+        The BCT view labels of the DLT coefficients' columns (see `dlt_conversion.camera_parameters_from_dlt`).
+
+    Returns
+    -------
+    TrackfileReconstructionSummary
+        Frame counts, overall per-view reprojection errors and the paths of the outputs.
+    """
+    path_trackfile = Path(path_trackfile)
+    output_dir = path_trackfile.parent if output_dir is None else Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if (path_bct_params is None) == (path_dlt_coefficients is None):
+        raise ValueError("Pass exactly one of path_bct_params and path_dlt_coefficients.")
+    if path_dlt_coefficients is not None:
+        camera_parameters = camera_parameters_from_dlt(load_dlt_coefs(path_dlt_coefficients), view_labels)
+    else:
+        camera_parameters = load_bct_params(path_bct_params)
+    view_keys = list(camera_parameters)
+    num_views = len(view_keys)
+    projection_matrices = projection_matrices_from_camera_parameters(camera_parameters, view_keys)
+    intrinsics, distortion = stack_view_parameters(camera_parameters, view_keys)
+
+    num_frames, num_values_per_frame = count_trackfile_frames(path_trackfile)
+    num_points = num_values_per_frame // (num_views * DIM_COORDS)
+    if num_points * num_views * DIM_COORDS != num_values_per_frame:
+        raise ValueError(
+            f"The trackfile has {num_values_per_frame} values per frame, which is not a multiple of"
+            f" {num_views} views x {DIM_COORDS} coordinates."
+        )
+
+    # The trackfile's name prefix, e.g., "trial1" for "trial1xypts.csv".
+    prefix = path_trackfile.stem.replace(DLTDV_TRACKFILE_2D_BASE, "")
+    path_points = output_dir / f"{prefix}{DLTDV_TRACKFILE_3D_BASE}.npy"
+    path_errors = output_dir / f"{prefix}{REPROJECTION_ERRORS_BASE}.npy"
+    points_3d = np.lib.format.open_memmap(path_points, mode="w+", dtype=np.float64, shape=(num_frames, num_points, 3))
+    errors = np.lib.format.open_memmap(
+        path_errors, mode="w+", dtype=np.float64, shape=(num_frames, num_views, num_points)
+    )
+
+    error_sums = np.zeros(num_views)
+    squared_error_sums = np.zeros(num_views)
+    error_counts = np.zeros(num_views)
+    num_valid_frames = 0
+
+    csv_file = None
+    if write_csv:
+        csv_file = (output_dir / f"{prefix}{DLTDV_TRACKFILE_3D_BASE}{DLTDV_EXT}").open("w")
+        csv_file.write(",".join(f"pt{i}_{axis}" for i in range(1, num_points + 1) for axis in "XYZ") + "\n")
+
+    with (output_dir / PER_VIEW_ERRORS_FILENAME).open("w") as per_view_file:
+        per_view_file.write("Frame,View,MeanError,RMSError,Variance,StdDev\n")
+
+        for first_frame, pixels in iter_trackfile_chunks(path_trackfile, num_views, chunk_size):
+            chunk_points = np.full((len(pixels), num_points, 3), np.nan)
+            chunk_errors = np.full((len(pixels), num_views, num_points), np.nan)
+
+            # Skip frames without any tracked data (`mask_nan_rows` in MATLAB).
+            valid = ~np.all(np.isnan(pixels), axis=(1, 2, 3))
+            num_chunk_frames = int(valid.sum())
+            if num_chunk_frames > 0:
+                # (frames, views, points, 2) -> (views, frames * points, 2): one triangulation call per chunk.
+                views_pixels = pixels[valid].transpose(1, 0, 2, 3).reshape(num_views, -1, DIM_COORDS)
+                if undistort:
+                    views_pixels = undistort_points(views_pixels, intrinsics, distortion).points
+                result = triangulate_points(projection_matrices, views_pixels, method)
+
+                chunk_points[valid] = result.points_3d.reshape(num_chunk_frames, num_points, 3)
+                chunk_errors[valid] = np.swapaxes(
+                    result.reprojection_errors.reshape(num_views, num_chunk_frames, num_points), 0, 1
+                )
+
+                observed = ~np.isnan(result.reprojection_errors)
+                error_sums += np.nansum(result.reprojection_errors, axis=1)
+                squared_error_sums += np.nansum(result.reprojection_errors**2, axis=1)
+                error_counts += observed.sum(axis=1)
+
+                # Per frame and view statistics, as in `reprojection_errors_per_view.csv` from MATLAB.
+                # Views where a frame has no observations at all get NaN statistics.
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    mean_errors = np.nanmean(chunk_errors[valid], axis=2)
+                    rms_errors = np.sqrt(np.nanmean(chunk_errors[valid] ** 2, axis=2))
+                variances = np.maximum(rms_errors**2 - mean_errors**2, 0.0)
+                frame_numbers = first_frame + np.flatnonzero(valid) + 1
+                rows = np.column_stack((
+                    np.repeat(frame_numbers, num_views),
+                    np.tile(np.arange(1, num_views + 1), num_chunk_frames),
+                    mean_errors.ravel(),
+                    rms_errors.ravel(),
+                    variances.ravel(),
+                    np.sqrt(variances).ravel(),
+                ))
+                np.savetxt(per_view_file, rows, fmt=["%d", "%d", "%.6f", "%.6f", "%.6f", "%.6f"], delimiter=",")
+
+            points_3d[first_frame : first_frame + len(pixels)] = chunk_points
+            errors[first_frame : first_frame + len(pixels)] = chunk_errors
+            if csv_file is not None:
+                np.savetxt(csv_file, chunk_points.reshape(len(pixels), -1), fmt="%.6f", delimiter=",")
+            num_valid_frames += num_chunk_frames
+
+    if csv_file is not None:
+        csv_file.close()
+    points_3d.flush()
+    errors.flush()
+    del points_3d, errors
+
+    if num_valid_frames != num_frames:
+        print(
+            "Warning: Encountered completely NaN rows. This means some frames had no tracked data."
+            "\nIf that is expected on your end, this is not a problem."
+        )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_errors = error_sums / error_counts
+        rms_errors = np.sqrt(squared_error_sums / error_counts)
+
+    return TrackfileReconstructionSummary(
+        num_frames, num_valid_frames, num_points, mean_errors, rms_errors, path_points, path_errors
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    start_time = time.perf_counter()
+    summary = reconstruct_trackfile(
+        args.trackfile,
+        args.bct_params,
+        args.output_dir,
+        chunk_size=args.chunk_size,
+        method=args.method,
+        undistort=args.undistort,
+        write_csv=args.csv,
+        path_dlt_coefficients=args.dlt_coefs,
+        view_labels=args.view_labels,
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    mean_errors, rms_errors = summary.per_view_mean_reprojection_error, summary.per_view_rms_reprojection_error
+    print(f"Mean Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in mean_errors)}")
+    print(f"RMS Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in rms_errors)}")
+    print(
+        f"Reconstructed {summary.num_points} points in {summary.num_valid_frames}/{summary.num_frames} frames in"
+        f" {elapsed_time:.2f} s ({summary.num_valid_frames / max(elapsed_time, 1e-9):.0f} frames/s) to:"
+        f" {summary.path_points.as_posix()}"
+    )
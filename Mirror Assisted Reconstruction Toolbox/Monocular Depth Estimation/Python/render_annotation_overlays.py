@@ -0,0 +1,259 @@
+"""
+Headless batch rendering of `annotated_coordinates.json` onto its images, for quick QA of whole datasets.
+
+Physical points (red) and virtual points (green) are drawn with their indices, like `plot_marked_points_2d.py`, but
+without any interaction. Images are rendered in parallel across a process pool, and either written as individual PNGs
+or streamed, in order, into a single MP4 (like `frames_to_vid.m`) through a bounded producer/consumer queue, so memory
+stays flat however large the dataset.
+
+Usage:
+    python render_annotation_overlays.py --output-dir overlays
+    python render_annotation_overlays.py --video overlays.mp4 --fps 30
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator
+
+import cv2
+import numpy as np
+from annotations import points_from_json
+
+# Configuration
+BASEDIR = "depth-anything-v2"
+IMAGE_DIR = Path(BASEDIR, "color")
+PATH_ANNOTATED_COORDINATES = Path(BASEDIR, "annotated_coordinates.json")
+POINT_RADIUS = 3
+# Colors in BGR order.
+PHYSICAL_POINT_COLOR = (0, 0, 255)
+VIRTUAL_POINT_COLOR = (0, 255, 0)
+TEXT_SCALE = 0.5
+VIDEO_FPS = 30
+VIDEO_FOURCC = "mp4v"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Render annotated points onto their images without any interaction.")
+    parser.add_argument("--annotations", type=Path, default=PATH_ANNOTATED_COORDINATES, help="Annotations JSON file")
+    parser.add_argument("--image-dir", type=Path, default=IMAGE_DIR, help="Directory containing the annotated images")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", type=Path, help="Write one PNG overlay per image to this directory")
+    output.add_argument("--video", type=Path, help="Stream all overlays, in order, into this MP4 file")
+    parser.add_argument("--fps", type=float, default=VIDEO_FPS, help="Frame rate of the output video")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of rendering processes")
+    parser.add_argument("--queue-size", type=int, default=32, help="Maximum number of rendered frames held in memory")
+    return parser.parse_args()
+
+
+def draw_annotation_overlay(
+    image: np.ndarray,
+    points: np.ndarray,
+    num_physical_points: int | None = None,
+    view_start_indices: list[int] | None = None,
+) -> np.ndarray:
+    """
+    Draw physical and virtual points, with their indices, onto an image (in place).
+
+    Parameters
+    ----------
+    image : np.ndarray
+        HxWx3 BGR image.
+    points : array_like
+        Nx2 annotated points, laid out view after view: the physical points first, followed by the virtual points of
+        each mirror. Missing (null or non-finite) points are skipped.
+    num_physical_points : int, optional
+        Number of points per view, used when `view_start_indices` is not given. Defaults to half the points, as in
+        `plot_marked_points_2d.py`.
+    view_start_indices : list[int], optional
+        Index of the first point of each view, as written by `mark_points.py` when the views have different numbers of
+        points. Each view's points are numbered from its own start.
+
+    Returns
+    -------
+    np.ndarray
+        The image with the overlay drawn on it.
+    """
+    points = points_from_json(points)
+    if view_start_indices is None:
+        if num_physical_points is None:
+            num_physical_points = len(points) // 2
+        view_start_indices = range(0, len(points), max(num_physical_points, 1))
+    view_start_indices = np.asarray(view_start_indices, dtype=np.int64)
+
+    for i, (x, y) in enumerate(points):
+        if not (np.isfinite(x) and np.isfinite(y)):
+            continue
+        view_index = np.searchsorted(view_start_indices, i, side="right") - 1
+        is_physical = view_index <= 0
+        color = PHYSICAL_POINT_COLOR if is_physical else VIRTUAL_POINT_COLOR
+        index = i - view_start_indices[max(view_index, 0)] + 1
+        center = (int(round(x)), int(round(y)))
+        cv2.circle(image, center, POINT_RADIUS, color, -1, cv2.LINE_AA)
+        cv2.putText(image, str(index), center, cv2.FONT_HERSHEY_SIMPLEX, TEXT_SCALE, color, 1, cv2.LINE_AA)
+
+    return image
+
+
+def _render_overlay(
+    image_path: Path,
+    points: list,
+    num_physical_points: int | None,
+    view_start_indices: list[int] | None,
+    output_path: Path | None,
+):
+    """Worker: render one overlay. Writes it to `output_path` if given, otherwise returns the rendered image."""
+    image = cv2.imread(image_path.as_posix())
+    if image is None:
+        return None
+
+    image = draw_annotation_overlay(image, points, num_physical_points, view_start_indices)
+    if output_path is None:
+        return image
+
+    if not cv2.imwrite(output_path.as_posix(), image):
+        raise IOError(f"cv2.imwrite could not write: {output_path.as_posix()}")
+    return output_path
+
+
+def _iter_rendered_in_order(
+    executor: ProcessPoolExecutor, tasks: list[tuple], max_pending: int
+) -> Iterator[tuple[tuple, Any]]:
+    """
+    Submit tasks to the pool while keeping at most `max_pending` in flight, yielding results in submission order.
+
+    Unlike `executor.map`, this never queues up (or holds the results of) the whole dataset at once.
+    """
+    pending: deque[tuple[tuple, Future]] = deque()
+    tasks_iter = iter(tasks)
+
+    for task in tasks_iter:
+        pending.append((task, executor.submit(_render_overlay, *task)))
+        if len(pending) >= max_pending:
+            break
+
+    while pending:
+        task, future = pending.popleft()
+        next_task = next(tasks_iter, None)
+        if next_task is not None:
+            pending.append((next_task, executor.submit(_render_overlay, *next_task)))
+        yield task, future.result()
+
+
+def _write_video(frame_queue: queue.Queue, path_video: Path, fps: float, errors: list):
+    """Consumer: writes frames from the queue into one video until it receives None."""
+    writer = None
+    frame_size = None
+    try:
+        while (frame := frame_queue.get()) is not None:
+            if writer is None:
+                frame_size = (frame.shape[1], frame.shape[0])
+                writer = cv2.VideoWriter(path_video.as_posix(), cv2.VideoWriter_fourcc(*VIDEO_FOURCC), fps, frame_size)
+                if not writer.isOpened():
+                    raise IOError(f"Could not open video writer for: {path_video.as_posix()}")
+            if (frame.shape[1], frame.shape[0]) != frame_size:
+                frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the producer never blocks on a dead consumer.
+        while frame_queue.get() is not None:
+            pass
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+def render_annotation_overlays(
+    annotations: list[dict[str, Any]],
+    image_dir: Path,
+    output_dir: Path | None = None,
+    path_video: Path | None = None,
+    fps: float = VIDEO_FPS,
+    num_workers: int | None = None,
+    queue_size: int = 32,
+) -> int:
+    """
+    Render every annotation's overlay, either as PNGs into `output_dir` or streamed into the video at `path_video`.
+
+    Returns
+    -------
+    int
+        The number of overlays rendered.
+    """
+    if (output_dir is None) == (path_video is None):
+        raise ValueError("Provide exactly one of `output_dir` or `path_video`.")
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    tasks = [
+        (
+            image_dir / annotation["filename"],
+            annotation["points"],
+            annotation.get("num_physical_points"),
+            annotation.get("view_start_indices"),
+            None if output_dir is None else output_dir / f"{Path(annotation['filename']).stem}_overlay.png",
+        )
+        for annotation in annotations
+    ]
+
+    num_rendered = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        if path_video is None:
+            for task, result in _iter_rendered_in_order(executor, tasks, max_pending=queue_size):
+                if result is None:
+                    print(f"Warning: Could not load image: {task[0].as_posix()}")
+                    continue
+                num_rendered += 1
+            return num_rendered
+
+        # Rendering processes -> (ordered) main thread -> bounded queue -> video writer thread.
+        frame_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        writer_errors = []
+        writer = threading.Thread(target=_write_video, args=(frame_queue, path_video, fps, writer_errors))
+        writer.start()
+        try:
+            for task, frame in _iter_rendered_in_order(executor, tasks, max_pending=queue_size):
+                if frame is None:
+                    print(f"Warning: Could not load image: {task[0].as_posix()}")
+                    continue
+                frame_queue.put(frame)
+                num_rendered += 1
+        finally:
+            frame_queue.put(None)
+            writer.join()
+
+        if writer_errors:
+            raise writer_errors[0]
+
+    return num_rendered
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with args.annotations.open("r") as f:
+        annotations: list[dict[str, Any]] = json.load(f)
+
+    start_time = time.perf_counter()
+    num_rendered = render_annotation_overlays(
+        annotations,
+        args.image_dir,
+        output_dir=args.output_dir,
+        path_video=args.video,
+        fps=args.fps,
+        num_workers=args.workers,
+        queue_size=args.queue_size,
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    print(
+        f"Rendered {num_rendered}/{len(annotations)} overlays in {elapsed_time:.2f} s"
+        f" ({num_rendered / max(elapsed_time, 1e-9):.1f} images/s) to: {args.output_dir or args.video}"
+    )
@@ -0,0 +1,128 @@
+"""
+Sub-pixel refinement of manually clicked points.
+
+Clicks from `mark_points.py` land on whole display pixels, which caps the accuracy of everything downstream
+(triangulation, depth sampling) at roughly half a pixel. The functions here snap a batch of clicks to a nearby image
+feature, either a corner (via `cv2.cornerSubPix`) or the intensity-weighted centroid of a blob in a small ROI, in a
+single vectorized call per image.
+"""
+
+from typing import Literal
+
+import cv2
+import numpy as np
+
+
+def refine_points_subpixel(
+    image: np.ndarray,
+    points: np.ndarray,
+    method: Literal["corner", "centroid"] = "corner",
+    window_radius: int = 5,
+    max_shift: float | None = None,
+    blob_polarity: Literal["bright", "dark"] = "bright",
+    max_iterations: int = 40,
+    epsilon: float = 1e-3,
+) -> np.ndarray:
+    """
+    Refine a batch of clicked points on one image to sub-pixel feature locations.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        The image the points were clicked on, HxW (grayscale) or HxWx3 (BGR).
+    points : array_like
+        Nx2 array of clicked [x, y] pixel coordinates.
+    method : Literal["corner", "centroid"], optional
+        - "corner" : Snap each point to the nearest saddle/corner with `cv2.cornerSubPix`. Best for checkerboard-like
+          markers and sharp object corners.
+        - "centroid" : Replace each point by the intensity-weighted centroid of a (2r+1)x(2r+1) ROI around it. Best for
+          dot/blob markers.
+    window_radius : int, optional
+        Half-size r of the search window (in original image pixels).
+    max_shift : float, optional
+        Refinements moving a point further than this (in pixels) are rejected and the click is kept as-is. Defaults to
+        `window_radius`, since anything further was found outside the window the user aimed at.
+    blob_polarity : Literal["bright", "dark"], optional
+        Whether blobs are brighter or darker than their surroundings. Ignored for the "corner" method.
+    max_iterations : int, optional
+        Maximum iterations for `cv2.cornerSubPix`. Ignored for the "centroid" method.
+    epsilon : float, optional
+        Convergence tolerance (in pixels) for `cv2.cornerSubPix`. Ignored for the "centroid" method.
+
+    Returns
+    -------
+    np.ndarray
+        Nx2 float64 array of refined [x, y] coordinates, in the same order as the input, clipped to the image.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return points.copy()
+
+    if max_shift is None:
+        max_shift = float(window_radius)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    if method == "corner":
+        refined = points.astype(np.float32).reshape(-1, 1, 2)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, max_iterations, epsilon)
+        cv2.cornerSubPix(gray, refined, (window_radius, window_radius), (-1, -1), criteria)
+        refined = refined.reshape(-1, 2).astype(np.float64)
+
+    elif method == "centroid":
+        refined = _refine_points_centroid(gray, points, window_radius, blob_polarity)
+
+    else:
+        raise ValueError(f"Unknown sub-pixel refinement method: '{method}'. Use 'corner' or 'centroid'.")
+
+    # Keep the original click wherever the refinement drifted off to some other feature (or failed outright).
+    shifts = np.linalg.norm(refined - points, axis=1)
+    rejected = ~np.isfinite(shifts) | (shifts > max_shift)
+    refined[rejected] = points[rejected]
+
+    # Stay on the image, so the refined points can index it (e.g., to sample depth maps).
+    height, width = gray.shape[:2]
+    np.clip(refined[:, 0], 0, width - 1, out=refined[:, 0])
+    np.clip(refined[:, 1], 0, height - 1, out=refined[:, 1])
+
+    return refined
+
+
+def _refine_points_centroid(
+    gray: np.ndarray, points: np.ndarray, window_radius: int, blob_polarity: Literal["bright", "dark"]
+) -> np.ndarray:
+    """Intensity-weighted centroid of the ROI around every point, gathered for all points with one fancy index."""
+    offsets = np.arange(-window_radius, window_radius + 1)
+
+    # Pad so that ROIs at the image borders never index out of bounds. Edge replication keeps the padding from pulling
+    # the centroid outwards.
+    padded = np.pad(gray.astype(np.float32), window_radius, mode="edge")
+    centers = np.rint(points).astype(np.int64)
+    rows = centers[:, 1, None, None] + offsets[None, :, None] + window_radius
+    cols = centers[:, 0, None, None] + offsets[None, None, :] + window_radius
+    rows = np.clip(rows, 0, padded.shape[0] - 1)
+    cols = np.clip(cols, 0, padded.shape[1] - 1)
+
+    # (N, 2r+1, 2r+1) stack of ROIs.
+    patches = padded[rows, cols]
+
+    # Use the contrast against the ROI's background (its minimum for bright blobs, maximum for dark ones) as weights, so
+    # a constant background contributes nothing.
+    if blob_polarity == "bright":
+        weights = patches - patches.min(axis=(1, 2), keepdims=True)
+    else:
+        weights = patches.max(axis=(1, 2), keepdims=True) - patches
+
+    total_weights = weights.sum(axis=(1, 2))
+    valid = total_weights > 0
+    safe_total_weights = np.where(valid, total_weights, 1.0)
+
+    dx = (weights * offsets[None, None, :]).sum(axis=(1, 2)) / safe_total_weights
+    dy = (weights * offsets[None, :, None]).sum(axis=(1, 2)) / safe_total_weights
+
+    refined = centers.astype(np.float64) + np.stack((dx, dy), axis=1)
+
+    # Flat ROIs carry no information, so leave those points where they were clicked.
+    refined[~valid] = points[~valid]
+
+    return refined
@@ -0,0 +1,631 @@
+"""
+Vectorized multi-view triangulation, the Python counterpart of the per-point `lsqnonlin` loop in
+`reconstruct_marked_pts_bct.m` and `reconstruct_tracked_pts_bct.m`.
+
+All points are triangulated at once, in two stages:
+
+1. Linear (DLT) triangulation: each point's 2V x 4 system [x * p3 - p1; y * p3 - p2] is stacked into an (N, 2V, 4)
+   array and solved with one batched SVD.
+2. Nonlinear refinement of the same cost `reconst_coords_per_px` minimizes, i.e. the pixel reprojection errors, with a
+   batched Levenberg-Marquardt: the analytic Jacobians of all points are accumulated into (N, 3, 3) normal equations
+   and solved together, each point with its own damping and convergence mask.
+
+Missing observations (NaN pixels, e.g. a marker not visible in a mirror) are simply left out of that point's system,
+like `views_with_pixels` in `reconstruct_tracked_pts_bct.m`. Points seen in fewer than two views are NaN.
+
+Mirror views with left-handed rotations (det(R) = -1) need no special care: projection only uses P = K [R | T].
+With `--mirror-model`, the virtual views are replaced by exact reflections of the physical camera in mirror planes
+fitted to their extrinsics (see `mirror_rig.py`). With `--dlt-coefs`, the projection matrices come straight from the
+DLTdv8a DLT coefficients instead (see `dlt_conversion.py`).
+
+For two views (a camera and a single mirror, the most common rig), the optimum has a closed form instead (Hartley &
+Sturm), which `triangulate_points` picks automatically. `--benchmark` compares it with the iterative solver.
+
+NOTE: The pixels must be undistorted (see `distortion.py`), as for the MATLAB reconstruction.
+
+Usage:
+    python triangulation.py --bct-params bct_params.mat --annotations annotated_coordinates.json
+    python triangulation.py --bct-params bct_params.mat --annotations annotated_coordinates.json --benchmark 100000
+    python triangulation.py --bct-params bct_params.mat --annotations annotated_coordinates.json --mirror-model
+    python triangulation.py --dlt-coefs dlt_coefs.csv --annotations annotated_coordinates.json
+
+References
+----------
+1. Hartley & Sturm, Triangulation, Computer Vision and Image Understanding 68(2), 1997.
+2. Hartley & Zisserman, Multiple View Geometry in Computer Vision (2nd ed.), Chapter 12.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from annotations import Annotations, points_to_json
+from camera_parameters import load_bct_params
+from dlt_conversion import camera_parameters_from_dlt, load_dlt_coefs, projection_matrices_from_dlt
+from epipolar_geometry import fundamental_matrix_from_projection_matrices
+from mirror_rig import mirror_camera_parameters
+
+TOLERANCE_NEAR_ZERO = 1e-12
+NEWTON_ITERATIONS = 8
+
+# (x - 1)^k (x + 1)^(6 - k) in ascending order of degree (column k), mapping a sextic on [-1, 1] onto [0, inf).
+_MOBIUS_INTERVAL_MAP = np.stack(
+    [np.polynomial.polynomial.polyfromroots([1.0] * k + [-1.0] * (6 - k)) for k in range(7)], axis=1
+)
+
+
+class TriangulationResult(NamedTuple):
+    """Result of triangulating N points observed in V views."""
+
+    points_3d: np.ndarray
+    """(N, 3) world points, NaN for points observed in fewer than two views."""
+    reprojection_errors: np.ndarray
+    """(V, N) pixel reprojection errors per view, NaN where the point was not observed."""
+    condition_numbers: np.ndarray
+    """(N,) condition numbers of the Gauss-Newton normal matrices J^T J at the solution. Large values mean the point is
+    poorly constrained (e.g., nearly parallel rays), so its position along the rays is unreliable."""
+    num_views: np.ndarray
+    """(N,) number of views each point was observed in."""
+    converged: np.ndarray
+    """(N,) boolean mask of the points whose refinement converged within the maximum number of iterations."""
+
+
+def projection_matrices_from_camera_parameters(
+    camera_parameters: dict[str, dict[str, np.ndarray]], view_keys: list[str] | None = None
+) -> np.ndarray:
+    """
+    Stack the projection matrices P = K [R | T] of the given views (all views by default) into a (V, 3, 4) array.
+    """
+    if view_keys is None:
+        view_keys = list(camera_parameters)
+    return np.stack([
+        camera_parameters[view_key]["intrinsics"] @ camera_parameters[view_key]["extrinsics"] for view_key in view_keys
+    ])
+
+
+def project_points(projection_matrices: np.ndarray, points_3d: np.ndarray) -> np.ndarray:
+    """
+    Project (N, 3) world points into every view.
+
+    Parameters
+    ----------
+    projection_matrices : np.ndarray
+        (V, 3, 4) projection matrices.
+    points_3d : np.ndarray
+        (N, 3) world points.
+
+    Returns
+    -------
+    np.ndarray
+        (V, N, 2) pixel coordinates.
+    """
+    homogeneous = projection_matrices[:, :, :3] @ points_3d.T + projection_matrices[:, :, 3:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.moveaxis(homogeneous[:, :2] / homogeneous[:, 2:], 1, 2)
+
+
+def triangulate_points_linear(projection_matrices: np.ndarray, points_2d: np.ndarray) -> np.ndarray:
+    """
+    Linear (DLT) triangulation of all points at once with a batched SVD.
+
+    Parameters
+    ----------
+    projection_matrices : np.ndarray
+        (V, 3, 4) projection matrices.
+    points_2d : np.ndarray
+        (V, N, 2) pixel coordinates, NaN where a point was not observed.
+
+    Returns
+    -------
+    np.ndarray
+        (N, 3) world points, NaN for points observed in fewer than two views.
+    """
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    observed = np.all(np.isfinite(points_2d), axis=-1)
+    pixels = np.where(observed[..., None], points_2d, 0.0)
+
+    # Rows x * p3 - p1 and y * p3 - p2 of every view: (V, N, 2, 4) -> (N, 2V, 4).
+    rows = pixels[..., None] * projection_matrices[:, None, 2:3, :] - projection_matrices[:, None, :2, :]
+    rows *= observed[..., None, None]
+
+    # Unit-norm rows balance the views (and the pixel scale against the homogeneous 1) for better conditioning.
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    rows = np.divide(rows, norms, out=np.zeros_like(rows), where=norms > TOLERANCE_NEAR_ZERO)
+    system = np.moveaxis(rows, 0, 1).reshape(points_2d.shape[1], -1, 4)
+
+    solutions = np.linalg.svd(system)[2][:, -1, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        points_3d = solutions[:, :3] / solutions[:, 3:]
+    points_3d[observed.sum(axis=0) < 2] = np.nan
+    return points_3d
+
+
+def _normal_equations(
+    projection_matrices: np.ndarray, points_3d: np.ndarray, points_2d: np.ndarray, observed: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Squared reprojection errors (N,), and the Gauss-Newton normal equations J^T J (N, 3, 3) and J^T r (N, 3) built from
+    the analytic Jacobians of the residuals r = projected - observed. Unobserved views contribute nothing.
+    """
+    # u = (p1 . X) / (p3 . X) => du/dX = (p1[:3] - u * p3[:3]) / (p3 . X), and likewise for v.
+    homogeneous = np.einsum("vij,nj->nvi", projection_matrices[:, :, :3], points_3d) + projection_matrices[:, :, 3]
+    depths = homogeneous[..., 2:]
+    safe_depths = np.where(np.abs(depths) > TOLERANCE_NEAR_ZERO, depths, TOLERANCE_NEAR_ZERO)
+    projected = homogeneous[..., :2] / safe_depths
+
+    mask = observed.T[..., None]
+    residuals = np.where(mask, projected - np.swapaxes(points_2d, 0, 1), 0.0)
+    jacobians = (
+        projection_matrices[None, :, :2, :3] - projected[..., None] * projection_matrices[None, :, 2:3, :3]
+    ) / safe_depths[..., None]
+    jacobians *= mask[..., None]
+
+    # (N, V, 2, 3) -> (N, 2V, 3), so both products are batched matrix multiplications.
+    residuals = residuals.reshape(len(points_3d), 2 * len(projection_matrices), 1)
+    jacobians = jacobians.reshape(len(points_3d), 2 * len(projection_matrices), 3)
+    jacobians_t = np.swapaxes(jacobians, 1, 2)
+    return (residuals**2).sum(axis=(1, 2)), jacobians_t @ jacobians, (jacobians_t @ residuals)[..., 0]
+
+
+def refine_points_nonlinear(
+    projection_matrices: np.ndarray,
+    points_2d: np.ndarray,
+    points_3d: np.ndarray,
+    max_iterations: int = 20,
+    tolerance: float = 1e-10,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Refine world points by minimizing their pixel reprojection errors with a batched Levenberg-Marquardt.
+
+    Parameters
+    ----------
+    projection_matrices : np.ndarray
+        (V, 3, 4) projection matrices.
+    points_2d : np.ndarray
+        (V, N, 2) pixel coordinates, NaN where a point was not observed.
+    points_3d : np.ndarray
+        (N, 3) initial world points (e.g., from `triangulate_points_linear`). NaN points are left as is.
+    max_iterations : int, optional
+        Maximum number of LM iterations.
+    tolerance : float, optional
+        A point has converged once its step is smaller than this (relative to the point's magnitude).
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The refined (N, 3) world points, the (N,) condition numbers of J^T J at the solution, and the (N,) boolean
+        convergence mask.
+    """
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    observed = np.all(np.isfinite(points_2d), axis=-1)
+    points_3d = np.array(points_3d, dtype=np.float64)
+    valid = np.all(np.isfinite(points_3d), axis=-1)
+
+    converged = np.zeros(len(points_3d), dtype=bool)
+    damping = np.full(len(points_3d), 1e-3)
+    active = np.flatnonzero(valid)
+    identity = np.eye(3)
+
+    costs, hessians, gradients = _normal_equations(
+        projection_matrices, points_3d[active], points_2d[:, active], observed[:, active]
+    )
+
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+
+        # Marquardt's scaling of the damping by the Hessian's diagonal keeps it invariant to the world units.
+        damped = hessians + damping[active, None, None] * (hessians * identity + TOLERANCE_NEAR_ZERO * identity)
+        steps = -np.linalg.solve(damped, gradients[..., None])[..., 0]
+
+        candidates = points_3d[active] + steps
+        candidate_costs, candidate_hessians, candidate_gradients = _normal_equations(
+            projection_matrices, candidates, points_2d[:, active], observed[:, active]
+        )
+
+        # Accepted steps relax the damping towards Gauss-Newton, rejected ones move towards gradient descent.
+        improved = candidate_costs <= costs
+        points_3d[active[improved]] = candidates[improved]
+        damping[active] = np.where(improved, damping[active] * 0.1, damping[active] * 10.0)
+        costs[improved] = candidate_costs[improved]
+        hessians[improved] = candidate_hessians[improved]
+        gradients[improved] = candidate_gradients[improved]
+
+        # A negligible step, accepted or not, means the point sits at its minimum (up to rounding).
+        done = np.linalg.norm(steps, axis=1) <= tolerance * (1.0 + np.linalg.norm(points_3d[active], axis=1))
+        converged[active[done]] = True
+        keep = ~done
+        active, costs, hessians, gradients = active[keep], costs[keep], hessians[keep], gradients[keep]
+
+    return points_3d, compute_condition_numbers(projection_matrices, points_2d, points_3d), converged
+
+
+def compute_condition_numbers(
+    projection_matrices: np.ndarray, points_2d: np.ndarray, points_3d: np.ndarray
+) -> np.ndarray:
+    """
+    Condition numbers (N,) of every point's Gauss-Newton normal matrix J^T J at the given world points (inf for NaN
+    points).
+    """
+    observed = np.all(np.isfinite(points_2d), axis=-1)
+    condition_numbers = np.full(len(points_3d), np.inf)
+    solved = np.flatnonzero(np.all(np.isfinite(points_3d), axis=-1))
+    _, hessians, _ = _normal_equations(
+        projection_matrices, points_3d[solved], points_2d[:, solved], observed[:, solved]
+    )
+    eigenvalues = np.linalg.eigvalsh(hessians)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        condition_numbers[solved] = np.where(eigenvalues[:, 0] > 0, eigenvalues[:, -1] / eigenvalues[:, 0], np.inf)
+    return condition_numbers
+
+
+def _polymul(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Multiply batches of polynomials (N, m) and (N, n) with coefficients in ascending order of degree."""
+    product = np.zeros((len(p), p.shape[1] + q.shape[1] - 1))
+    for degree in range(q.shape[1]):
+        product[:, degree : degree + p.shape[1]] += p * q[:, degree : degree + 1]
+    return product
+
+
+def _closest_points_to_origin(lines: np.ndarray) -> np.ndarray:
+    """Closest points (N, 3) to the origin of homogeneous lines (N, 3) [a, b, c]: (-a c, -b c, a^2 + b^2)."""
+    a, b, c = lines[:, 0], lines[:, 1], lines[:, 2]
+    return np.stack((-a * c, -b * c, a * a + b * b), axis=1)
+
+
+def _epipolar_costs(t, a, b, c, d, f1, f2) -> np.ndarray:
+    """
+    Hartley & Sturm's cost s(t) = t^2 / (1 + f^2 t^2) + (c t + d)^2 / ((a t + b)^2 + f'^2 (c t + d)^2), the sum of the
+    squared distances of both (transformed) points to the pencil's epipolar lines at t, inf where undefined.
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        costs = t**2 / (1 + (f1 * t) ** 2) + (c * t + d) ** 2 / ((a * t + b) ** 2 + (f2 * (c * t + d)) ** 2)
+    return np.where(np.isfinite(costs), costs, np.inf)
+
+
+def _newton_root_certified(polynomials, a, b, c, d, f1, f2) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the optimal root of every (N, 7) sextic g(t) by Newton's method from t = 0, and certify it.
+
+    t = 0 is the epipolar line through the first point, so for small noise the optimum is the root nearest to it. The
+    root t* is certified as the global optimum if no other real root can beat it: since the cost s(t) is at least its
+    first term t^2 / (1 + f^2 t^2), a better root must lie in |t| < T with T^2 = s(t*) / (1 - f^2 s(t*)), and
+    Descartes' rule of signs on g mapped from [-T, T] onto [0, inf) (t = T (x - 1) / (x + 1)) proves that t* is the
+    only root there. t = inf costs at least 1 / f^2 > s(t*) as well.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The (N,) roots and the (N,) boolean mask of those that were certified.
+    """
+    t = np.zeros(len(polynomials))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(NEWTON_ITERATIONS):
+            values, derivatives = polynomials[:, 6], np.zeros(len(t))
+            for degree in range(5, -1, -1):
+                derivatives = derivatives * t + values
+                values = values * t + polynomials[:, degree]
+            steps = values / derivatives
+            t = t - steps
+        converged = np.abs(steps) <= 1e-12 * (1.0 + np.abs(t))
+
+        costs = _epipolar_costs(t, a, b, c, d, f1, f2)
+        bounded = f1**2 * costs < 1.0
+        half_width = np.sqrt(costs / (1.0 - f1**2 * costs)) * (1.0 + 1e-9) + TOLERANCE_NEAR_ZERO
+        scaled = polynomials * half_width[:, None] ** np.arange(7)
+    mapped = scaled @ _MOBIUS_INTERVAL_MAP.T
+
+    # Sign changes of the mapped coefficients, skipping (near) zeros, bound the number of roots in [-T, T].
+    magnitudes = np.abs(mapped)
+    signs = np.where(magnitudes > 1e-9 * magnitudes.max(axis=1, keepdims=True), np.sign(mapped), 0.0)
+    sign_changes = np.zeros(len(t), dtype=np.int64)
+    previous = np.zeros(len(t))
+    for k in range(7):
+        sign_changes += (signs[:, k] != 0) & (previous != 0) & (signs[:, k] != previous)
+        previous = np.where(signs[:, k] != 0, signs[:, k], previous)
+
+    certified = converged & np.isfinite(t) & np.isfinite(costs) & bounded & (sign_changes == 1)
+    return t, certified
+
+
+def _least_cost_root_companion(polynomials, a, b, c, d, f1, f2) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the optimal root of every (N, 7) sextic g(t) among all its roots, as the eigenvalues of the (N, 6, 6)
+    companion matrices, and t = inf.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The (N,) roots and the (N,) boolean mask of those where t = inf is optimal instead.
+    """
+    # A vanishing leading coefficient (lower degree) is kept tiny instead, which sends the spurious roots towards
+    # t = inf, a candidate anyway.
+    leading = polynomials[:, 6]
+    leading = np.where(np.abs(leading) > TOLERANCE_NEAR_ZERO, leading, np.copysign(TOLERANCE_NEAR_ZERO, leading))
+    companions = np.zeros((len(polynomials), 6, 6))
+    companions[:, 0, :] = -polynomials[:, 5::-1] / leading[:, None]
+    companions[:, np.arange(1, 6), np.arange(5)] = 1.0
+    roots = np.linalg.eigvals(companions).real
+
+    costs = _epipolar_costs(roots, a[:, None], b[:, None], c[:, None], d[:, None], f1[:, None], f2[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_at_infinity = 1 / f1**2 + c**2 / (a**2 + (f2 * c) ** 2)
+    best = np.argmin(costs, axis=1)
+    at_infinity = np.nan_to_num(cost_at_infinity, nan=np.inf) < costs[np.arange(len(roots)), best]
+    return roots[np.arange(len(roots)), best], at_infinity
+
+
+def correct_correspondences_optimal(F: np.ndarray, points_1: np.ndarray, points_2: np.ndarray) -> np.ndarray:
+    """
+    Optimally correct point correspondences so they satisfy the epipolar constraint x2^T F x1 = 0 exactly, with the
+    least squared pixel displacement (Hartley & Sturm's method, Algorithm 12.1 of Hartley & Zisserman).
+
+    For every correspondence, both images are translated to put the points at the origin and rotated to put the
+    epipoles on the x-axis. The pencil of epipolar lines is then parameterized by t, and the minimum of the squared
+    distances of the points to their lines is among the real roots of a degree-6 polynomial in t (or at t = inf). The
+    polynomials of all correspondences are solved at once by Newton's method, which is certified to have found the
+    optimal root (`_newton_root_certified`). Only the few that cannot be certified are solved through the eigenvalues
+    of their 6x6 companion matrices.
+
+    Parameters
+    ----------
+    F : np.ndarray
+        3x3 fundamental matrix (l2 = F @ x1), e.g. from `epipolar_geometry.fundamental_matrix_from_projection_matrices`.
+    points_1, points_2 : np.ndarray
+        (N, 2) corresponding pixel coordinates in views 1 and 2.
+
+    Returns
+    -------
+    np.ndarray
+        (2, N, 2) corrected pixel coordinates in views 1 and 2.
+    """
+    num_points = len(points_1)
+    F = F / np.linalg.norm(F)
+    u, _, vt = np.linalg.svd(F)
+    epipole_1, epipole_2 = vt[-1], u[:, -1]
+
+    # Translate the points to the origin: x -> x - p, with the epipoles following along.
+    e1 = np.tile(epipole_1, (num_points, 1))
+    e1[:, :2] -= points_1 * epipole_1[2]
+    e2 = np.tile(epipole_2, (num_points, 1))
+    e2[:, :2] -= points_2 * epipole_2[2]
+    e1 /= np.hypot(e1[:, 0], e1[:, 1])[:, None]
+    e2 /= np.hypot(e2[:, 0], e2[:, 1])[:, None]
+
+    # Only a, b, c and d of F'' = R2 T2^-T F T1^-1 R1^T = [[f f' d, -f' c, -f' d], [-f b, a, b], [-f d, c, d]] are
+    # needed. With the rotations R = [[e_x, e_y, 0], [-e_y, e_x, 0], [0, 0, 1]] taking the epipoles to (1, 0, f) and
+    # the translations only touching the last column of F T1^-1 and the last row of T2^-T F, they reduce to:
+    r1 = np.stack((-e1[:, 1], e1[:, 0]), axis=1)
+    r2 = np.stack((-e2[:, 1], e2[:, 0]), axis=1)
+    last_column = points_1 @ F[:2, :2].T + F[:2, 2]
+    last_row = points_2 @ F[:2, :2] + F[2, :2]
+    a = np.einsum("ni,ij,nj->n", r2, F[:2, :2], r1)
+    b = np.einsum("ni,ni->n", r2, last_column)
+    c = np.einsum("ni,ni->n", last_row, r1)
+    d = np.einsum("ni,ni->n", points_2, last_column) + points_1 @ F[2, :2] + F[2, 2]
+    f1, f2 = e1[:, 2], e2[:, 2]
+
+    # g(t) = t ((a t + b)^2 + f'^2 (c t + d)^2)^2 - (a d - b c) (1 + f^2 t^2)^2 (a t + b) (c t + d)
+    at_b = np.stack((b, a), axis=1)
+    ct_d = np.stack((d, c), axis=1)
+    quadratic = _polymul(at_b, at_b) + f2[:, None] ** 2 * _polymul(ct_d, ct_d)
+    term_1 = np.zeros((num_points, 7))
+    term_1[:, 1:6] = _polymul(quadratic, quadratic)
+    one_plus_f2t2 = np.stack((np.ones(num_points), np.zeros(num_points), f1**2), axis=1)
+    term_2 = _polymul(_polymul(one_plus_f2t2, one_plus_f2t2), _polymul(at_b, ct_d)) * (a * d - b * c)[:, None]
+    polynomials = term_1 - term_2
+
+    polynomials /= np.max(np.abs(polynomials), axis=1, keepdims=True)
+    t, certified = _newton_root_certified(polynomials, a, b, c, d, f1, f2)
+    at_infinity = np.zeros(num_points, dtype=bool)
+    fallback = np.flatnonzero(~certified)
+    if len(fallback):
+        t[fallback], at_infinity[fallback] = _least_cost_root_companion(
+            polynomials[fallback], a[fallback], b[fallback], c[fallback], d[fallback], f1[fallback], f2[fallback]
+        )
+
+    # Epipolar lines l1 = (t f, 1, -t) and l2 = (-f' (c t + d), a t + b, c t + d), or their limits as t -> inf.
+    lines_1 = np.stack((t * f1, np.ones(num_points), -t), axis=1)
+    lines_2 = np.stack((-f2 * (c * t + d), a * t + b, c * t + d), axis=1)
+    lines_1[at_infinity] = np.stack((f1, np.zeros(num_points), -np.ones(num_points)), axis=1)[at_infinity]
+    lines_2[at_infinity] = np.stack((-f2 * c, a, c), axis=1)[at_infinity]
+
+    # Map the closest points on the lines back: x = T^-1 R^T x''.
+    corrected = []
+    for points, e, lines in ((points_1, e1, lines_1), (points_2, e2, lines_2)):
+        closest = _closest_points_to_origin(lines)
+        x, y = e[:, 0] * closest[:, 0] - e[:, 1] * closest[:, 1], e[:, 1] * closest[:, 0] + e[:, 0] * closest[:, 1]
+        corrected.append(points + np.stack((x, y), axis=1) / closest[:, 2:])
+    return np.stack(corrected)
+
+
+def triangulate_points_optimal(projection_matrices: np.ndarray, points_2d: np.ndarray) -> np.ndarray:
+    """
+    Optimal (least squared reprojection error) two-view triangulation in closed form: the correspondences are corrected
+    with `correct_correspondences_optimal`, after which the rays intersect exactly and the linear solution is optimal.
+
+    Parameters
+    ----------
+    projection_matrices : np.ndarray
+        (2, 3, 4) projection matrices. A mirror view with det(R) = -1 is fine: the fundamental matrix is derived from
+        the projection matrices as in `calc_fun_with_abs_pose`.
+    points_2d : np.ndarray
+        (2, N, 2) pixel coordinates, NaN where a point was not observed.
+
+    Returns
+    -------
+    np.ndarray
+        (N, 3) world points, NaN for points not observed in both views.
+    """
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    observed = np.all(np.isfinite(points_2d), axis=(0, 2))
+    F = fundamental_matrix_from_projection_matrices(projection_matrices[0], projection_matrices[1])
+
+    corrected = correct_correspondences_optimal(F, points_2d[0, observed], points_2d[1, observed])
+
+    # The corrected rays intersect exactly, so the (cheaper) least squares solution of the inhomogeneous DLT system is
+    # already the optimum: no SVD needed.
+    rows = corrected[..., None] * projection_matrices[:, None, 2:3, :] - projection_matrices[:, None, :2, :]
+    system = np.moveaxis(rows, 0, 1).reshape(-1, 4, 4)
+    system_t = np.swapaxes(system[..., :3], 1, 2)
+    points_3d = np.full((points_2d.shape[1], 3), np.nan)
+    points_3d[observed] = np.linalg.solve(system_t @ system[..., :3], -(system_t @ system[..., 3:]))[..., 0]
+    return points_3d
+
+
+def triangulate_points(
+    projection_matrices: np.ndarray,
+    points_2d: np.ndarray,
+    method: str = "auto",
+    max_iterations: int = 20,
+) -> TriangulationResult:
+    """
+    Triangulate all points at once.
+
+    Parameters
+    ----------
+    projection_matrices : np.ndarray
+        (V, 3, 4) projection matrices, e.g. from `projection_matrices_from_camera_parameters`.
+    points_2d : array_like
+        (V, N, 2) undistorted pixel coordinates, NaN where a point was not observed.
+    method : str, optional
+        One of:
+        - "linear": the DLT solution only.
+        - "iterative": the DLT solution refined by minimizing the reprojection errors (any number of views).
+        - "optimal": the closed-form optimal solution (exactly two views).
+        - "auto": "optimal" for two views (a camera and one mirror), "iterative" otherwise.
+    max_iterations : int, optional
+        Maximum number of refinement iterations of the "iterative" method.
+
+    Returns
+    -------
+    TriangulationResult
+        The world points with their per-view reprojection errors and diagnostics.
+    """
+    projection_matrices = np.asarray(projection_matrices, dtype=np.float64)
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    observed = np.all(np.isfinite(points_2d), axis=-1)
+
+    if method == "auto":
+        method = "optimal" if len(projection_matrices) == 2 else "iterative"
+
+    if method == "linear":
+        points_3d = triangulate_points_linear(projection_matrices, points_2d)
+        condition_numbers = compute_condition_numbers(projection_matrices, points_2d, points_3d)
+        converged = np.all(np.isfinite(points_3d), axis=-1)
+    elif method == "iterative":
+        points_3d = triangulate_points_linear(projection_matrices, points_2d)
+        points_3d, condition_numbers, converged = refine_points_nonlinear(
+            projection_matrices, points_2d, points_3d, max_iterations
+        )
+    elif method == "optimal":
+        if len(projection_matrices) != 2:
+            raise ValueError(f"Optimal triangulation requires exactly two views, got {len(projection_matrices)}.")
+        points_3d = triangulate_points_optimal(projection_matrices, points_2d)
+        condition_numbers = compute_condition_numbers(projection_matrices, points_2d, points_3d)
+        converged = np.all(np.isfinite(points_3d), axis=-1)
+    else:
+        raise ValueError(f"Unknown triangulation method: {method}")
+
+    reprojection_errors = np.linalg.norm(project_points(projection_matrices, points_3d) - points_2d, axis=-1)
+    reprojection_errors[~observed] = np.nan
+
+    return TriangulationResult(points_3d, reprojection_errors, condition_numbers, observed.sum(axis=0), converged)
+
+
+def benchmark_two_view_triangulation(
+    projection_matrices: np.ndarray, points_2d: np.ndarray, num_points: int, noise: float = 0.5, seed: int = 0
+):
+    """
+    Time the closed-form two-view solver against the iterative one on `num_points` points, made by tiling the given
+    (2, N, 2) points with Gaussian pixel noise, and report how far apart their solutions are.
+    """
+    rng = np.random.default_rng(seed)
+    points_2d = np.asarray(points_2d, dtype=np.float64)[:2]
+    num_repeats = -(-num_points // points_2d.shape[1])
+    points_2d = np.tile(points_2d, (1, num_repeats, 1))[:, :num_points]
+    points_2d = points_2d + rng.normal(scale=noise, size=points_2d.shape)
+
+    results = {}
+    for method in ("optimal", "iterative"):
+        start_time = time.perf_counter()
+        results[method] = triangulate_points(projection_matrices[:2], points_2d, method)
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{method:>9}: {num_points} points in {elapsed_time:.3f} s ({num_points / elapsed_time:.0f} points/s)")
+
+    optimal, iterative = results["optimal"], results["iterative"]
+    cost_differences = np.nansum(optimal.reprojection_errors**2, 0) - np.nansum(iterative.reprojection_errors**2, 0)
+    print(f"Max. distance between the solutions: {np.nanmax(np.abs(optimal.points_3d - iterative.points_3d)):.3e}")
+    print(f"Max. squared reprojection error difference (optimal - iterative): {np.nanmax(cost_differences):.3e} px^2")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triangulate annotated points with the BCT camera parameters.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--bct-params", type=Path, help="Merged BCT calibration file (bct_params.mat)")
+    group.add_argument("--dlt-coefs", type=Path, help="DLTdv8a DLT coefficients file (dlt_coefs.csv)")
+    parser.add_argument("--annotations", type=Path, required=True, help="Annotations JSON file")
+    parser.add_argument("--output", type=Path, help="Write the world points and errors to this JSON file")
+    parser.add_argument(
+        "--view-labels", type=int, nargs="+", help="BCT view labels of the DLT columns (with --dlt-coefs, default 1..V)"
+    )
+    parser.add_argument(
+        "--method", choices=["auto", "linear", "iterative", "optimal"], default="auto", help="Triangulation method"
+    )
+    parser.add_argument(
+        "--mirror-model", action="store_true", help="Model the virtual views as exact reflections (mirror_rig.py)"
+    )
+    parser.add_argument(
+        "--benchmark", type=int, metavar="NUM_POINTS", help="Benchmark the two-view solvers on the first annotation"
+    )
+    args = parser.parse_args()
+
+    if args.dlt_coefs is not None and not args.mirror_model:
+        projection_matrices = projection_matrices_from_dlt(load_dlt_coefs(args.dlt_coefs))
+    else:
+        if args.dlt_coefs is not None:
+            camera_parameters = camera_parameters_from_dlt(load_dlt_coefs(args.dlt_coefs), args.view_labels)
+        else:
+            camera_parameters = load_bct_params(args.bct_params)
+        if args.mirror_model:
+            camera_parameters = mirror_camera_parameters(camera_parameters)
+        projection_matrices = projection_matrices_from_camera_parameters(camera_parameters)
+    num_views = len(projection_matrices)
+
+    # Split into views by `Annotations`, which pads views with fewer points with NaN (missing, skipped below).
+    annotations = Annotations.load_json(args.annotations, num_views)
+
+    if args.benchmark is not None:
+        benchmark_two_view_triangulation(
+            projection_matrices, annotations.get(annotations.filenames[0])[0].astype(np.float64), args.benchmark
+        )
+        raise SystemExit
+
+    results = []
+    for filename in annotations:
+        start_time = time.perf_counter()
+        result = triangulate_points(projection_matrices, annotations.get(filename)[0].astype(np.float64), args.method)
+        elapsed_time = time.perf_counter() - start_time
+
+        mean_errors = np.nanmean(result.reprojection_errors, axis=1)
+        rms_errors = np.sqrt(np.nanmean(result.reprojection_errors**2, axis=1))
+        print(f"\n{filename}: {len(result.points_3d)} points in {elapsed_time * 1000:.2f} ms")
+        print(f"Mean Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in mean_errors)}")
+        print(f"Mean Reprojection Error (OVERALL): {np.mean(mean_errors):.6f}")
+        print(f"RMS Reprojection Error (PER-VIEW): {', '.join(f'{e:.6f}' for e in rms_errors)}")
+        print(f"RMS Reprojection Error (OVERALL): {np.mean(rms_errors):.6f}")
+        results.append({
+            "filename": filename,
+            # Points and views without any observation (NaN) are written as null, so the file stays valid JSON.
+            "points": points_to_json(result.points_3d),
+            "per_view_mean_reprojection_error": [e if np.isfinite(e) else None for e in mean_errors.tolist()],
+            "per_view_rms_reprojection_error": [e if np.isfinite(e) else None for e in rms_errors.tolist()],
+        })
+
+    if args.output is not None:
+        with args.output.open("w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWorld points saved to: {args.output}")
@@ -0,0 +1,245 @@
+"""
+Batch undistortion of images (or extracted video frames) for every calibrated view, the Python counterpart of
+`create_undistorted_imgs.m`.
+
+The intrinsics and distortion coefficients of each view are read from the merged BCT calibration file
+(`bct_params.mat`). For every view and image resolution, the undistortion grid (`cv2.initUndistortRectifyMap`) is built
+only once, converted to OpenCV's compact fixed-point representation (`cv2.convertMaps` to CV_16SC2 + interpolation
+table indices, about half the size of float maps and faster to remap with), and cached on disk. Each image is then read
+once and remapped for all views in a pool of worker processes.
+
+The undistorted images keep the intrinsics of their view and are written in the LCMART layout, one folder per view
+label (`UNDISTORTED_IMG_FOLDERS` in `defaults.m`):
+
+    <output_dir>/
+    ├── cam_rect/<image_name>.jpg
+    ├── mir1_rect/<image_name>.jpg
+    ├── mir2_rect/<image_name>.jpg   (if calibrated)
+    └── <image_name>_distorted.jpg   (with --keep-distorted, the original image as expected by the MDE data)
+
+Usage:
+    python undistort_images.py Media/Images --bct-params Calibration/bct_params.mat
+    python undistort_images.py frames/*.jpg --bct-params bct_params.mat --output-dir frames --workers 8
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from camera_parameters import load_bct_params
+
+# Configuration (mirrors the defaults in `defaults.m`)
+UNDISTORTED_IMG_FOLDERS = {1: "cam_rect", 2: "mir1_rect", 3: "mir2_rect"}
+SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+DISTORTED_SUFFIX = "_distorted"
+MAP_CACHE_DIRNAME = ".undistortion_maps"
+# Bicubic, like the MATLAB `undistort_img.m`; pixels mapping outside the distorted image are black.
+INTERPOLATION = cv2.INTER_CUBIC
+
+# Per-process memo of loaded maps, so each worker reads each cached map from disk at most once.
+_maps_memo: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Undistort images for every view in a merged BCT calibration file.")
+    parser.add_argument("inputs", type=Path, nargs="+", help="Directory of images, or image files")
+    parser.add_argument("--bct-params", type=Path, required=True, help="Merged BCT calibration file (bct_params.mat)")
+    parser.add_argument("--output-dir", type=Path, help="Output directory (default: the images' directory)")
+    parser.add_argument("--cache-dir", type=Path, help="Map cache directory (default: <output-dir>/.undistortion_maps)")
+    parser.add_argument("--keep-distorted", action="store_true", help="Also copy originals as <name>_distorted<ext>")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    return parser.parse_args()
+
+
+def get_undistortion_maps_key(intrinsics: np.ndarray, distortion: np.ndarray, image_size: tuple[int, int]) -> str:
+    """Cache key of the undistortion maps of one camera (view) at one (width, height) resolution."""
+    sha1 = hashlib.sha1()
+    sha1.update(np.ascontiguousarray(intrinsics, dtype=np.float64).tobytes())
+    sha1.update(np.ascontiguousarray(distortion, dtype=np.float64).tobytes())
+    sha1.update(np.array(image_size, dtype=np.int64).tobytes())
+    sha1.update(str(INTERPOLATION).encode())
+    return f"{image_size[0]}x{image_size[1]}_{sha1.hexdigest()[:16]}"
+
+
+def get_undistortion_maps(
+    intrinsics: np.ndarray, distortion: np.ndarray, image_size: tuple[int, int], cache_dir: Path | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the fixed-point undistortion maps of a view, building and caching them on disk only if not cached yet.
+
+    Parameters
+    ----------
+    intrinsics : np.ndarray
+        3x3 intrinsics (KK). The undistorted image keeps the same intrinsics.
+    distortion : np.ndarray
+        Distortion coefficients [k1, k2, p1, p2, k3] (kc).
+    image_size : tuple[int, int]
+        (width, height) of the images.
+    cache_dir : Path, optional
+        Directory of the on-disk map cache. No disk cache if None.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The HxWx2 int16 integer pixel map and HxW uint16 interpolation table map, to be used with `cv2.remap`.
+    """
+    key = get_undistortion_maps_key(intrinsics, distortion, image_size)
+    if key in _maps_memo:
+        return _maps_memo[key]
+
+    path_maps = None if cache_dir is None else Path(cache_dir, f"{key}.npz")
+    if path_maps is not None and path_maps.is_file():
+        with np.load(path_maps) as cached_maps:
+            maps = (cached_maps["map_xy"], cached_maps["map_interpolation"])
+    else:
+        map_x, map_y = cv2.initUndistortRectifyMap(intrinsics, distortion, None, intrinsics, image_size, cv2.CV_32FC1)
+        maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        if path_maps is not None:
+            # Several workers may build the same maps at once: write to a private file, then atomically replace.
+            path_maps.parent.mkdir(parents=True, exist_ok=True)
+            path_temp = path_maps.with_name(f"{path_maps.stem}.{os.getpid()}.tmp.npz")
+            np.savez(path_temp, map_xy=maps[0], map_interpolation=maps[1])
+            os.replace(path_temp, path_maps)
+
+    _maps_memo[key] = maps
+    return maps
+
+
+def undistort_image(image: np.ndarray, maps: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """Undistort an image with maps from `get_undistortion_maps`."""
+    return cv2.remap(image, maps[0], maps[1], INTERPOLATION, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def _undistort_views(
+    image_path: Path,
+    views: list[tuple[np.ndarray, np.ndarray, Path]],
+    cache_dir: Path | None,
+    path_distorted_copy: Path | None,
+) -> bool:
+    """Worker: read an image once and write its undistorted version for every (intrinsics, distortion, path) view."""
+    image = cv2.imread(image_path.as_posix(), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return False
+
+    image_size = (image.shape[1], image.shape[0])
+    for intrinsics, distortion, output_path in views:
+        maps = get_undistortion_maps(intrinsics, distortion, image_size, cache_dir)
+        if not cv2.imwrite(output_path.as_posix(), undistort_image(image, maps)):
+            raise IOError(f"Could not write undistorted image: {output_path.as_posix()}")
+
+    if path_distorted_copy is not None:
+        shutil.copy2(image_path, path_distorted_copy)
+    return True
+
+
+def undistort_images(
+    image_paths: list[Path],
+    path_bct_params: Path,
+    output_dir: Path,
+    cache_dir: Path | None = None,
+    keep_distorted: bool = False,
+    num_workers: int | None = None,
+) -> int:
+    """
+    Undistort images for every view in a merged BCT calibration file, across a process pool.
+
+    Parameters
+    ----------
+    image_paths : list[Path]
+        Paths of the (distorted) images.
+    path_bct_params : Path
+        Path to the merged BCT calibration file.
+    output_dir : Path
+        Directory to create the per-view folders (`cam_rect`, `mir1_rect`, ...) in.
+    cache_dir : Path, optional
+        Directory of the on-disk undistortion map cache. Defaults to `<output_dir>/.undistortion_maps`.
+    keep_distorted : bool, optional
+        Also copy each original image to `<output_dir>/<image_name>_distorted<ext>`.
+    num_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    int
+        The number of images undistorted (for all views).
+    """
+    camera_parameters = load_bct_params(path_bct_params)
+    output_dir = Path(output_dir)
+    cache_dir = Path(output_dir, MAP_CACHE_DIRNAME) if cache_dir is None else Path(cache_dir)
+
+    view_dirs = []
+    for view_parameters in camera_parameters.values():
+        view_dir = output_dir / UNDISTORTED_IMG_FOLDERS[view_parameters["view_label"]]
+        view_dir.mkdir(parents=True, exist_ok=True)
+        view_dirs.append((view_parameters["intrinsics"], view_parameters["distortion"], view_dir))
+
+    tasks = []
+    for image_path in image_paths:
+        image_path = Path(image_path)
+        views = [(intrinsics, distortion, view_dir / image_path.name) for intrinsics, distortion, view_dir in view_dirs]
+        path_distorted_copy = None
+        if keep_distorted:
+            path_distorted_copy = output_dir / f"{image_path.stem}{DISTORTED_SUFFIX}{image_path.suffix}"
+        tasks.append((image_path, views, cache_dir, path_distorted_copy))
+
+    num_workers = num_workers or os.cpu_count() or 1
+    # Chunks amortize the per-task overhead for long frame sequences; each worker reuses its maps across a chunk.
+    chunksize = max(1, len(tasks) // (4 * num_workers))
+
+    num_undistorted = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for task, ok in zip(tasks, executor.map(_undistort_views, *zip(*tasks), chunksize=chunksize)):
+            if not ok:
+                print(f"Warning: Could not load image: {task[0].as_posix()}")
+                continue
+            num_undistorted += 1
+
+    return num_undistorted
+
+
+def collect_image_paths(inputs: list[Path]) -> list[Path]:
+    """Expand directories into their (sorted) supported images, skipping previously written `_distorted` copies."""
+    image_paths = []
+    for path in inputs:
+        if path.is_dir():
+            image_paths.extend(
+                sorted(
+                    f
+                    for f in path.iterdir()
+                    if f.suffix.lower() in SUPPORTED_EXTENSIONS and not f.stem.endswith(DISTORTED_SUFFIX)
+                )
+            )
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    image_paths = collect_image_paths(args.inputs)
+    if not image_paths:
+        raise SystemExit("No supported images found.")
+
+    output_dir = args.output_dir or image_paths[0].parent
+    start_time = time.perf_counter()
+    num_undistorted = undistort_images(
+        image_paths,
+        args.bct_params,
+        output_dir,
+        cache_dir=args.cache_dir,
+        keep_distorted=args.keep_distorted,
+        num_workers=args.workers,
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    print(
+        f"Undistorted {num_undistorted}/{len(image_paths)} images in {elapsed_time:.2f} s"
+        f" ({num_undistorted / max(elapsed_time, 1e-9):.1f} images/s) to: {output_dir}"
+    )